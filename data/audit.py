@@ -0,0 +1,146 @@
+"""
+This module keeps an audit log of security decisions and
+manuscript state changes.
+log_event() only appends to an in-memory buffer; a background
+thread writes the buffer to the DB in batches. So auditing a
+request costs microseconds, not a DB write.
+If the DB falls behind and the buffer fills, new events are
+dropped and counted rather than slowing requests down.
+"""
+import atexit
+import os
+import time
+from collections import deque
+from threading import Condition, Thread
+
+import data.db_connect as dbc
+import data.log as log
+
+AUDIT_COLLECT = 'audit'
+
+# event fields
+ACTOR = 'actor'
+FEATURE = 'feature'
+ACTION = 'action'
+DECISION = 'decision'
+MANU_ID = 'manu_id'
+TARGET = 'target'
+FROM_STATE = 'from_state'
+TO_STATE = 'to_state'
+TIMESTAMP = 'timestamp'
+
+# decisions
+PERMITTED = 'permitted'
+DENIED = 'denied'
+
+BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE', 10_000))
+BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+FLUSH_SECS = float(os.environ.get('AUDIT_FLUSH_SECS', 1.0))
+
+# stats keys
+ENQUEUED = 'enqueued'
+FLUSHED = 'flushed'
+DROPPED = 'dropped'
+FLUSH_ERRORS = 'flush_errors'
+PENDING = 'pending'
+
+buffer = deque()
+cond = Condition()
+counts = {
+    ENQUEUED: 0,
+    FLUSHED: 0,
+    DROPPED: 0,
+    FLUSH_ERRORS: 0,
+}
+# The flusher thread doesn't survive a fork, so remember whose it is:
+flusher_pid = None
+
+logger = log.get_logger(__name__)
+
+
+def log_event(actor: str, feature: str, action: str, decision: str,
+              manu_id: str = None, from_state: str = None,
+              to_state: str = None, target: str = None) -> bool:
+    """
+    Queue an event for the audit log.
+    Returns False if the buffer was full and the event was dropped.
+    """
+    event = {
+        TIMESTAMP: time.time(),
+        ACTOR: actor,
+        FEATURE: feature,
+        ACTION: action,
+        DECISION: decision,
+    }
+    if manu_id is not None:
+        event[MANU_ID] = manu_id
+    if target is not None:
+        event[TARGET] = target
+    if from_state is not None or to_state is not None:
+        event[FROM_STATE] = from_state
+        event[TO_STATE] = to_state
+    with cond:
+        if len(buffer) >= BUFFER_SIZE:
+            counts[DROPPED] += 1
+            return False
+        buffer.append(event)
+        counts[ENQUEUED] += 1
+        if len(buffer) >= BATCH_SIZE:
+            cond.notify()
+    if flusher_pid != os.getpid():
+        start_flusher()
+    return True
+
+
+def flush() -> int:
+    """
+    Write one batch of queued events to the DB.
+    Returns how many were written.
+    """
+    with cond:
+        batch = [buffer.popleft()
+                 for _ in range(min(BATCH_SIZE, len(buffer)))]
+    if not batch:
+        return 0
+    try:
+        dbc.connect_db()
+        dbc.create_many(AUDIT_COLLECT, batch, ordered=False)
+    except Exception:
+        logger.exception('Error writing %d audit events', len(batch))
+        with cond:
+            counts[FLUSH_ERRORS] += 1
+            counts[DROPPED] += len(batch)
+        return 0
+    with cond:
+        counts[FLUSHED] += len(batch)
+    return len(batch)
+
+
+def flush_all():
+    while flush():
+        pass
+
+
+def _flush_loop():
+    while True:
+        with cond:
+            if len(buffer) < BATCH_SIZE:
+                cond.wait(FLUSH_SECS)
+        flush_all()
+
+
+def start_flusher():
+    global flusher_pid
+    with cond:
+        if flusher_pid == os.getpid():
+            return
+        flusher_pid = os.getpid()
+    Thread(target=_flush_loop, name='audit-flusher', daemon=True).start()
+
+
+def stats() -> dict:
+    with cond:
+        return {**counts, PENDING: len(buffer)}
+
+
+atexit.register(flush_all)
@@ -0,0 +1,401 @@
+"""
+This module backs up the database to a directory, and restores it.
+Each collection goes to its own gzipped BSON file, written by its
+own thread; a manifest records each file's doc count and checksum.
+
+    python -m data.backup backup bkup/jan31
+    python -m data.backup restore bkup/jan31 --drop
+
+Docs are copied as raw BSON batches, never decoded, so every type
+(ObjectIds, dates) comes back exactly as it went out.
+On a replica set all the collections are read from one snapshot, so
+the backup is of a single point in time. A standalone mongod can't
+do that: the manifest then says point_in_time is false.
+
+Backups can be incremental:
+
+    python -m data.backup backup bkup/feb01 --since bkup/jan31
+    python -m data.backup merge bkup/full bkup/jan31 bkup/feb01
+
+db_connect stamps every doc it writes with a server timestamp, and
+leaves a tombstone for every doc it deletes. An incremental backup
+holds just the docs and tombstones stamped since its base's
+checkpoint, so it costs in proportion to what changed; merge applies
+a chain of them to a full backup to make a new full one.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Lock
+
+import bson
+from bson.raw_bson import RawBSONDocument
+from bson.timestamp import Timestamp
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+import data.db_connect as dbc
+import data.log as log
+
+MANIFEST = 'manifest.json'
+SUFFIX = '.bson.gz'
+CHECKPOINT_COLLECT = '_backup_checkpoints'
+# counters, caches and our own bookkeeping: not worth restoring
+SKIPPED_COLLECTIONS = {'rate_limits', CHECKPOINT_COLLECT,
+                       dbc.TOMBSTONE_COLLECT}
+GZIP_LEVEL = 6
+CHUNK_SIZE = 1024 * 1024
+
+DB = 'db'
+CREATED = 'created'
+POINT_IN_TIME = 'point_in_time'
+COLLECTIONS = 'collections'
+TYPE = 'type'
+FULL = 'full'
+INCREMENTAL = 'incremental'
+CHECKPOINT = 'checkpoint'
+SINCE = 'since'
+BASE = 'base'
+FILE = 'file'
+COUNT = 'count'
+SHA256 = 'sha256'
+
+logger = log.get_logger(__name__)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count_docs(raw_batch: bytes) -> int:
+    """
+    Count the docs in a run of BSON docs, from their length prefixes.
+    """
+    count = pos = 0
+    while pos < len(raw_batch):
+        pos += int.from_bytes(raw_batch[pos:pos + 4], 'little')
+        count += 1
+    return count
+
+
+class _SharedSession:
+    """
+    One snapshot session for all the backup threads.
+    A session can only be used by one thread at a time, so fetching
+    a batch takes the lock; compressing and writing it don't.
+    """
+    def __init__(self, session):
+        self.session = session
+        self.lock = Lock()
+
+    def batches(self, collection, filt=None):
+        with self.lock:
+            cursor = collection.find_raw_batches(filt, session=self.session)
+        while True:
+            with self.lock:
+                batch = next(cursor, None)
+            if batch is None:
+                return
+            yield batch
+
+
+def _start_snapshot(client, db_name: str, collections: list):
+    """
+    Return a snapshot session, or None if the server can't do them.
+    The first read fixes the snapshot's time.
+    """
+    session = client.start_session(snapshot=True)
+    try:
+        if collections:
+            first = client[db_name][collections[0]]
+            next(first.find_raw_batches(limit=1, session=session), None)
+        return session
+    except OperationFailure as err:
+        logger.warning('No snapshot reads (%s): backup will not be of '
+                       'a single point in time.', err)
+        session.end_session()
+        return None
+
+
+def to_json_ts(ts: Timestamp) -> list:
+    return [ts.time, ts.inc]
+
+
+def from_json_ts(pair: list) -> Timestamp:
+    return Timestamp(*pair)
+
+
+def take_checkpoint(database) -> Timestamp:
+    """
+    Return the server's time now, as a timestamp comparable with the
+    ones db_connect stamps docs with.
+    Docs stamped after it go in the next incremental backup. One
+    stamped just before it may go in both: merging takes care of that.
+    """
+    doc = database[CHECKPOINT_COLLECT].find_one_and_update(
+        {dbc.MONGO_ID: CHECKPOINT}, dbc.STAMP, upsert=True,
+        return_document=ReturnDocument.AFTER)
+    return doc[dbc.MOD]
+
+
+def backup_collection(collection, path: str, shared=None,
+                      filt: dict = None) -> dict:
+    if shared is not None:
+        batches = shared.batches(collection, filt)
+    else:
+        batches = collection.find_raw_batches(filt)
+    count = 0
+    with gzip.open(path, 'wb', compresslevel=GZIP_LEVEL) as f:
+        for batch in batches:
+            f.write(batch)
+            count += count_docs(batch)
+    return {FILE: os.path.basename(path), COUNT: count,
+            SHA256: file_sha256(path)}
+
+
+def backup(out_dir: str, collections: list = None, db_name=dbc.SE_DB,
+           snapshot: bool = True, base_dir: str = None) -> dict:
+    """
+    Back up the collections (by default, all but the skipped ones)
+    to out_dir, a thread per collection. Return the manifest.
+    Given the directory of an earlier backup as base_dir, back up only
+    what changed since it, tombstones included.
+    """
+    client = dbc.connect_db()
+    database = client[db_name]
+    if collections is None:
+        collections = sorted(set(database.list_collection_names())
+                             - SKIPPED_COLLECTIONS)
+    filt = None
+    since = None
+    if base_dir is not None:
+        since = read_manifest(base_dir)[CHECKPOINT]
+        filt = {dbc.MOD: {'$gt': from_json_ts(since)}}
+        collections = collections + [dbc.TOMBSTONE_COLLECT]
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = take_checkpoint(database)
+    session = _start_snapshot(client, db_name, collections) \
+        if snapshot else None
+    shared = _SharedSession(session) if session is not None else None
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(collections))) \
+                as executor:
+            futures = {
+                name: executor.submit(
+                    backup_collection, database[name],
+                    os.path.join(out_dir, name + SUFFIX), shared, filt)
+                for name in collections
+            }
+            results = {name: future.result()
+                       for name, future in futures.items()}
+    finally:
+        if session is not None:
+            session.end_session()
+    manifest = {
+        DB: db_name,
+        CREATED: datetime.now(timezone.utc).isoformat(),
+        TYPE: FULL if base_dir is None else INCREMENTAL,
+        POINT_IN_TIME: session is not None,
+        CHECKPOINT: to_json_ts(checkpoint),
+        COLLECTIONS: results,
+    }
+    if base_dir is not None:
+        manifest[BASE] = os.path.basename(os.path.normpath(base_dir))
+        manifest[SINCE] = since
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info('Backed up %d collections to %s in %.2fs',
+                len(collections), out_dir, time.perf_counter() - start)
+    return manifest
+
+
+def read_manifest(in_dir: str) -> dict:
+    with open(os.path.join(in_dir, MANIFEST)) as f:
+        return json.load(f)
+
+
+def verify(in_dir: str, manifest: dict = None) -> dict:
+    """
+    Check every file against its checksum; raise ValueError if any
+    doesn't match. Return the manifest.
+    """
+    if manifest is None:
+        manifest = read_manifest(in_dir)
+    for name, entry in manifest[COLLECTIONS].items():
+        path = os.path.join(in_dir, entry[FILE])
+        if file_sha256(path) != entry[SHA256]:
+            raise ValueError(f'Checksum mismatch for {name}: {path}')
+    return manifest
+
+
+def restore_collection(collection, path: str,
+                       batch_size: int = dbc.BATCH_SIZE) -> int:
+    count = 0
+    batch = []
+    for doc in _read_docs(path):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        count += len(batch)
+    return count
+
+
+def _read_docs(path: str):
+    options = bson.CodecOptions(document_class=RawBSONDocument)
+    with gzip.open(path, 'rb') as f:
+        yield from bson.decode_file_iter(f, codec_options=options)
+
+
+def _mod_of(doc) -> Timestamp:
+    return doc.get(dbc.MOD) or Timestamp(0, 0)
+
+
+def merge(base_dir: str, incr_dirs: list, out_dir: str) -> dict:
+    """
+    Apply incremental backups, oldest first, to a full backup, and
+    write the result to out_dir as a new full backup.
+    Each collection is merged in memory, keyed on _id.
+    """
+    base = verify(base_dir)
+    if base.get(TYPE, FULL) != FULL:
+        raise ValueError(f'{base_dir} is not a full backup')
+    increments = [verify(incr_dir) for incr_dir in incr_dirs]
+    checkpoint = base[CHECKPOINT]
+    for incr_dir, incr in zip(incr_dirs, increments):
+        if incr.get(TYPE) != INCREMENTAL:
+            raise ValueError(f'{incr_dir} is not an incremental backup')
+        # each must start where the one before left off:
+        if incr[SINCE] != checkpoint:
+            raise ValueError(f'{incr_dir} does not follow on from the '
+                             'backups before it')
+        checkpoint = incr[CHECKPOINT]
+    names = set(base[COLLECTIONS])
+    for incr in increments:
+        names |= set(incr[COLLECTIONS]) - {dbc.TOMBSTONE_COLLECT}
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+    for name in sorted(names):
+        docs = {}
+        if name in base[COLLECTIONS]:
+            path = os.path.join(base_dir, base[COLLECTIONS][name][FILE])
+            docs = {doc[dbc.MONGO_ID]: doc for doc in _read_docs(path)}
+        for incr_dir, incr in zip(incr_dirs, increments):
+            entries = incr[COLLECTIONS]
+            if name in entries:
+                path = os.path.join(incr_dir, entries[name][FILE])
+                for doc in _read_docs(path):
+                    docs[doc[dbc.MONGO_ID]] = doc
+            if dbc.TOMBSTONE_COLLECT in entries:
+                path = os.path.join(incr_dir,
+                                    entries[dbc.TOMBSTONE_COLLECT][FILE])
+                for tomb in _read_docs(path):
+                    if tomb[dbc.TOMB_COLLECTION] != name:
+                        continue
+                    doc = docs.get(tomb[dbc.TOMB_DOC_ID])
+                    # unless the doc came back after it was deleted:
+                    if doc is not None and _mod_of(doc) <= _mod_of(tomb):
+                        del docs[tomb[dbc.TOMB_DOC_ID]]
+        path = os.path.join(out_dir, name + SUFFIX)
+        with gzip.open(path, 'wb', compresslevel=GZIP_LEVEL) as f:
+            for doc in docs.values():
+                f.write(doc.raw)
+        results[name] = {FILE: name + SUFFIX, COUNT: len(docs),
+                         SHA256: file_sha256(path)}
+    manifest = {
+        DB: base[DB],
+        CREATED: datetime.now(timezone.utc).isoformat(),
+        TYPE: FULL,
+        POINT_IN_TIME: all(m[POINT_IN_TIME] for m in [base] + increments),
+        CHECKPOINT: checkpoint,
+        COLLECTIONS: results,
+    }
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def restore(in_dir: str, db_name: str = None, drop: bool = False,
+            collections: list = None,
+            batch_size: int = dbc.BATCH_SIZE) -> dict:
+    """
+    Restore a backup, a thread per collection, after checking its
+    checksums. With drop set, each collection is emptied first.
+    Return the number of docs restored per collection.
+    """
+    manifest = verify(in_dir)
+    if manifest.get(TYPE, FULL) != FULL:
+        raise ValueError(f'{in_dir} is incremental: merge it into a full '
+                         'backup first')
+    database = dbc.connect_db()[db_name or manifest[DB]]
+    entries = manifest[COLLECTIONS]
+    if collections is not None:
+        entries = {name: entries[name] for name in collections}
+
+    def restore_one(name: str) -> int:
+        if drop:
+            database[name].drop()
+        restored = restore_collection(
+            database[name], os.path.join(in_dir, entries[name][FILE]),
+            batch_size)
+        if restored != entries[name][COUNT]:
+            raise ValueError(f'Restored {restored} docs into {name}; '
+                             f'expected {entries[name][COUNT]}')
+        return restored
+
+    with ThreadPoolExecutor(max_workers=max(1, len(entries))) as executor:
+        futures = {name: executor.submit(restore_one, name)
+                   for name in entries}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Back up or restore '
+                                                 'the database.')
+    parser.add_argument('command',
+                        choices=['backup', 'restore', 'verify', 'merge'])
+    parser.add_argument('dir', help='The backup to make, restore or '
+                                    'check, or where to merge to')
+    parser.add_argument('sources', nargs='*',
+                        help='For merge: a full backup, then incremental '
+                             'ones, oldest first')
+    parser.add_argument('--since',
+                        help='Back up only what changed since this backup')
+    parser.add_argument('--collections',
+                        help='Comma-separated collections (default: all)')
+    parser.add_argument('--db', help='Database to restore into')
+    parser.add_argument('--drop', action='store_true',
+                        help='Empty each collection before restoring it')
+    args = parser.parse_args()
+    log.configure()
+    collections = args.collections.split(',') if args.collections else None
+    if args.command == 'backup':
+        print(json.dumps(backup(args.dir, collections,
+                                base_dir=args.since), indent=2))
+    elif args.command == 'merge':
+        if not args.sources:
+            parser.error('merge needs a full backup to start from')
+        print(json.dumps(merge(args.sources[0], args.sources[1:], args.dir),
+                         indent=2))
+    elif args.command == 'restore':
+        print(restore(args.dir, args.db, args.drop, collections))
+    else:
+        verify(args.dir)
+        print('OK')
+
+
+if __name__ == '__main__':
+    main()
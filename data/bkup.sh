@@ -1,15 +1,9 @@
 #!/bin/sh
-# Script to backup production database to JSON files.
+# Script to back up the production database to a dated directory.
+# Backups are data, not code: they are not committed.
 
 . ./common.sh
 
-for collection in ${GameCollections[@]}; do
-    echo "Backing up $collection"
-    $EXP --collection=$collection --db=$DB --out=$BKUP_DIR/$collection.json $CONNECT_STR --username $USER --password $MONGO_PASSWD
-done
-
-git add $BKUP_DIR/*.json
-git add $BKUP_DIR/*.json
-git commit $BKUP_DIR/*.json -m "Mongo DB backup"
-git pull origin master
-git push origin master
+OUT_DIR=$BKUP_DIR/$(date -u +%Y-%m-%dT%H%M%SZ)
+echo "Backing up to $OUT_DIR"
+cd .. && CLOUD_MONGO=1 python -m data.backup backup $OUT_DIR "$@"
@@ -0,0 +1,94 @@
+"""
+This module keeps large content, such as manuscript bodies, out of
+the docs that refer to it, in a GridFS bucket of fixed-size chunks.
+A doc holds just a small ref, so reading it (to change a state, say)
+doesn't drag the body along, and bodies can be bigger than Mongo's
+16MB doc limit.
+Blobs are named by the sha256 of their content: storing the same
+content twice stores it once.
+"""
+import hashlib
+
+import gridfs
+
+import data.db_connect as dbc
+
+BUCKET = 'blobs'
+FILES_COLLECT = f'{BUCKET}.files'
+CHUNKS_COLLECT = f'{BUCKET}.chunks'
+CHUNK_SIZE = 255 * 1024
+# bytes per read when streaming a blob out:
+READ_SIZE = 64 * 1024
+
+TEXT_TYPE = 'text/plain; charset=utf-8'
+
+# the fields of a ref:
+SHA256 = 'sha256'
+LENGTH = 'length'
+CONTENT_TYPE = 'content_type'
+
+FILENAME = 'filename'
+FILES_ID = 'files_id'
+
+
+def bucket(db=dbc.SE_DB) -> gridfs.GridFSBucket:
+    return gridfs.GridFSBucket(dbc.connect_db()[db], bucket_name=BUCKET,
+                               chunk_size_bytes=CHUNK_SIZE)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _stamp(file_id, db=dbc.SE_DB):
+    """
+    GridFS writes round db_connect, so stamp the file and its chunks
+    ourselves, for incremental backups to find.
+    """
+    database = dbc.connect_db()[db]
+    database[FILES_COLLECT].update_one({dbc.MONGO_ID: file_id}, dbc.STAMP)
+    database[CHUNKS_COLLECT].update_many({FILES_ID: file_id}, dbc.STAMP)
+
+
+def put(data: bytes, content_type: str, db=dbc.SE_DB) -> dict:
+    """
+    Store data, unless the same content is already stored, and
+    return a ref to it.
+    """
+    digest = content_hash(data)
+    files = dbc.connect_db()[db][FILES_COLLECT]
+    if files.find_one({FILENAME: digest}, {dbc.MONGO_ID: 1}) is None:
+        file_id = bucket(db).upload_from_stream(
+            digest, data, metadata={CONTENT_TYPE: content_type})
+        _stamp(file_id, db)
+    return {SHA256: digest, LENGTH: len(data), CONTENT_TYPE: content_type}
+
+
+def put_text(text: str, db=dbc.SE_DB) -> dict:
+    return put(text.encode('utf-8'), TEXT_TYPE, db)
+
+
+def open_blob(ref: dict, db=dbc.SE_DB):
+    """
+    Return a seekable, file-like GridOut for the blob.
+    Raises gridfs.errors.NoFile if it isn't there.
+    """
+    return bucket(db).open_download_stream_by_name(ref[SHA256])
+
+
+def get_text(ref: dict, db=dbc.SE_DB) -> str:
+    return open_blob(ref, db).read().decode('utf-8')
+
+
+def iter_range(blob, start: int, end: int, read_size: int = READ_SIZE):
+    """
+    Yield bytes start up to end of a file-like blob, a read at a time.
+    """
+    blob.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = blob.read(min(read_size, remaining))
+        if not chunk:
+            return
+        remaining -= len(chunk)
+        yield chunk
@@ -1,23 +1,81 @@
 import os
-
-import certifi
+import time
+from functools import wraps
 
 import pymongo as pm
+from bson.timestamp import Timestamp
+
+import data.log as log
 
 LOCAL = "0"
 CLOUD = "1"
 
 SE_DB = 'seDB'
 
+# operations that return docs:
+READ_OPERATIONS = {'fetch_one', 'read', 'read_one', 'find_one_and_update'}
+
 client = None
 
 MONGO_ID = '_id'
 
+# docs per round trip when streaming a cursor:
+BATCH_SIZE = 500
+
+# Every write stamps the docs it touches with a server timestamp in
+# MOD, and every delete leaves a tombstone: so an incremental backup
+# can find what changed since the last one (see data/backup.py).
+# Reads leave MOD out.
+MOD = '_mod'
+TOMBSTONE_COLLECT = '_tombstones'
+TOMB_COLLECTION = 'collection'
+TOMB_DOC_ID = 'doc_id'
+# the server replaces an empty timestamp in an inserted doc with now:
+SERVER_NOW = Timestamp(0, 0)
+STAMP = {'$currentDate': {MOD: {'$type': 'timestamp'}}}
+NO_MOD = {MOD: 0}
+
+# Functions called as fn(operation, collection, secs, ndocs)
+# after every DB call; ndocs is None for writes.
+observers = []
+
+logger = log.get_logger(__name__)
+
 # callahan_uri = f'mongodb+srv://gcallah:{password}'
 # + '@koukoumongo1.yud9b.mongodb.net/'
 # + '?retryWrites=true&w=majority'
 
 
+def client_args() -> tuple:
+    """
+    Return (args, kwargs) to create a Mongo client with: the sync
+    client here and the async one in db_connect_async share them.
+    """
+    cloud_mode = os.environ.get('CLOUD_MONGO', LOCAL)
+    password = os.environ.get("MONGO_PASSWD")
+    logger.debug('Setting client: CLOUD_MONGO=%s, MONGO_PASSWD set: %s',
+                 cloud_mode, bool(password))
+
+    if cloud_mode == CLOUD:
+        if not password:
+            raise ValueError('You must set MONGO_PASSWD to your password '
+                             'to use Mongo in the cloud.')
+        logger.info('Connecting to Mongo in the cloud.')
+        import certifi  # slow to import, and only needed here
+        return ((f'mongodb+srv://at5604:{password}'
+                 + '@cluster0.6nvuo.mongodb.net/'
+                 + '?retryWrites=true'
+                 + '&w=majority'
+                 + '&appName=Cluster0'
+                 + '&connectTimeoutMS=10000'
+                 + '&socketTimeoutMS=10000'
+                 + '&connect=false'
+                 + '&maxPoolsize=1',),
+                {'tlsCAFile': certifi.where()})
+    logger.info('Connecting to Mongo locally.')
+    return (), {}
+
+
 def connect_db():
     """
     This provides a uniform way to connect to the DB across all uses.
@@ -28,72 +86,167 @@ def connect_db():
     """
     global client
     if client is None:  # not connected yet!
-        print('Setting client because it is None.')
-
-        # Debug environment variable
-        cloud_mode = os.environ.get('CLOUD_MONGO', LOCAL)
-        password = os.environ.get("MONGO_PASSWD")
-        print(f"Debug: CLOUD_MONGO={cloud_mode}, MONGO_PASSWD={password}")
-
-        if cloud_mode == CLOUD:
-            if not password:
-                raise ValueError('You must set MONGO_PASSWD to your password '
-                                 'to use Mongo in the cloud.')
-            print('Connecting to Mongo in the cloud.')
-            client = pm.MongoClient(f'mongodb+srv://at5604:{password}'
-                                    + '@cluster0.6nvuo.mongodb.net/'
-                                    + '?retryWrites=true'
-                                    + '&w=majority'
-                                    + '&appName=Cluster0'
-                                    + '&connectTimeoutMS=10000'
-                                    + '&socketTimeoutMS=10000'
-                                    + '&connect=false'
-                                    + '&maxPoolsize=1',
-                                    tlsCAFile=certifi.where())
-        else:
-            print("Connecting to Mongo locally.")
-            client = pm.MongoClient()
+        args, kwargs = client_args()
+        client = pm.MongoClient(*args, **kwargs)
     return client
 
 
+def reset_client():
+    """
+    Forget the client, so the next call connects afresh.
+    Call this in a forked child: a MongoClient is not fork-safe, and
+    the child must neither use nor close the one made in its parent.
+    """
+    global client
+    client = None
+
+
+def stamped(doc: dict) -> dict:
+    """
+    Return a copy of doc for inserting, stamped with the time it goes in.
+    """
+    return {**doc, MOD: SERVER_NOW}
+
+
+def tombstone(collection: str, doc_id) -> dict:
+    return {TOMB_COLLECTION: collection, TOMB_DOC_ID: doc_id,
+            MOD: SERVER_NOW}
+
+
+def add_observer(fn):
+    observers.append(fn)
+
+
+def remove_observer(fn):
+    if fn in observers:
+        observers.remove(fn)
+
+
+def _count_docs(ret):
+    if isinstance(ret, list):
+        return len(ret)
+    if isinstance(ret, dict):
+        return 1
+    return None
+
+
+def timed(fn):
+    """
+    Report each call of a DB function to the observers.
+    Does nothing but read the clock if there are none.
+    """
+    operation = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        ret = fn(*args, **kwargs)
+        if observers:
+            secs = time.perf_counter() - start
+            collection = args[0] if args else kwargs.get('collection')
+            ndocs = _count_docs(ret)
+            if ndocs is None and operation in READ_OPERATIONS:
+                ndocs = 0
+            for observer in observers:
+                observer(operation, collection, secs, ndocs)
+        return ret
+    return wrapper
+
+
+@timed
 def create(collection, doc, db=SE_DB):
     """
     Insert a single doc into collection.
     """
-    print(f'{db=}')
-    return client[db][collection].insert_one(doc)
+    return connect_db()[db][collection].insert_one(stamped(doc))
+
 
+@timed
+def create_many(collection, docs, db=SE_DB, ordered=True):
+    """
+    Insert a list of docs into collection in one round trip.
+    With ordered=False the server carries on past a failing doc.
+    """
+    return connect_db()[db][collection].insert_many(
+        [stamped(doc) for doc in docs], ordered=ordered)
 
+
+@timed
+def bulk_write(collection, requests, db=SE_DB, ordered=False):
+    """
+    Send a list of write ops (pymongo UpdateOne and the like) in one
+    round trip. They don't get stamped here: put STAMP in each update.
+    """
+    return connect_db()[db][collection].bulk_write(requests, ordered=ordered)
+
+
+@timed
 def fetch_one(collection, filt, db=SE_DB):
     """
     Find with a filter and return on the first doc found.
     Return None if not found.
     """
-    for doc in client[db][collection].find(filt):
+    for doc in connect_db()[db][collection].find(filt, NO_MOD):
         convert_mongo_id(doc)
 
         return doc
 
 
+@timed
 def delete(collection: str, filt: dict, db=SE_DB):
     """
-    Find with a filter and return on the first doc found.
+    Delete the first doc matching filt, leaving a tombstone.
+    Return how many docs were deleted.
+    """
+    logger.debug('Deleting from %s: %s', collection, filt)
+    database = connect_db()[db]
+    deleted = database[collection].find_one_and_delete(
+        filt, projection={MONGO_ID: 1})
+    if deleted is None:
+        return 0
+    database[TOMBSTONE_COLLECT].insert_one(
+        tombstone(collection, deleted[MONGO_ID]))
+    return 1
+
+
+@timed
+def update(collection, filters, update_dict, db=SE_DB, upsert=False):
+    return connect_db()[db][collection].update_one(
+        filters, {'$set': update_dict, **STAMP}, upsert=upsert)
+
+
+@timed
+def find_one_and_update(collection, filt, update_spec, db=SE_DB,
+                        upsert=False):
     """
-    print(f'{filt=}')
-    del_result = client[db][collection].delete_one(filt)
-    return del_result.deleted_count
+    Atomically apply update_spec (an update doc or pipeline) to the
+    first doc matching filt, and return the doc as it is afterwards.
+    Pipelines can't use $currentDate, so they don't stamp MOD.
+    """
+    if isinstance(update_spec, dict):
+        update_spec = {**update_spec, **STAMP}
+    return connect_db()[db][collection].find_one_and_update(
+        filt, update_spec, projection=NO_MOD, upsert=upsert,
+        return_document=pm.ReturnDocument.AFTER)
 
 
-def update(collection, filters, update_dict, db=SE_DB):
-    return client[db][collection].update_one(filters, {'$set': update_dict})
+@timed
+def increment(collection, filters, field, amount=1, db=SE_DB):
+    """
+    Atomically add amount to a numeric field, creating the doc
+    if no doc matches filters.
+    """
+    return connect_db()[db][collection].update_one(
+        filters, {'$inc': {field: amount}, **STAMP}, upsert=True)
 
 
-def read(collection, db=SE_DB, no_id=True) -> list:
+@timed
+def read(collection, db=SE_DB, no_id=True, filt=None) -> list:
     """
-    Return a list from the db.
+    Return a list from the db, optionally only the docs matching filt.
     """
     ret = []
-    for doc in client[db][collection].find():
+    for doc in connect_db()[db][collection].find(filt, NO_MOD):
         if no_id:
             del doc[MONGO_ID]
         else:
@@ -102,9 +255,22 @@ def read(collection, db=SE_DB, no_id=True) -> list:
     return ret
 
 
+def read_cursor(collection, filt=None, projection=None, db=SE_DB,
+                batch_size=BATCH_SIZE):
+    """
+    Return a cursor over the docs matching filt.
+    It fetches batch_size docs per round trip, so iterating over it
+    streams a collection of any size in constant memory.
+    """
+    if projection is None:
+        projection = NO_MOD
+    return connect_db()[db][collection].find(filt, projection,
+                                             batch_size=batch_size)
+
+
 def read_dict(collection, key, db=SE_DB, no_id=True) -> dict:
     recs = read(collection, db=db, no_id=no_id)
-    print(f"Raw records: {recs}")
+    logger.debug('Read %d records from %s', len(recs), collection)
     recs_as_dict = {}
     for rec in recs:
         recs_as_dict[rec[key]] = rec
@@ -113,7 +279,7 @@ def read_dict(collection, key, db=SE_DB, no_id=True) -> dict:
 
 def fetch_all_as_dict(key, collection, db=SE_DB):
     ret = {}
-    for doc in client[db][collection].find():
+    for doc in connect_db()[db][collection].find({}, NO_MOD):
         del doc[MONGO_ID]
     return ret
 
@@ -123,7 +289,16 @@ def convert_mongo_id(doc: dict):
         doc[MONGO_ID] = str(doc[MONGO_ID])
 
 
+@timed
+def aggregate(collection, pipeline, db=SE_DB) -> list:
+    """
+    Run an aggregation pipeline and return the docs it makes.
+    """
+    return list(connect_db()[db][collection].aggregate(pipeline))
+
+
+@timed
 def read_one(collection, filt, db=SE_DB):
-    for doc in client[db][collection].find(filt):
+    for doc in connect_db()[db][collection].find(filt, NO_MOD):
         convert_mongo_id(doc)
         return doc
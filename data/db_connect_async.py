@@ -0,0 +1,96 @@
+"""
+An async version of the db_connect API, over the motor driver.
+It is for the ASGI server (server/asgi.py): while one request waits
+on the DB, the event loop serves the others.
+Function names, arguments and return values match db_connect.
+"""
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import data.db_connect as dbc
+
+SE_DB = dbc.SE_DB
+MONGO_ID = dbc.MONGO_ID
+
+# One async client serves many requests at once, so it needs a
+# bigger pool than the sync one:
+POOL_SIZE = int(os.environ.get('MONGO_ASYNC_POOL_SIZE', 100))
+
+client = None
+
+
+def connect_db():
+    """
+    Create the async client on first use: motor clients must be
+    created with the event loop they will run on already running.
+    """
+    global client
+    if client is None:
+        args, kwargs = dbc.client_args()
+        client = AsyncIOMotorClient(*args, maxPoolSize=POOL_SIZE, **kwargs)
+    return client
+
+
+def close():
+    global client
+    if client is not None:
+        client.close()
+        client = None
+
+
+async def create(collection, doc, db=SE_DB):
+    return await connect_db()[db][collection].insert_one(dbc.stamped(doc))
+
+
+async def fetch_one(collection, filt, db=SE_DB):
+    """
+    Find with a filter and return the first doc found.
+    Return None if not found.
+    """
+    doc = await connect_db()[db][collection].find_one(filt, dbc.NO_MOD)
+    if doc is not None:
+        dbc.convert_mongo_id(doc)
+    return doc
+
+
+async def read_one(collection, filt, db=SE_DB):
+    return await fetch_one(collection, filt, db=db)
+
+
+async def delete(collection: str, filt: dict, db=SE_DB):
+    """
+    Delete the first doc matching filt, leaving a tombstone.
+    """
+    database = connect_db()[db]
+    deleted = await database[collection].find_one_and_delete(
+        filt, projection={MONGO_ID: 1})
+    if deleted is None:
+        return 0
+    await database[dbc.TOMBSTONE_COLLECT].insert_one(
+        dbc.tombstone(collection, deleted[MONGO_ID]))
+    return 1
+
+
+async def update(collection, filters, update_dict, db=SE_DB, upsert=False):
+    return await connect_db()[db][collection].update_one(
+        filters, {'$set': update_dict, **dbc.STAMP}, upsert=upsert)
+
+
+async def read(collection, db=SE_DB, no_id=True, filt=None) -> list:
+    """
+    Return a list from the db, optionally only the docs matching filt.
+    """
+    ret = []
+    async for doc in connect_db()[db][collection].find(filt, dbc.NO_MOD):
+        if no_id:
+            del doc[MONGO_ID]
+        else:
+            dbc.convert_mongo_id(doc)
+        ret.append(doc)
+    return ret
+
+
+async def read_dict(collection, key, db=SE_DB, no_id=True) -> dict:
+    recs = await read(collection, db=db, no_id=no_id)
+    return {rec[key]: rec for rec in recs}
@@ -0,0 +1,95 @@
+"""
+This module streams collections out as newline-delimited JSON
+(one doc per line), straight from a DB cursor.
+Nothing holds more than one batch of docs, so an export of any size
+runs in constant memory, and the first bytes go out as soon as the
+first batch arrives.
+"""
+import json
+import zlib
+
+import data.db_connect as dbc
+import data.people as ppl
+
+EXPORTABLE = {'manuscripts', ppl.PEOPLE_COLLECT, 'texts'}
+# never leave the server:
+HIDDEN_FIELDS = {'password_hash', dbc.MOD}
+
+NDJSON_MIME = 'application/x-ndjson'
+GZIP = 'gzip'
+GZIP_LEVEL = 6
+# gzip framing for zlib:
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def is_exportable(collection: str) -> bool:
+    return collection in EXPORTABLE
+
+
+def projection(fields: list = None) -> dict:
+    """
+    Mongo can't mix included and excluded fields in one projection:
+    so either include just the fields asked for, minus the hidden
+    ones, or exclude the hidden ones.
+    An empty projection would mean every field, hidden ones too: so if
+    only hidden fields were asked for, we exclude them.
+    """
+    included = {field: 1 for field in fields or []
+                if field not in HIDDEN_FIELDS}
+    if included:
+        return included
+    return {field: 0 for field in HIDDEN_FIELDS}
+
+
+def parse_fields(fields_arg: str) -> list:
+    if not fields_arg:
+        return None
+    return [field.strip() for field in fields_arg.split(',')
+            if field.strip()]
+
+
+def to_line(doc: dict) -> str:
+    # ObjectIds and datetimes come out as strings:
+    return json.dumps(doc, default=str, separators=(',', ':'))
+
+
+def ndjson(docs, batch_size: int = dbc.BATCH_SIZE):
+    """
+    Yield the docs as NDJSON, batch_size lines to a chunk.
+    """
+    lines = []
+    for doc in docs:
+        lines.append(to_line(doc))
+        if len(lines) >= batch_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzipped(chunks, level: int = GZIP_LEVEL):
+    """
+    gzip a stream of byte chunks.
+    Each chunk is flushed through, so the client gets it right away
+    rather than when the compressor's window fills.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def export(collection: str, fields: list = None, compress: bool = False,
+           batch_size: int = dbc.BATCH_SIZE):
+    """
+    Return a generator of the collection's docs as NDJSON bytes,
+    gzipped if compress is set.
+    """
+    if not is_exportable(collection):
+        raise ValueError(f'Cannot export {collection}')
+    cursor = dbc.read_cursor(collection, projection=projection(fields),
+                             batch_size=batch_size)
+    chunks = ndjson(cursor, batch_size)
+    if compress:
+        chunks = gzipped(chunks)
+    return chunks
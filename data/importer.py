@@ -0,0 +1,308 @@
+"""
+This module loads uploaded NDJSON or CSV rows into a collection.
+Rows are parsed, validated and written a batch at a time: memory
+stays bounded by the batch size, and each batch costs one
+insert_many round trip rather than a request (and an existence
+check, and a password hash) per row.
+"""
+import csv
+import io
+import json
+
+from pymongo.errors import BulkWriteError
+
+import data.blobs as blobs
+import data.db_connect as dbc
+import data.manuscripts as manu
+import data.manuscripts.fields as flds
+import data.people as ppl
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+CSV_MIMES = {'text/csv', 'application/csv'}
+
+BATCH_SIZE = 1000
+# we count every bad row, but only report this many:
+MAX_ERRORS = 1000
+
+# CSV cells holding lists, as items separated by LIST_SEP:
+LIST_FIELDS = {ppl.ROLES, flds.REFEREES, flds.HISTORY}
+LIST_SEP = ';'
+
+PASSWORD = 'password'
+PASSWORD_HASH = 'password_hash'
+PERSON_FIELDS = {ppl.NAME, ppl.AFFILIATION, ppl.EMAIL, ppl.ROLES, PASSWORD}
+REQUIRED_MANU_FIELDS = [flds.TITLE, flds.AUTHOR, flds.AUTHOR_EMAIL,
+                        flds.ABSTRACT, flds.TEXT]
+# the fields that must hold strings, and lists, when they are given:
+PERSON_STR_FIELDS = [ppl.NAME, ppl.AFFILIATION, ppl.EMAIL, PASSWORD]
+MANU_STR_FIELDS = [flds.TITLE, flds.AUTHOR, flds.AUTHOR_EMAIL, flds.ABSTRACT,
+                   flds.TEXT, flds.STATE, flds.EDITOR]
+MANU_LIST_FIELDS = [flds.REFEREES, flds.HISTORY]
+# Ids come from the DB: ones in the upload (say, from an export)
+# are dropped.
+DROPPED_FIELDS = {dbc.MONGO_ID, 'manu_id'}
+
+INSERTED = 'Inserted'
+REJECTED = 'Rejected'
+ERRORS = 'Errors'
+ROW = 'row'
+ERROR = 'error'
+
+
+def parse_ndjson(stream):
+    """
+    Yield (row number, doc, error) for each non-blank line of a
+    binary stream. Rows are numbered by line.
+    """
+    for row_num, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError as err:
+            yield row_num, None, f'Bad JSON: {err}'
+            continue
+        if not isinstance(doc, dict):
+            yield row_num, None, 'Expected a JSON object'
+            continue
+        yield row_num, doc, None
+
+
+def parse_csv(stream):
+    """
+    Yield (row number, doc, error) for each row of a binary CSV stream
+    with a header line. Empty cells are left out, and cells in
+    LIST_FIELDS become lists. Rows are numbered from 1 after the header.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    row_num = 0
+    try:
+        for row in csv.DictReader(text):
+            row_num += 1
+            if None in row:
+                yield row_num, None, 'More cells than the header has'
+                continue
+            doc = {field: value for field, value in row.items()
+                   if value not in (None, '')}
+            for field in LIST_FIELDS & doc.keys():
+                doc[field] = [item.strip()
+                              for item in doc[field].split(LIST_SEP)
+                              if item.strip()]
+            yield row_num, doc, None
+    except (csv.Error, UnicodeDecodeError) as err:
+        yield row_num + 1, None, str(err)
+    finally:
+        # don't let the wrapper close the request stream when it goes:
+        text.detach()
+
+
+def parse(stream, fmt: str):
+    if fmt == CSV:
+        return parse_csv(stream)
+    return parse_ndjson(stream)
+
+
+def check_types(doc: dict, str_fields: list, list_fields: list = ()):
+    """
+    Raise ValueError if a field of doc has the wrong type: a row that
+    got past here must not blow up once its batch is being written.
+    """
+    for field in str_fields:
+        if doc.get(field) is not None and not isinstance(doc[field], str):
+            raise ValueError(f'{field} must be a string')
+    for field in list_fields:
+        if field in doc and not isinstance(doc[field], list):
+            raise ValueError(f'{field} must be a list')
+
+
+def _check_str_list(items: list, field: str):
+    if not all(isinstance(item, str) for item in items):
+        raise ValueError(f'{field} must be a list of strings')
+
+
+def prepare_person(doc: dict) -> dict:
+    unknown = doc.keys() - PERSON_FIELDS
+    if unknown:
+        raise ValueError(f'Unknown fields: {sorted(unknown)}')
+    check_types(doc, PERSON_STR_FIELDS)
+    name = doc.get(ppl.NAME)
+    email = doc.get(ppl.EMAIL)
+    if not name or not email:
+        raise ValueError('name and email are required')
+    roles = doc.get(ppl.ROLES, [])
+    if isinstance(roles, str):
+        roles = [roles]
+    if not isinstance(roles, list):
+        raise ValueError(f'{ppl.ROLES} must be a list')
+    _check_str_list(roles, ppl.ROLES)
+    affiliation = doc.get(ppl.AFFILIATION, '')
+    ppl.is_valid_person(name, affiliation, email, roles=roles)
+    return {
+        ppl.NAME: name,
+        ppl.AFFILIATION: affiliation,
+        ppl.EMAIL: email,
+        ppl.ROLES: roles,
+        PASSWORD: doc.get(PASSWORD),
+    }
+
+
+def prepare_manuscript(doc: dict) -> dict:
+    doc = {field: value for field, value in doc.items()
+           if field not in DROPPED_FIELDS}
+    flds.validate_field_data(doc)
+    check_types(doc, MANU_STR_FIELDS, MANU_LIST_FIELDS)
+    _check_str_list(doc.get(flds.REFEREES, []), flds.REFEREES)
+    missing = [field for field in REQUIRED_MANU_FIELDS
+               if not doc.get(field)]
+    if missing:
+        raise ValueError(f'Missing required fields: {", ".join(missing)}')
+    doc.setdefault(flds.STATE, manu.SUBMITTED)
+    if not manu.is_valid_state(doc[flds.STATE]):
+        raise ValueError(f'Invalid state: {doc[flds.STATE]}')
+    doc.setdefault(flds.REFEREES, [])
+    doc.setdefault(flds.HISTORY, [])
+    return doc
+
+
+PREPARERS = {
+    ppl.PEOPLE_COLLECT: prepare_person,
+    'manuscripts': prepare_manuscript,
+}
+
+
+def is_importable(collection: str) -> bool:
+    return collection in PREPARERS
+
+
+def _reject(report: dict, row_num: int, error: str):
+    report[REJECTED] += 1
+    if len(report[ERRORS]) < MAX_ERRORS:
+        report[ERRORS].append({ROW: row_num, ERROR: error})
+
+
+def _screen_people(batch: list, seen: set, report: dict,
+                   hash_passwords) -> tuple:
+    """
+    Drop people already in the DB or earlier in the upload (one
+    query per batch), and swap passwords for hashes.
+    Return (the people to insert, row number of the first one dropped).
+    """
+    emails = [doc[ppl.EMAIL] for _, doc in batch]
+    existing = {doc[ppl.EMAIL] for doc in dbc.read_cursor(
+        ppl.PEOPLE_COLLECT, {ppl.EMAIL: {'$in': emails}}, {ppl.EMAIL: 1})}
+    kept = []
+    first_bad = None
+    for row_num, doc in batch:
+        email = doc[ppl.EMAIL]
+        if email in existing or email in seen:
+            error = f'Person with email {email} already exists'
+        elif doc[PASSWORD] and hash_passwords is None:
+            error = 'Cannot import passwords here'
+        else:
+            seen.add(email)
+            kept.append((row_num, doc))
+            continue
+        _reject(report, row_num, error)
+        if first_bad is None:
+            first_bad = row_num
+    passwords = [doc.pop(PASSWORD) for _, doc in kept]
+    hashes = passwords
+    if hash_passwords is not None and any(passwords):
+        hashes = hash_passwords(passwords)
+    for (_, doc), password_hash in zip(kept, hashes):
+        doc[PASSWORD_HASH] = password_hash
+    return kept, first_bad
+
+
+def _store_texts(batch: list) -> list:
+    """
+    Move manuscript bodies to the blob store, as Manuscripts.post does.
+    """
+    for _, doc in batch:
+        doc[flds.TEXT_BLOB] = blobs.put_text(doc.pop(flds.TEXT))
+    return batch
+
+
+def _write(collection: str, batch: list, ordered: bool,
+           report: dict, on_insert=None) -> bool:
+    """
+    Insert the batch, passing the docs that went in to on_insert;
+    return whether every doc went in.
+    """
+    if not batch:
+        return True
+    docs = [doc for _, doc in batch]
+    try:
+        result = dbc.create_many(collection, docs, ordered=ordered)
+        report[INSERTED] += len(result.inserted_ids)
+        failed = set()
+    except BulkWriteError as err:
+        inserted = err.details.get('nInserted', 0)
+        report[INSERTED] += inserted
+        failed = set()
+        for write_error in err.details.get('writeErrors', []):
+            failed.add(write_error['index'])
+            row_num = batch[write_error['index']][0]
+            _reject(report, row_num, write_error.get('errmsg'))
+        if ordered:
+            # an ordered insert stops at the first error
+            failed.update(range(inserted, len(docs)))
+    if on_insert:
+        on_insert([doc for i, doc in enumerate(docs) if i not in failed])
+    return not failed
+
+
+def load(collection: str, rows, ordered: bool = False,
+         batch_size: int = BATCH_SIZE, hash_passwords=None,
+         on_insert=None) -> dict:
+    """
+    Validate and insert rows of (row number, doc, error), as the
+    parsers yield them. Bad rows are reported by row number.
+    With ordered set we stop at the first bad row, having inserted
+    the rows before it.
+    hash_passwords(list) -> list hashes people's passwords in bulk;
+    without it, people with passwords are rejected.
+    on_insert(list) is passed the docs of each batch that went in.
+    """
+    if not is_importable(collection):
+        raise ValueError(f'Cannot import into {collection}')
+    prepare = PREPARERS[collection]
+    report = {INSERTED: 0, REJECTED: 0, ERRORS: []}
+    seen = set()
+    batch = []
+
+    def flush() -> bool:
+        nonlocal batch
+        to_write, batch = batch, []
+        if collection == ppl.PEOPLE_COLLECT:
+            to_write, first_bad = _screen_people(to_write, seen, report,
+                                                 hash_passwords)
+            if ordered and first_bad is not None:
+                _write(collection,
+                       [(row_num, doc) for row_num, doc in to_write
+                        if row_num < first_bad],
+                       ordered, report, on_insert)
+                return False
+        else:
+            to_write = _store_texts(to_write)
+        return _write(collection, to_write, ordered, report, on_insert)
+
+    for row_num, doc, error in rows:
+        if error is None:
+            try:
+                doc = prepare(doc)
+            except (ValueError, TypeError) as err:
+                error = str(err)
+        if error is not None:
+            _reject(report, row_num, error)
+            if ordered:
+                flush()
+                return report
+            continue
+        batch.append((row_num, doc))
+        if len(batch) >= batch_size and not flush() and ordered:
+            return report
+    flush()
+    return report
@@ -0,0 +1,50 @@
+"""
+This module makes the indexes our queries count on. gunicorn makes
+them as it starts (see gunicorn.conf.py); or run:
+
+    python -m data.indexes
+
+Making an index that is there already does nothing, so it is safe to
+do every time.
+"""
+from pymongo import ASCENDING, DESCENDING
+
+import data.db_connect as dbc
+import data.log as log
+import data.manuscripts.fields as flds
+import data.manuscripts.listing as listing
+import data.people as ppl
+
+logger = log.get_logger(__name__)
+
+# (collection, keys, options) for each index:
+INDEXES = [
+    # people by role, as when finding referees:
+    (ppl.PEOPLE_COLLECT, [(ppl.ROLES, ASCENDING)], {}),
+    # A referee's manuscripts, newest first (see listing.py). Mongo
+    # indexes each element of the referees array: a multikey index.
+    (listing.MANU_COLLECT,
+     [(flds.REFEREES, ASCENDING), (dbc.MONGO_ID, DESCENDING)], {}),
+    # an author's manuscripts, newest first, and their counts by state:
+    (listing.MANU_COLLECT,
+     [(flds.AUTHOR_EMAIL, ASCENDING), (dbc.MONGO_ID, DESCENDING)], {}),
+    (listing.MANU_COLLECT,
+     [(flds.AUTHOR_EMAIL, ASCENDING), (flds.STATE, ASCENDING)], {}),
+]
+
+
+def ensure(db=dbc.SE_DB) -> list:
+    """
+    Make any of INDEXES that aren't there. Return their names.
+    """
+    database = dbc.connect_db()[db]
+    names = []
+    for collection, keys, options in INDEXES:
+        names.append(database[collection].create_index(keys, **options))
+        logger.info('Index %s on %s is in place', names[-1], collection)
+    return names
+
+
+if __name__ == '__main__':
+    log.configure()
+    ensure()
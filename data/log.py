@@ -0,0 +1,134 @@
+"""
+This module sets up leveled, structured logging for the app.
+Log lines are JSON (or plain text, for local runs), and each one
+carries the id of the request it was logged during.
+Use it like this:
+
+    import data.log as log
+    logger = log.get_logger(__name__)
+    logger.debug('Read %d docs from %s', len(docs), collection)
+
+Always pass arguments rather than pre-formatting the message:
+then a line below the log level costs almost nothing.
+Nothing is sent anywhere until configure() is called: create_app()
+and the command line entry points call it.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+JSON = 'json'
+TEXT = 'text'
+LOG_FORMAT = os.environ.get('LOG_FORMAT', JSON)
+# Fraction of DEBUG lines to keep: high-volume debug output can
+# be left on in production at a low rate.
+DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# ids passed in by clients must look like this, or we make our own:
+VALID_REQUEST_ID = re.compile('[A-Za-z0-9._-]{1,64}')
+# Extra structured fields go in extra={FIELDS: {...}}:
+FIELDS = 'fields'
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+
+configured = False
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugSampleFilter(logging.Filter):
+    """
+    Keep only DEBUG_SAMPLE_RATE of DEBUG records; pass all others.
+    """
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or DEBUG_SAMPLE_RATE >= 1:
+            return True
+        return random.random() < DEBUG_SAMPLE_RATE
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        req_id = getattr(record, 'request_id', None)
+        if req_id:
+            entry['request_id'] = req_id
+        entry.update(getattr(record, FIELDS, None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def make_handler(fmt: str = None, stream=None) -> logging.Handler:
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if (fmt or LOG_FORMAT) == TEXT:
+        formatter = logging.Formatter(TEXT_FORMAT)
+        formatter.converter = time.gmtime
+        handler.setFormatter(formatter)
+    else:
+        handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSampleFilter())
+    return handler
+
+
+def configure(level: str = None, fmt: str = None):
+    """
+    Send the app's logs to stderr. Safe to call more than once.
+    """
+    global configured
+    app_logger = logging.getLogger()
+    if not configured:
+        app_logger.addHandler(make_handler(fmt))
+        configured = True
+    app_logger.setLevel(level or LOG_LEVEL)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Importing a module shouldn't change where logs go, so this does
+    not configure(): the app and the command line entry points do.
+    """
+    return logging.getLogger(name)
+
+
+def new_request_id() -> str:
+    return os.urandom(8).hex()
+
+
+def clean_request_id(req_id: str = None) -> str:
+    """
+    Return req_id, or a new id if there is none or it looks malformed.
+    """
+    if not req_id or not VALID_REQUEST_ID.fullmatch(req_id):
+        return new_request_id()
+    return req_id
+
+
+def set_request_id(req_id: str = None) -> str:
+    """
+    Tag log lines from here on (in this thread or task) with req_id,
+    or with a new id if there is none or it looks malformed.
+    A request should rather set request_id itself, with
+    clean_request_id(), and reset it with the token when it ends.
+    """
+    req_id = clean_request_id(req_id)
+    request_id.set(req_id)
+    return req_id
@@ -10,6 +10,16 @@ ABSTRACT = 'abstract'
 HISTORY = 'history'
 EDITOR = 'editor'
 DISP_NAME = 'disp_name'
+# The text lives in the blob store; this holds the blobs.put() ref.
+# It is not in FIELDS: clients send TEXT.
+TEXT_BLOB = 'text_blob'
+# The number of the newest revision in data/revisions.py, once an
+# author has revised the text: that, not TEXT_BLOB, is the text then.
+TEXT_REVISION = 'text_revision'
+# The journal a manuscript was submitted to: it goes through that
+# journal's workflow (workflow.for_journal()), or the default one if
+# it has none.
+JOURNAL = 'journal'
 
 TEST_FLD_NM = TITLE
 TEST_FLD_DISP_NM = 'Title'
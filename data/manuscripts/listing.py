@@ -0,0 +1,106 @@
+"""
+This module lists the manuscripts that concern one person, a page at
+a time, as short summaries: the ones a referee is assigned, or an
+author has submitted.
+Each list is one query on an index that holds the person first and
+the manuscript _id after, so a page costs the same however many
+manuscripts there are. Pages run newest first; to get the next one,
+pass the NEXT of the last as after.
+"""
+from bson import ObjectId
+from bson.errors import InvalidId
+
+import data.db_connect as dbc
+import data.manuscripts.fields as flds
+import data.manuscripts.query as qry
+
+MANU_COLLECT = 'manuscripts'
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# what a summary holds:
+SUMMARY_FIELDS = {flds.TITLE: 1, flds.AUTHOR: 1, flds.AUTHOR_EMAIL: 1,
+                  flds.STATE: 1, flds.REFEREES: 1, flds.JOURNAL: 1}
+ACTIONS = 'actions'
+
+# the fields of a page:
+ITEMS = 'Items'
+NEXT = 'Next'
+COUNTS = 'Counts'
+TOTAL = 'Total'
+
+
+def page(filt: dict, after: str = None, limit: int = PAGE_SIZE,
+         db=dbc.SE_DB) -> dict:
+    """
+    Return a page of summaries of the manuscripts matching filt, newest
+    first, starting after the manuscript with _id after.
+    NEXT is the after for the next page, or None if this is the last.
+    Raises ValueError for a bad after.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if after:
+        try:
+            filt = {**filt, dbc.MONGO_ID: {'$lt': ObjectId(after)}}
+        except (InvalidId, TypeError):
+            raise ValueError(f'Bad after: {after}')
+    # one more than we need, to tell whether there is a next page
+    docs = list(dbc.read_cursor(MANU_COLLECT, filt, SUMMARY_FIELDS, db=db,
+                                batch_size=limit + 1)
+                .sort(dbc.MONGO_ID, -1).limit(limit + 1))
+    more = len(docs) > limit
+    docs = docs[:limit]
+    for doc in docs:
+        dbc.convert_mongo_id(doc)
+    return {ITEMS: docs,
+            NEXT: docs[-1][dbc.MONGO_ID] if more else None}
+
+
+def add_actions(summaries: list, role_codes: list) -> list:
+    """
+    Add to each summary the actions someone with role_codes can take
+    on it now.
+    """
+    for summary in summaries:
+        workflow = qry.workflow_for(summary)
+        summary[ACTIONS] = qry.filter_actions_by_roles(
+            qry.get_available_actions(summary, workflow), role_codes,
+            workflow)
+    return summaries
+
+
+def for_referee(email: str, role_codes: list, after: str = None,
+                limit: int = PAGE_SIZE, db=dbc.SE_DB) -> dict:
+    """
+    Return a page of the manuscripts email is a referee of, with what
+    they can do to each.
+    """
+    ret = page({flds.REFEREES: email}, after, limit, db=db)
+    add_actions(ret[ITEMS], role_codes)
+    return ret
+
+
+def state_counts(filt: dict, db=dbc.SE_DB) -> dict:
+    """
+    Count the manuscripts matching filt by state, in one aggregation.
+    With an index on filt's field and state it never reads a doc.
+    """
+    return {doc[dbc.MONGO_ID]: doc['count'] for doc in dbc.aggregate(
+        MANU_COLLECT, [{'$match': filt},
+                       {'$group': {dbc.MONGO_ID: f'${flds.STATE}',
+                                   'count': {'$sum': 1}}}], db=db)}
+
+
+def for_author(email: str, role_codes: list, after: str = None,
+               limit: int = PAGE_SIZE, db=dbc.SE_DB) -> dict:
+    """
+    Return a page of the manuscripts email has submitted, with what
+    they can do to each, and how many they have in each state.
+    """
+    filt = {flds.AUTHOR_EMAIL: email}
+    ret = page(filt, after, limit, db=db)
+    add_actions(ret[ITEMS], role_codes)
+    ret[COUNTS] = state_counts(filt, db=db)
+    ret[TOTAL] = sum(ret[COUNTS].values())
+    return ret
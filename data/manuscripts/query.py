@@ -1,6 +1,12 @@
+from copy import deepcopy
+
+import data.log as log
 import data.manuscripts.fields as flds
+import data.manuscripts.workflow as wf
 import data.roles as rls
 
+logger = log.get_logger(__name__)
+
 ACTION = 'action'
 AUTHOR = 'author'
 CURR_STATE = 'curr_state'
@@ -137,118 +143,78 @@ def is_valid_action(action: str) -> bool:
 
 
 def submitted(manu: dict):
-    print(f"Manuscript '{manu[flds.TITLE]}' is SUBMITTED")
+    logger.info("Manuscript '%s' is SUBMITTED", manu[flds.TITLE])
     manu['state'] = SUBMITTED
     add_to_history(manu, None, 'SUBMIT', SUBMITTED)
     return SUBMITTED
 
 
-def assign_ref(manu: dict, referee: str, extra=None) -> str:
-    manu[REFEREES].append(referee)
-    return IN_REF_REV
+@wf.guard
+def has_referee(referee=None, **kwargs) -> bool:
+    return bool(referee)
 
 
-def delete_ref(manu: dict, referee: str) -> str:
-    if referee in manu[flds.REFEREES]:
-        manu[REFEREES].remove(referee)
-    if len(manu[flds.REFEREES]) == 0:
-        return SUBMITTED
-    else:
-        return IN_REF_REV
+@wf.guard
+def removes_last_referee(manu: dict, referee=None, **kwargs) -> bool:
+    return all(ref == referee for ref in manu[flds.REFEREES])
 
-# if kwargs is not added
-# test_handle_action_valid_return -
-# TypeError: accept_with_revisions() got an unexpected keyword argument 'referee'
-def accept(manu: dict,  extra=None, **kwargs) -> str :
-    return COPY_EDIT
 
+@wf.effect
+def assign_ref(manu: dict, referee: str, **kwargs):
+    manu[REFEREES].append(referee)
 
-FUNC = 'f'
 
-COMMON_ACTIONS = {
-    WITHDRAW: {
-        FUNC: lambda **kwargs: WITHDRAWN,
-    },
-}
+@wf.effect
+def delete_ref(manu: dict, referee: str, **kwargs):
+    if referee in manu[flds.REFEREES]:
+        manu[REFEREES].remove(referee)
 
-STATE_TABLE = {
-    SUBMITTED: {
-        ASSIGN_REF: {
-            FUNC: assign_ref,
-        },
-        REJECT: {
-            FUNC: lambda **kwargs: REJECTED,
-        },
-        **COMMON_ACTIONS,
-    },
-    IN_REF_REV: {
-        ASSIGN_REF: {
-            FUNC: assign_ref,
-        },
-        DELETE_REF: {
-            FUNC: delete_ref,
-        },
-        REJECT: {
-            FUNC: lambda **kwargs: REJECTED,
-        },
-        ACCEPT: {
-            FUNC: accept,
-        },
-        ACCEPT_REV: {
-            FUNC: lambda **kwargs: AUTHOR_REVISIONS,
-        },
-        SUBMIT_REVIEW: {
-            FUNC: lambda **kwargs: IN_REF_REV
-        },
-        **COMMON_ACTIONS,
-    },
-    AUTHOR_REVISIONS: {
-        DONE: {
-            FUNC: lambda **kwargs: EDITOR_REV,
-        },
-        **COMMON_ACTIONS,
-    },
-    REJECTED: {
-        **COMMON_ACTIONS,
-    },
-    WITHDRAWN: {
-        **COMMON_ACTIONS,
-    },
-    EDITOR_REV: {
-        ACCEPT: {
-            FUNC: accept,
-        },
-        **COMMON_ACTIONS,
-    },
-    COPY_EDIT: {
-        DONE: {
-            FUNC: lambda **kwargs: AUTHOR_REVIEW,
-        },
-        **COMMON_ACTIONS,
-    },
-    AUTHOR_REVIEW:{
-        DONE: {
-            FUNC: lambda **kwargs: FORMATTING,
-        },
-        **COMMON_ACTIONS,
-    },
-    FORMATTING: {
-        DONE: {
-            FUNC: lambda **kwargs: PUBLISHED,
-        },
-        **COMMON_ACTIONS,
-    },
-    PUBLISHED: {
-        **COMMON_ACTIONS,
-    },
+
+def _trans(from_state, action, to_state, guard=None, effect=None) -> dict:
+    trans = {wf.FROM: from_state, wf.ACTION: action, wf.TO: to_state}
+    if guard:
+        trans[wf.GUARD] = guard
+    if effect:
+        trans[wf.EFFECT] = effect
+    return trans
+
+
+# The journal's workflow, as data: see workflow.py.
+WORKFLOW_SPEC = {
+    wf.NAME: wf.DEFAULT_JOURNAL,
+    wf.INITIAL: SUBMITTED,
+    wf.STATES: VALID_STATES,
+    wf.FINAL: [REJECTED, WITHDRAWN, PUBLISHED],
+    wf.TRANSITIONS: [
+        _trans(SUBMITTED, ASSIGN_REF, IN_REF_REV, 'has_referee',
+               'assign_ref'),
+        _trans(SUBMITTED, REJECT, REJECTED),
+        _trans(IN_REF_REV, ASSIGN_REF, IN_REF_REV, 'has_referee',
+               'assign_ref'),
+        _trans(IN_REF_REV, DELETE_REF, SUBMITTED, 'removes_last_referee',
+               'delete_ref'),
+        _trans(IN_REF_REV, DELETE_REF, IN_REF_REV, effect='delete_ref'),
+        _trans(IN_REF_REV, REJECT, REJECTED),
+        _trans(IN_REF_REV, ACCEPT, COPY_EDIT),
+        _trans(IN_REF_REV, ACCEPT_REV, AUTHOR_REVISIONS),
+        _trans(IN_REF_REV, SUBMIT_REVIEW, IN_REF_REV),
+        _trans(AUTHOR_REVISIONS, DONE, EDITOR_REV),
+        _trans(EDITOR_REV, ACCEPT, COPY_EDIT),
+        _trans(COPY_EDIT, DONE, AUTHOR_REVIEW),
+        _trans(AUTHOR_REVIEW, DONE, FORMATTING),
+        _trans(FORMATTING, DONE, PUBLISHED),
+        _trans(wf.ANY_STATE, WITHDRAW, WITHDRAWN),
+    ],
+    wf.ROLES: {role: sorted(actions)
+               for role, actions in ROLE_PERMISSIONS.items()},
 }
 
+WORKFLOW = wf.Workflow(WORKFLOW_SPEC)
+wf.register(wf.DEFAULT_JOURNAL, WORKFLOW)
 
 
 def get_valid_actions_by_state(state: str):
-    valid_actions = STATE_TABLE[state].keys()
-    print(f'{valid_actions=}')
-    return valid_actions
+    return WORKFLOW.actions_for(state)
 
 
 def add_to_history(manuscript: dict, curr_state: str, action: str, new_state: str):
@@ -262,22 +228,27 @@ def add_to_history(manuscript: dict, curr_state: str, action: str, new_state: st
 
 def reset_history(manuscript: dict):
     manuscript['history'] = []
-    print("History has been reset.")
+    logger.debug('History has been reset.')
+
 
+def workflow_for(manu: dict) -> wf.Workflow:
+    """
+    The workflow of the journal manu was submitted to.
+    """
+    return wf.for_journal(manu.get(flds.JOURNAL) or wf.DEFAULT_JOURNAL)
 
-def handle_action(manu_id, curr_state, action, **kwargs) -> dict:
+
+def handle_action(manu_id, curr_state, action, workflow=None,
+                  **kwargs) -> dict:
+    """
+    Take action on the manuscript passed as manu, in its journal's
+    workflow unless another is given. kwargs go to its guards and
+    effects. Raises ValueError if the action can't be taken.
+    """
     if 'manu' not in kwargs:
         raise ValueError("Manuscript not provided")
-    manu_dict = kwargs['manu']
-
-    if curr_state not in STATE_TABLE:
-        raise ValueError(f'Bad state: {curr_state}')
-    if action not in STATE_TABLE[curr_state]:
-        raise ValueError(f'{action} not available in {curr_state}')
-    new_state = STATE_TABLE[curr_state][action][FUNC](**kwargs)
-    if not isinstance(new_state, str):
-        raise ValueError(f'Invalid state transition: {new_state}')
-    return {"new_state": new_state}
+    workflow = workflow or workflow_for(kwargs['manu'])
+    return {"new_state": workflow.next_state(curr_state, action, **kwargs)}
 
 
 def get_history(manu: dict):
@@ -288,10 +259,11 @@ def get_current_state(manu: dict) -> str:
     return manu.get('state', 'Unknown')
 
 
-def get_available_actions(manu: dict):
+def get_available_actions(manu: dict, workflow=None):
+    workflow = workflow or workflow_for(manu)
     state = get_current_state(manu)
-    if state in STATE_TABLE:
-        return list(STATE_TABLE[state].keys())
+    if state in workflow.state_ids:
+        return list(workflow.actions_for(state))
     return []
 
 def get_state_display_names():
@@ -300,44 +272,46 @@ def get_state_display_names():
 def get_action_display_names():
     return ACTION_DISPLAY_NAMES
 
-def filter_actions_by_roles(actions, role_codes):
-    allowed = set()
-    for code in role_codes:
-        allowed.update(ROLE_PERMISSIONS.get(code, []))
-
-    return [action for action in actions if action in allowed]
+def filter_actions_by_roles(actions, role_codes, workflow=None):
+    """
+    Pass the manuscript's workflow (workflow_for()): the roles may do
+    different things in other journals than in the default one.
+    """
+    return (workflow or WORKFLOW).filter_by_roles(actions, role_codes)
 
 
 def main():
+    manu = deepcopy(SAMPLE_MANU)
     print("Submitted")
-    print(handle_action(TEST_ID, SUBMITTED, WITHDRAW))
-    print(handle_action(TEST_ID, SUBMITTED, REJECT))
-    print(handle_action(TEST_ID, SUBMITTED, ASSIGN_REF, referee='Jack'))
+    print(handle_action(TEST_ID, SUBMITTED, WITHDRAW, manu=manu))
+    print(handle_action(TEST_ID, SUBMITTED, REJECT, manu=manu))
+    print(handle_action(TEST_ID, SUBMITTED, ASSIGN_REF, manu=manu,
+                        referee='Jack'))
 
     print("Referee Review")
-    print(handle_action(TEST_ID, IN_REF_REV, ASSIGN_REF,
+    print(handle_action(TEST_ID, IN_REF_REV, ASSIGN_REF, manu=manu,
                         referee='Jill', extra='Extra!'))
-    print(handle_action(TEST_ID, IN_REF_REV, DELETE_REF,
+    print(handle_action(TEST_ID, IN_REF_REV, DELETE_REF, manu=manu,
                         referee='Jill'))
-    print(handle_action(TEST_ID, IN_REF_REV, ACCEPT))
-    print(handle_action(TEST_ID, IN_REF_REV, ACCEPT_REV))
+    print(handle_action(TEST_ID, IN_REF_REV, ACCEPT, manu=manu))
+    print(handle_action(TEST_ID, IN_REF_REV, ACCEPT_REV, manu=manu))
 
     print("Author Revisions")
-    print(handle_action(TEST_ID, AUTHOR_REVISIONS, DONE))
+    print(handle_action(TEST_ID, AUTHOR_REVISIONS, DONE, manu=manu))
 
     print("Editor Review")
-    print(handle_action(TEST_ID, EDITOR_REV, ACCEPT))
-    print(handle_action(TEST_ID, EDITOR_REV, WITHDRAW))
+    print(handle_action(TEST_ID, EDITOR_REV, ACCEPT, manu=manu))
+    print(handle_action(TEST_ID, EDITOR_REV, WITHDRAW, manu=manu))
 
     print("Copy Edit")
-    print(handle_action(TEST_ID, COPY_EDIT, DONE))
+    print(handle_action(TEST_ID, COPY_EDIT, DONE, manu=manu))
 
     print("Author Review")
-    print(handle_action(TEST_ID, AUTHOR_REVIEW, DONE))
-    print(handle_action(TEST_ID, AUTHOR_REVIEW, WITHDRAW))
+    print(handle_action(TEST_ID, AUTHOR_REVIEW, DONE, manu=manu))
+    print(handle_action(TEST_ID, AUTHOR_REVIEW, WITHDRAW, manu=manu))
 
     print("Formatting")
-    print(handle_action(TEST_ID, FORMATTING, DONE))
+    print(handle_action(TEST_ID, FORMATTING, DONE, manu=manu))
 
 
 if __name__ == '__main__':
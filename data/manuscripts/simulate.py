@@ -0,0 +1,317 @@
+"""
+This module drives synthetic manuscripts through the workflow, to see
+how the workflow path holds up under load. Worker threads play
+editors, referees and authors, each time picking a manuscript (most
+often from a small hot set, so they collide), reading it and taking
+an action its state and their role allow, the way ReceiveAction does:
+endpoints.plan_action() works it out, and the update only matches the
+manuscript as it was read (endpoints.action_filter()). It reports
+transitions a second, latency percentiles over every attempt and how
+often updates conflicted. Auditing and workloads are left out, as
+they would write to the real database.
+The manuscripts live in memory, or in a scratch Mongo database:
+
+    python -m data.manuscripts.simulate --manuscripts 1000 --workers 8
+    python -m data.manuscripts.simulate --store mongo
+"""
+import argparse
+import copy
+import json
+import random
+import time
+from collections import Counter
+from threading import Lock, Thread
+
+from bson import ObjectId
+
+import data.db_connect as dbc
+import data.log as log
+import data.manuscripts.fields as flds
+import data.manuscripts.query as qry
+import data.roles as rls
+import server.endpoints as ep
+
+SIM_DB = 'seSimDB'
+SIM_COLLECT = 'manuscripts'
+
+MEMORY = 'memory'
+MONGO = 'mongo'
+
+# How often each role acts: editors do most of the work. Authors
+# can only withdraw, so they act seldom, or nothing would finish.
+ROLE_WEIGHTS = {rls.ED_CODE: 80, rls.RE_CODE: 15, rls.AUTHOR_CODE: 5}
+# this share of actions go to the first HOT_COUNT manuscripts:
+HOT_SHARE = 0.5
+HOT_COUNT = 10
+
+# the fields of a report:
+OPS = 'ops'
+TRANSITIONS = 'transitions'
+CONFLICTS = 'conflicts'
+REJECTED = 'rejected'
+SECS = 'secs'
+PER_SEC = 'transitions_per_sec'
+P50_MS = 'p50_ms'
+P99_MS = 'p99_ms'
+CONFLICT_RATE = 'conflict_rate'
+FINAL_STATES = 'final_states'
+
+
+def matches(doc: dict, filt: dict) -> bool:
+    """
+    Whether doc matches filt, for the filters endpoints.action_filter()
+    makes: equal values, or {'$exists': False}.
+    """
+    for field, want in filt.items():
+        if want == {'$exists': False}:
+            if field in doc:
+                return False
+        elif doc.get(field) != want:
+            return False
+    return True
+
+
+class MemoryStore:
+    """
+    Manuscripts in a dict. update() only changes a manuscript that
+    matches, as MongoStore's does.
+    """
+    def __init__(self):
+        self.docs = {}
+        self.lock = Lock()
+
+    def insert(self, docs: list):
+        with self.lock:
+            for doc in docs:
+                self.docs[doc[dbc.MONGO_ID]] = copy.deepcopy(doc)
+
+    def load(self, manu_id: str) -> dict:
+        with self.lock:
+            return copy.deepcopy(self.docs[ObjectId(manu_id)])
+
+    def update(self, filt: dict, changes: dict) -> bool:
+        with self.lock:
+            doc = self.docs.get(filt[dbc.MONGO_ID])
+            if doc is None or not matches(doc, filt):
+                return False
+            doc.update(copy.deepcopy(changes))
+            return True
+
+    def all(self) -> list:
+        with self.lock:
+            return list(self.docs.values())
+
+    def close(self):
+        pass
+
+
+class MongoStore:
+    """
+    Manuscripts in a scratch database, dropped on close().
+    """
+    def __init__(self, db: str = SIM_DB):
+        self.db = db
+        self.collection = dbc.connect_db()[db][SIM_COLLECT]
+        self.collection.drop()
+
+    def insert(self, docs: list):
+        dbc.create_many(SIM_COLLECT, docs, db=self.db)
+
+    def load(self, manu_id: str) -> dict:
+        return dbc.read_one(SIM_COLLECT, {dbc.MONGO_ID: ObjectId(manu_id)},
+                            db=self.db)
+
+    def update(self, filt: dict, changes: dict) -> bool:
+        result = dbc.update(SIM_COLLECT, filt, changes, db=self.db)
+        return result.matched_count == 1
+
+    def all(self) -> list:
+        return dbc.read(SIM_COLLECT, db=self.db)
+
+    def close(self):
+        self.collection.drop()
+
+
+STORES = {MEMORY: MemoryStore, MONGO: MongoStore}
+
+
+def make_people(count: int, role: str) -> list:
+    return [f'{role.lower()}{num}@sim.example' for num in range(count)]
+
+
+def make_manuscripts(count: int, authors: list, rng) -> list:
+    return [{
+        dbc.MONGO_ID: ObjectId(),
+        flds.TITLE: f'Synthetic manuscript {num}',
+        flds.AUTHOR_EMAIL: rng.choice(authors),
+        flds.STATE: qry.SUBMITTED,
+        flds.REFEREES: [],
+        flds.HISTORY: [],
+    } for num in range(count)]
+
+
+def percentile(sorted_secs: list, share: float) -> float:
+    if not sorted_secs:
+        return 0.0
+    return sorted_secs[min(len(sorted_secs) - 1,
+                           int(share * len(sorted_secs)))]
+
+
+class Simulation:
+    def __init__(self, store, manuscripts: int = 1000, editors: int = 5,
+                 referees: int = 20, authors: int = 50, workers: int = 4,
+                 ops: int = 10_000, seed: int = 0):
+        self.store = store
+        self.workers = workers
+        self.ops_left = ops
+        self.seed = seed
+        rng = random.Random(seed)
+        self.people = {
+            rls.ED_CODE: make_people(editors, rls.ED_CODE),
+            rls.RE_CODE: make_people(referees, rls.RE_CODE),
+            rls.AUTHOR_CODE: make_people(authors, rls.AUTHOR_CODE),
+        }
+        docs = make_manuscripts(manuscripts, self.people[rls.AUTHOR_CODE],
+                                rng)
+        self.store.insert(docs)
+        self.open_ids = [str(doc[dbc.MONGO_ID]) for doc in docs]
+        self.lock = Lock()
+        self.counts = Counter()
+        self.latencies = []
+
+    def _take_op(self) -> bool:
+        with self.lock:
+            if self.ops_left <= 0 or not self.open_ids:
+                return False
+            self.ops_left -= 1
+            return True
+
+    def _pick_manuscript(self, rng):
+        with self.lock:
+            if not self.open_ids:
+                return None
+            if rng.random() < HOT_SHARE:
+                return rng.choice(self.open_ids[:HOT_COUNT])
+            return rng.choice(self.open_ids)
+
+    def _finish(self, manu_id):
+        with self.lock:
+            if manu_id in self.open_ids:
+                self.open_ids.remove(manu_id)
+
+    def _referee(self, action: str, doc: dict, rng):
+        if action == qry.ASSIGN_REF:
+            return rng.choice(self.people[rls.RE_CODE])
+        if action == qry.DELETE_REF:
+            return rng.choice(doc[flds.REFEREES]
+                              or self.people[rls.RE_CODE])
+        return None
+
+    def step(self, rng) -> str:
+        """
+        Have one actor take one action. Return what happened: a count
+        name for the report, or None if there was nothing to do.
+        """
+        manu_id = self._pick_manuscript(rng)
+        if manu_id is None:
+            return None
+        role = rng.choices(list(ROLE_WEIGHTS),
+                           weights=list(ROLE_WEIGHTS.values()))[0]
+        doc = self.store.load(manu_id)
+        state = doc[flds.STATE]
+        workflow = qry.workflow_for(doc)
+        actions = qry.filter_actions_by_roles(
+            qry.get_available_actions(doc, workflow), [role], workflow)
+        if not actions:
+            return None
+        action = rng.choice(actions)
+        try:
+            _, update_fields = ep.plan_action(
+                rng.choice(self.people[role]), {'roles': [role]}, doc,
+                manu_id, state, action, self._referee(action, doc, rng))
+        except ValueError:
+            return REJECTED
+        if not self.store.update(ep.action_filter(manu_id, doc),
+                                 update_fields):
+            return CONFLICTS
+        if update_fields[flds.STATE] in workflow.final:
+            self._finish(manu_id)
+        return TRANSITIONS
+
+    def _work(self, worker_num: int):
+        rng = random.Random(self.seed * 1000 + worker_num)
+        counts = Counter()
+        latencies = []
+        while self._take_op():
+            start = time.perf_counter()
+            outcome = self.step(rng)
+            secs = time.perf_counter() - start
+            counts[OPS] += 1
+            if outcome:
+                # conflicts and rejections cost the caller time too
+                counts[outcome] += 1
+                latencies.append(secs)
+        with self.lock:
+            self.counts.update(counts)
+            self.latencies.extend(latencies)
+
+    def run(self) -> dict:
+        start = time.perf_counter()
+        threads = [Thread(target=self._work, args=(num,))
+                   for num in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        secs = time.perf_counter() - start
+        return self.report(secs)
+
+    def report(self, secs: float) -> dict:
+        latencies = sorted(self.latencies)
+        transitions = self.counts[TRANSITIONS]
+        writes = transitions + self.counts[CONFLICTS]
+        return {
+            OPS: self.counts[OPS],
+            TRANSITIONS: transitions,
+            CONFLICTS: self.counts[CONFLICTS],
+            REJECTED: self.counts[REJECTED],
+            SECS: round(secs, 3),
+            PER_SEC: round(transitions / secs, 1) if secs else 0.0,
+            P50_MS: round(percentile(latencies, 0.50) * 1000, 3),
+            P99_MS: round(percentile(latencies, 0.99) * 1000, 3),
+            CONFLICT_RATE: round(self.counts[CONFLICTS] / writes, 4)
+            if writes else 0.0,
+            FINAL_STATES: dict(Counter(
+                doc[flds.STATE] for doc in self.store.all()
+                if doc[flds.STATE] in qry.workflow_for(doc).final)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Drive synthetic manuscripts through the workflow '
+                    'and report how fast it goes.')
+    parser.add_argument('--store', choices=sorted(STORES), default=MEMORY)
+    parser.add_argument('--manuscripts', type=int, default=1000)
+    parser.add_argument('--editors', type=int, default=5)
+    parser.add_argument('--referees', type=int, default=20)
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=10_000,
+                        help='Actions to try, all workers together')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    log.configure()
+    store = STORES[args.store]()
+    try:
+        sim = Simulation(store, manuscripts=args.manuscripts,
+                         editors=args.editors, referees=args.referees,
+                         authors=args.authors, workers=args.workers,
+                         ops=args.ops, seed=args.seed)
+        print(json.dumps(sim.run(), indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
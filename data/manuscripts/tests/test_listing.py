@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import pytest
+from bson import ObjectId
+
+import data.manuscripts.listing as listing
+import data.manuscripts.query as mqry
+import data.manuscripts.workflow as wf
+import data.roles as rls
+
+IDS = [ObjectId() for _ in range(3)]
+
+
+def summaries(n: int) -> list:
+    return [{'_id': IDS[i], 'title': f'T{i}', 'state': mqry.IN_REF_REV}
+            for i in range(n)]
+
+
+@patch('data.db_connect.read_cursor', autospec=True)
+def test_page(mock_read_cursor):
+    cursor = mock_read_cursor.return_value.sort.return_value
+    cursor.limit.return_value = summaries(3)
+    ret = listing.page({'referees': 'r@nyu.edu'}, limit=2)
+    assert [doc['title'] for doc in ret[listing.ITEMS]] == ['T0', 'T1']
+    assert ret[listing.NEXT] == str(IDS[1])
+    cursor.limit.assert_called_once_with(3)
+
+
+@patch('data.db_connect.read_cursor', autospec=True)
+def test_page_last(mock_read_cursor):
+    cursor = mock_read_cursor.return_value.sort.return_value
+    cursor.limit.return_value = summaries(1)
+    ret = listing.page({}, after=str(IDS[2]))
+    assert ret[listing.NEXT] is None
+    filt = mock_read_cursor.call_args.args[1]
+    assert filt['_id'] == {'$lt': IDS[2]}
+
+
+def test_page_bad_after():
+    with pytest.raises(ValueError):
+        listing.page({}, after='nope')
+
+
+@patch('data.db_connect.read_cursor', autospec=True)
+def test_for_referee(mock_read_cursor):
+    cursor = mock_read_cursor.return_value.sort.return_value
+    cursor.limit.return_value = summaries(1)
+    ret = listing.for_referee('r@nyu.edu', [rls.RE_CODE])
+    assert mock_read_cursor.call_args.args[1] == {'referees': 'r@nyu.edu'}
+    assert ret[listing.ITEMS][0][listing.ACTIONS] == [mqry.SUBMIT_REVIEW]
+
+
+@patch('data.db_connect.aggregate', autospec=True, return_value=[
+    {'_id': mqry.SUBMITTED, 'count': 2}, {'_id': mqry.PUBLISHED, 'count': 1}])
+@patch('data.db_connect.read_cursor', autospec=True)
+def test_for_author(mock_read_cursor, mock_aggregate):
+    cursor = mock_read_cursor.return_value.sort.return_value
+    cursor.limit.return_value = summaries(2)
+    ret = listing.for_author('a@nyu.edu', [rls.AUTHOR_CODE])
+    assert mock_read_cursor.call_args.args[1] == {'author_email': 'a@nyu.edu'}
+    assert ret[listing.COUNTS] == {mqry.SUBMITTED: 2, mqry.PUBLISHED: 1}
+    assert ret[listing.TOTAL] == 3
+    assert ret[listing.ITEMS][0][listing.ACTIONS] == [mqry.WITHDRAW]
+    pipeline = mock_aggregate.call_args.args[1]
+    assert pipeline[0] == {'$match': {'author_email': 'a@nyu.edu'}}
+
+
+def test_add_actions_per_journal():
+    spec = {**mqry.WORKFLOW_SPEC, wf.NAME: 'strict',
+            wf.ROLES: {rls.RE_CODE: []}}
+    wf.register('strict', wf.Workflow(spec))
+    try:
+        items = listing.add_actions(
+            [{'state': mqry.IN_REF_REV},
+             {'state': mqry.IN_REF_REV, 'journal': 'strict'}],
+            [rls.RE_CODE])
+    finally:
+        wf.forget('strict')
+    assert items[0][listing.ACTIONS] == [mqry.SUBMIT_REVIEW]
+    assert items[1][listing.ACTIONS] == []
@@ -208,4 +208,12 @@ def test_handle_action_valid_return():
 #     assert manuscript["history"] == [
 #         {"from": "SUB", "action": "ARF", "to": "REV"},
 #         {"from": "REV", "action": "ACC", "to": "CED"}
-#     ]
\ No newline at end of file
+#     ]
+
+def test_main_runs():
+    mqry.main()
+
+
+def test_handle_action_needs_manu():
+    with pytest.raises(ValueError):
+        mqry.handle_action(mqry.TEST_ID, mqry.SUBMITTED, mqry.WITHDRAW)
@@ -0,0 +1,50 @@
+from bson import ObjectId
+
+import data.manuscripts.query as mqry
+import data.manuscripts.simulate as sim
+import server.endpoints as ep
+
+MANU_ID = '67c7700a985d03e678e4513e'
+
+
+def test_memory_store_conflict():
+    store = sim.MemoryStore()
+    store.insert([{'_id': ObjectId(MANU_ID), 'state': mqry.SUBMITTED,
+                   'referees': [], 'history': []}])
+    read = store.load(MANU_ID)
+    filt = ep.action_filter(MANU_ID, read)
+    assert store.update(filt, {'state': mqry.REJECTED,
+                               'history': [mqry.SUBMITTED]})
+    # a writer that read it before that has lost the race:
+    assert not store.update(filt, {'state': mqry.WITHDRAWN})
+    assert store.load(MANU_ID)['state'] == mqry.REJECTED
+
+
+def test_matches():
+    assert sim.matches({'state': 'SUB'}, {'state': 'SUB',
+                                          'referees': {'$exists': False}})
+    assert not sim.matches({'state': 'SUB', 'referees': []},
+                           {'referees': {'$exists': False}})
+    assert not sim.matches({'state': 'SUB'}, {'state': 'REJ'})
+
+
+def test_percentile():
+    assert sim.percentile([], 0.5) == 0.0
+    assert sim.percentile([1, 2, 3, 4], 0.5) == 3
+    assert sim.percentile([1, 2, 3, 4], 0.99) == 4
+
+
+def test_run():
+    store = sim.MemoryStore()
+    report = sim.Simulation(store, manuscripts=20, workers=4, ops=500,
+                            seed=1).run()
+    assert report[sim.OPS] <= 500
+    assert report[sim.TRANSITIONS] > 0
+    assert 0 <= report[sim.CONFLICT_RATE] < 1
+    assert report[sim.P50_MS] <= report[sim.P99_MS]
+    docs = store.all()
+    for doc in docs:
+        assert mqry.is_valid_state(doc['state'])
+    # each transition saved adds to a history; none was lost:
+    assert sum(len(doc['history']) for doc in docs) == \
+        report[sim.TRANSITIONS]
@@ -0,0 +1,154 @@
+import copy
+import json
+from unittest.mock import patch
+
+import pymongo as pm
+import pytest
+
+import data.manuscripts.query as mqry
+import data.manuscripts.workflow as wf
+
+SPEC = {
+    wf.NAME: 'test',
+    wf.INITIAL: 'NEW',
+    wf.STATES: ['NEW', 'OPEN', 'DONE'],
+    wf.FINAL: ['DONE'],
+    wf.TRANSITIONS: [
+        {wf.FROM: 'NEW', wf.ACTION: 'open', wf.TO: 'OPEN'},
+        {wf.FROM: 'OPEN', wf.ACTION: 'close', wf.TO: 'DONE'},
+        {wf.FROM: wf.ANY_STATE, wf.ACTION: 'stop', wf.TO: 'DONE'},
+    ],
+    wf.ROLES: {'ED': ['open', 'close'], 'AU': ['stop']},
+}
+
+
+def spec_with(**changes) -> dict:
+    spec = copy.deepcopy(SPEC)
+    spec.update(changes)
+    return spec
+
+
+def test_compile():
+    workflow = wf.Workflow(SPEC)
+    assert workflow.actions_for('NEW') == ('open', 'stop')
+    assert workflow.actions_for('DONE') == ('stop',)
+    assert workflow.next_state('NEW', 'open') == 'OPEN'
+    assert workflow.filter_by_roles(['open', 'stop'], ['AU']) == ['stop']
+
+
+def test_next_state_bad():
+    workflow = wf.Workflow(SPEC)
+    with pytest.raises(ValueError):
+        workflow.next_state('NOPE', 'open')
+    with pytest.raises(ValueError):
+        workflow.next_state('NEW', 'close')
+    with pytest.raises(ValueError):
+        workflow.next_state('NEW', 'nope')
+
+
+def test_unreachable():
+    spec = spec_with(states=SPEC[wf.STATES] + ['LOST'])
+    with pytest.raises(wf.WorkflowError, match='unreachable'):
+        wf.Workflow(spec)
+
+
+def test_dead_end():
+    spec = spec_with(transitions=[
+        {wf.FROM: 'NEW', wf.ACTION: 'open', wf.TO: 'OPEN'},
+        {wf.FROM: 'OPEN', wf.ACTION: 'wait', wf.TO: 'OPEN'},
+        {wf.FROM: 'NEW', wf.ACTION: 'close', wf.TO: 'DONE'},
+    ], roles={})
+    with pytest.raises(wf.WorkflowError, match='OPEN'):
+        wf.Workflow(spec)
+
+
+def test_unknown_names():
+    trans = {wf.FROM: 'NEW', wf.ACTION: 'open', wf.TO: 'OPEN',
+             wf.GUARD: 'no_such_guard'}
+    with pytest.raises(wf.WorkflowError, match='guard'):
+        wf.Workflow(spec_with(transitions=[trans] + SPEC[wf.TRANSITIONS]))
+    with pytest.raises(wf.WorkflowError, match='unknown state'):
+        wf.Workflow(spec_with(initial='NOPE'))
+    with pytest.raises(wf.WorkflowError, match='unknown actions'):
+        wf.Workflow(spec_with(roles={'ED': ['fly']}))
+
+
+def test_shadowed_transition():
+    trans = {wf.FROM: 'NEW', wf.ACTION: 'open', wf.TO: 'DONE'}
+    with pytest.raises(wf.WorkflowError, match='never'):
+        wf.Workflow(spec_with(transitions=SPEC[wf.TRANSITIONS] + [trans]))
+
+
+def test_guards_and_effects():
+    manu = copy.deepcopy(mqry.SAMPLE_MANU_W_REF)
+    state = mqry.WORKFLOW.next_state(mqry.IN_REF_REV, mqry.ASSIGN_REF,
+                                     manu=manu, referee='Another ref')
+    assert state == mqry.IN_REF_REV
+    assert manu['referees'] == ['Some ref', 'Another ref']
+    state = mqry.WORKFLOW.next_state(mqry.IN_REF_REV, mqry.DELETE_REF,
+                                     manu=manu, referee='Some ref')
+    assert state == mqry.IN_REF_REV
+    state = mqry.WORKFLOW.next_state(mqry.IN_REF_REV, mqry.DELETE_REF,
+                                     manu=manu, referee='Another ref')
+    assert state == mqry.SUBMITTED
+    assert manu['referees'] == []
+    with pytest.raises(ValueError):
+        mqry.WORKFLOW.next_state(mqry.SUBMITTED, mqry.ASSIGN_REF, manu=manu)
+
+
+def test_load_file(tmp_path):
+    path = tmp_path / 'workflow.json'
+    path.write_text(json.dumps(SPEC))
+    assert wf.load_file(str(path)).name == 'test'
+
+
+@patch('data.db_connect.read_one', autospec=True)
+def test_for_journal(mock_read_one):
+    mock_read_one.return_value = None
+    try:
+        assert wf.for_journal('no_spec') is mqry.WORKFLOW
+        # the miss is remembered too:
+        assert wf.for_journal('no_spec') is mqry.WORKFLOW
+        assert mock_read_one.call_count == 1
+    finally:
+        wf.forget('no_spec')
+    mock_read_one.return_value = {'_id': 'own_spec', **SPEC}
+    try:
+        workflow = wf.for_journal('own_spec')
+        assert workflow.name == 'test'
+        assert wf.for_journal('own_spec') is workflow
+        mock_read_one.assert_called_with(wf.WORKFLOWS_COLLECT,
+                                         {'_id': 'own_spec'}, db='seDB')
+    finally:
+        wf.forget('own_spec')
+
+
+@patch('data.db_connect.read_one', autospec=True,
+       side_effect=pm.errors.ExecutionTimeout('timed out'))
+def test_for_journal_db_down(mock_read_one):
+    with pytest.raises(pm.errors.PyMongoError):
+        wf.for_journal('slow_db')
+    # nothing is cached, so the next action tries again:
+    assert 'slow_db' not in wf.workflows
+
+
+@pytest.fixture
+def test_journal():
+    wf.register('test', wf.Workflow(SPEC))
+    yield 'test'
+    wf.forget('test')
+
+
+def test_manuscript_journal_workflow(test_journal):
+    manu = {'state': 'NEW', 'journal': test_journal}
+    workflow = mqry.workflow_for(manu)
+    assert workflow.name == 'test'
+    assert mqry.get_available_actions(manu) == ['open', 'stop']
+    assert mqry.filter_actions_by_roles(['open', 'stop'], ['AU'],
+                                        workflow) == ['stop']
+    assert mqry.handle_action('id', 'NEW', 'open',
+                              manu=manu)['new_state'] == 'OPEN'
+
+
+def test_manuscript_without_journal():
+    assert mqry.workflow_for({'state': mqry.SUBMITTED}) is mqry.WORKFLOW
@@ -0,0 +1,260 @@
+"""
+This module runs manuscript workflows declared as data.
+A workflow spec is a plain dict (so it can come from a file or the
+DB, one per journal) naming its states, the transitions between them,
+and which roles may take which actions:
+
+    {
+        "name": "default",
+        "initial": "SUB",
+        "states": ["SUB", "REV", "REJ", "WIT"],
+        "final": ["REJ", "WIT"],
+        "transitions": [
+            {"from": "SUB", "action": "ARF", "to": "REV",
+             "guard": "has_referee", "effect": "assign_ref"},
+            {"from": "SUB", "action": "REJ", "to": "REJ"},
+            {"from": "*", "action": "WIT", "to": "WIT"}
+        ],
+        "roles": {"ED": ["ARF", "REJ"], "AU": ["WIT"]}
+    }
+
+A "from" of "*" means every state. Guards and effects are named: the
+code for them is registered here with @guard and @effect, and is
+called with the keyword args the action came with. When several
+transitions share a from and action, the first whose guard passes is
+taken.
+Workflow() checks a spec and compiles it into a table indexed by
+state and action number, so taking an action is a couple of lookups.
+"""
+import json
+import os
+
+import pymongo as pm
+
+import data.db_connect as dbc
+
+WORKFLOWS_COLLECT = 'workflows'
+DEFAULT_JOURNAL = 'default'
+# A journal's spec is read while an action waits on it: with the DB
+# down, give up long before the driver's 30s default.
+LOAD_SECS = float(os.environ.get('WORKFLOW_LOAD_SECS', 2))
+
+# the fields of a spec:
+NAME = 'name'
+INITIAL = 'initial'
+STATES = 'states'
+FINAL = 'final'
+TRANSITIONS = 'transitions'
+ROLES = 'roles'
+
+# the fields of a transition:
+FROM = 'from'
+ACTION = 'action'
+TO = 'to'
+GUARD = 'guard'
+EFFECT = 'effect'
+
+ANY_STATE = '*'
+
+GUARDS = {}
+EFFECTS = {}
+
+# compiled workflows by journal
+workflows = {}
+
+
+class WorkflowError(ValueError):
+    pass
+
+
+def guard(fn):
+    """
+    Register fn(**kwargs) -> bool as a guard, under its name.
+    """
+    GUARDS[fn.__name__] = fn
+    return fn
+
+
+def effect(fn):
+    """
+    Register fn(**kwargs) as an effect, under its name.
+    """
+    EFFECTS[fn.__name__] = fn
+    return fn
+
+
+def _lookup(registry: dict, name, kind: str):
+    if name is None:
+        return None
+    if name not in registry:
+        raise WorkflowError(f'Unknown {kind}: {name}')
+    return registry[name]
+
+
+class Workflow:
+    """
+    A compiled workflow spec.
+    """
+    def __init__(self, spec: dict):
+        self.name = spec.get(NAME, DEFAULT_JOURNAL)
+        self.states = tuple(spec[STATES])
+        self.state_ids = {state: num for num, state in enumerate(self.states)}
+        if len(self.state_ids) != len(self.states):
+            raise WorkflowError(f'{self.name}: states are repeated')
+        self.initial = spec[INITIAL]
+        self.final = frozenset(spec.get(FINAL, []))
+        for state in [self.initial, *self.final]:
+            self._state_id(state)
+        self.actions = tuple(dict.fromkeys(trans[ACTION]
+                                           for trans in spec[TRANSITIONS]))
+        self.action_ids = {action: num
+                           for num, action in enumerate(self.actions)}
+        # table[state][action] is a tuple of (guard, effect, to state)
+        # to try in turn, or None
+        self.table = [[None] * len(self.actions) for _ in self.states]
+        for trans in spec[TRANSITIONS]:
+            froms = (range(len(self.states)) if trans[FROM] == ANY_STATE
+                     else [self._state_id(trans[FROM])])
+            option = (_lookup(GUARDS, trans.get(GUARD), 'guard'),
+                      _lookup(EFFECTS, trans.get(EFFECT), 'effect'),
+                      self._state_id(trans[TO]))
+            action_id = self.action_ids[trans[ACTION]]
+            for state_id in froms:
+                row = self.table[state_id]
+                options = row[action_id] or ()
+                if options and options[-1][0] is None:
+                    raise WorkflowError(
+                        f'{self.name}: {trans[ACTION]} in '
+                        f'{self.states[state_id]} can never reach '
+                        f'{trans[TO]}: an unguarded transition is first')
+                row[action_id] = options + (option,)
+        # the actions open in each state, in the order declared
+        self.state_actions = tuple(
+            tuple(action for action, options in zip(self.actions, row)
+                  if options)
+            for row in self.table)
+        self.role_actions = {}
+        for role, actions in spec.get(ROLES, {}).items():
+            unknown = set(actions) - self.action_ids.keys()
+            if unknown:
+                raise WorkflowError(f'{self.name}: role {role} has unknown '
+                                    f'actions: {sorted(unknown)}')
+            self.role_actions[role] = frozenset(actions)
+        self.validate()
+
+    def _state_id(self, state: str) -> int:
+        if state not in self.state_ids:
+            raise WorkflowError(f'{self.name}: unknown state: {state}')
+        return self.state_ids[state]
+
+    def _next_ids(self, state_id: int) -> set:
+        return {to for options in self.table[state_id] if options
+                for _, _, to in options}
+
+    def validate(self):
+        """
+        Raise WorkflowError if some state can't be reached from the
+        initial one, or if from some state no final one can be reached.
+        """
+        reached = {self.state_ids[self.initial]}
+        todo = list(reached)
+        while todo:
+            for nxt in self._next_ids(todo.pop()) - reached:
+                reached.add(nxt)
+                todo.append(nxt)
+        unreachable = [state for num, state in enumerate(self.states)
+                       if num not in reached]
+        if unreachable:
+            raise WorkflowError(f'{self.name}: unreachable states: '
+                                f'{unreachable}')
+        if not self.final:
+            raise WorkflowError(f'{self.name}: no final states')
+        ending = {self.state_ids[state] for state in self.final}
+        grew = True
+        while grew:
+            grew = False
+            for num in range(len(self.states)):
+                if num not in ending and self._next_ids(num) & ending:
+                    ending.add(num)
+                    grew = True
+        dead_ends = [state for num, state in enumerate(self.states)
+                     if num not in ending]
+        if dead_ends:
+            raise WorkflowError(f'{self.name}: no way to finish from: '
+                                f'{dead_ends}')
+
+    def actions_for(self, state: str) -> tuple:
+        return self.state_actions[self._state_id(state)]
+
+    def filter_by_roles(self, actions, role_codes) -> list:
+        allowed = set()
+        for code in role_codes:
+            allowed.update(self.role_actions.get(code, ()))
+        return [action for action in actions if action in allowed]
+
+    def next_state(self, curr_state: str, action: str, **kwargs) -> str:
+        """
+        Take action in curr_state: run the effect of the first
+        transition whose guard passes, and return the state it goes to.
+        kwargs go to the guards and effects.
+        """
+        state_id = self.state_ids.get(curr_state)
+        if state_id is None:
+            raise WorkflowError(f'Bad state: {curr_state}')
+        action_id = self.action_ids.get(action)
+        options = (None if action_id is None
+                   else self.table[state_id][action_id])
+        if not options:
+            raise WorkflowError(f'{action} not available in {curr_state}')
+        for check, act, to in options:
+            if check is None or check(**kwargs):
+                if act is not None:
+                    act(**kwargs)
+                return self.states[to]
+        raise WorkflowError(f'{action} not allowed in {curr_state} now')
+
+
+def load_file(path: str) -> Workflow:
+    with open(path) as spec_file:
+        return Workflow(json.load(spec_file))
+
+
+def load_db(journal: str, db=dbc.SE_DB):
+    """
+    Compile the spec stored for journal, or return None if there isn't
+    one. Raises pymongo's errors if the DB can't answer within
+    LOAD_SECS, so nothing is cached for the journal.
+    """
+    dbc.connect_db()
+    with pm.timeout(LOAD_SECS):
+        spec = dbc.read_one(WORKFLOWS_COLLECT, {dbc.MONGO_ID: journal},
+                            db=db)
+    if spec is None:
+        return None
+    del spec[dbc.MONGO_ID]
+    return Workflow(spec)
+
+
+def register(journal: str, workflow: Workflow):
+    workflows[journal] = workflow
+
+
+def forget(journal: str):
+    """
+    Drop a journal's compiled workflow, so the next for_journal()
+    reloads it: after its spec in the DB changes.
+    """
+    workflows.pop(journal, None)
+
+
+def for_journal(journal: str = DEFAULT_JOURNAL) -> Workflow:
+    """
+    Return journal's workflow, loading its spec from the DB the first
+    time. Journals without one of their own get the default, which is
+    registered for them too, so the DB isn't asked again: forget()
+    the journal once it gets a spec.
+    """
+    if journal not in workflows:
+        workflow = load_db(journal)
+        register(journal, workflow or workflows[DEFAULT_JOURNAL])
+    return workflows[journal]
@@ -3,7 +3,9 @@ This module interfaces to our people data
 """
 import re
 import data.db_connect as dbc
+import data.log as log
 import data.roles as rls
+import data.single_flight as sf
 
 PEOPLE_COLLECT = 'people'
 MIN_USER_NAME_LEN = 2
@@ -12,6 +14,8 @@ ROLES = 'roles'
 AFFILIATION = 'affiliation'
 EMAIL = 'email'
 
+MASTHEAD_KEY = sf.make_key('masthead')
+
 TEST_EMAIL = 'jl12631@nyu.edu'
 DEL_EMAIL = 'delete@nyu.edu'
 
@@ -32,8 +36,7 @@ TEST_PERSON_DICT = {
 
 people_dict = TEST_PERSON_DICT
 
-client = dbc.connect_db()
-print(f'{client=}')
+logger = log.get_logger(__name__)
 
 
 CHAR_OR_DIGIT = '[A-Za-z0-9]'
@@ -63,12 +66,14 @@ def is_valid_person(name: str, affiliation: str,
 
 
 def read() -> dict:
+    """
+    Return all people keyed on email. Concurrent calls share one read.
+    """
     try:
-        people = dbc.read_dict(PEOPLE_COLLECT, EMAIL)
-        print(f'{people=}')
-        return people
-    except Exception as e:
-        print(f"Error reading from database: {e}")
+        return sf.do(sf.make_key(PEOPLE_COLLECT, None, EMAIL),
+                     dbc.read_dict, PEOPLE_COLLECT, EMAIL)
+    except Exception:
+        logger.exception('Error reading people from the database')
         return {}
 
 
@@ -85,7 +90,7 @@ def read_one(email: str) -> dict:
 
 
 def delete(email: str):
-    print(f'{EMAIL=}, {email=}')
+    logger.info('Deleting person %s', email)
     return dbc.delete(PEOPLE_COLLECT, {EMAIL: email})
 
 
@@ -115,7 +120,7 @@ def update(old_email: str,
                      {EMAIL: old_email},
                      {NAME: name, AFFILIATION: affiliation,
                       EMAIL: new_email, ROLES: roles})
-    print(f'{ret=}')
+    logger.debug('Updated %s: %s', old_email, ret)
     return new_email
 
 
@@ -177,9 +182,15 @@ def create_mh_rec(person: dict) -> dict:
 
 
 def get_masthead() -> dict:
+    return sf.do(MASTHEAD_KEY, lambda: build_masthead(read()))
+
+
+def build_masthead(people_data: dict) -> dict:
+    """
+    Make the masthead from people keyed on email, as read() returns.
+    """
     masthead = {}
     masthead_roles = rls.get_masthead_roles()
-    people_data = read()
 
     for role_code, role_name in masthead_roles.items():
         people_with_role = [
@@ -201,7 +212,7 @@ def create(name: str, affiliation: str, email: str, role: str):
             roles.append(role)
         person = {NAME: name, AFFILIATION: affiliation,
                   EMAIL: email, ROLES: roles}
-        print(person)
+        logger.debug('Creating person %s', email)
         dbc.create(PEOPLE_COLLECT, person)
         return email
 
@@ -215,9 +226,8 @@ def bulk_delete(emails: list):
         if exists(email):
             delete(email)
             deleted_count += 1
-            print(f"Deleted: {email}")
         else:
-            print(f"Email not found, cannot delete: {email}")
+            logger.info('Email not found, cannot delete: %s', email)
     return deleted_count
 
 
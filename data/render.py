@@ -0,0 +1,189 @@
+"""
+This module renders journal text (markdown) into sanitized HTML.
+Rendered output is cached on a hash of the source text, so a page
+is rendered once per edit rather than once per view.
+"""
+import hashlib
+import html
+from collections import OrderedDict
+from html.parser import HTMLParser
+from threading import Lock
+
+CACHE_SIZE = 256
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'em', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'hr', 'i', 'li', 'ol', 'p', 'pre', 'strong', 'sub',
+    'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'ul',
+}
+VOID_TAGS = {'br', 'hr'}
+# tags whose content must go along with the tag itself:
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed'}
+ALLOWED_ATTRS = {
+    'a': {'href', 'title'},
+    'abbr': {'title'},
+    'td': {'align'},
+    'th': {'align'},
+}
+URL_ATTRS = {'href'}
+SAFE_URL_PREFIXES = ('http://', 'https://', 'mailto:', '/', '#')
+
+# markdown is slow to import, so get_markdown() loads it on first use:
+markdown = None
+markdown_loaded = False
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+cache_hits = 0
+cache_misses = 0
+
+
+class _Sanitizer(HTMLParser):
+    """
+    Rebuilds HTML keeping only allowed tags and attributes.
+    Disallowed tags are dropped but their text is kept (escaped),
+    except for tags like <script> whose content is dropped too.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth or tag not in ALLOWED_TAGS:
+            return
+        self.out.append(f'<{tag}{_clean_attrs(tag, attrs)}>')
+
+    def handle_startendtag(self, tag, attrs):
+        if self.skip_depth or tag not in ALLOWED_TAGS:
+            return
+        self.out.append(f'<{tag}{_clean_attrs(tag, attrs)}>')
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth or tag not in ALLOWED_TAGS or tag in VOID_TAGS:
+            return
+        self.out.append(f'</{tag}>')
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.out.append(html.escape(data, quote=False))
+
+
+def get_markdown():
+    """
+    Return the markdown module, or None if it is not installed:
+    we can still render plain paragraphs without it.
+    """
+    global markdown, markdown_loaded
+    if not markdown_loaded:
+        try:
+            import markdown as md
+            markdown = md
+        except ImportError:
+            markdown = None
+        markdown_loaded = True
+    return markdown
+
+
+def _is_safe_url(url: str) -> bool:
+    return url.strip().lower().startswith(SAFE_URL_PREFIXES)
+
+
+def _clean_attrs(tag: str, attrs: list) -> str:
+    allowed = ALLOWED_ATTRS.get(tag, set())
+    kept = []
+    for name, value in attrs:
+        if name not in allowed or value is None:
+            continue
+        if name in URL_ATTRS and not _is_safe_url(value):
+            continue
+        kept.append(f' {name}="{html.escape(value, quote=True)}"')
+    return ''.join(kept)
+
+
+def sanitize(raw_html: str) -> str:
+    parser = _Sanitizer()
+    parser.feed(raw_html)
+    parser.close()
+    return ''.join(parser.out)
+
+
+def _plain_to_html(text: str) -> str:
+    """
+    Used when the markdown package is not installed:
+    blank lines separate paragraphs, single newlines become <br>.
+    """
+    paras = [p.strip() for p in text.replace('\r\n', '\n').split('\n\n')]
+    return '\n'.join('<p>' + html.escape(p).replace('\n', '<br>\n') + '</p>'
+                     for p in paras if p)
+
+
+def to_html(text: str) -> str:
+    """
+    Render markdown to sanitized HTML, uncached.
+    """
+    md = get_markdown()
+    if md is not None:
+        raw_html = md.markdown(text, extensions=['tables'])
+    else:
+        raw_html = _plain_to_html(text)
+    return sanitize(raw_html)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def render(text: str) -> str:
+    """
+    Render markdown to sanitized HTML, using the cache when
+    this exact text has been rendered before.
+    """
+    global cache_hits, cache_misses
+    if not text:
+        return ''
+    key = content_hash(text)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            cache_hits += 1
+            return _cache[key]
+    rendered = to_html(text)
+    with _cache_lock:
+        cache_misses += 1
+        _cache[key] = rendered
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rendered
+
+
+def cache_info() -> dict:
+    return {
+        'size': len(_cache),
+        'max_size': CACHE_SIZE,
+        'hits': cache_hits,
+        'misses': cache_misses,
+    }
+
+
+def clear_cache():
+    global cache_hits, cache_misses
+    with _cache_lock:
+        _cache.clear()
+        cache_hits = 0
+        cache_misses = 0
+
+
+def main():
+    print(render('# Title\n\nSome *markdown* <script>alert(1)</script>'))
+    print(cache_info())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,16 @@
 #!/bin/sh
-# Script to backup production database to JSON files.
+# Script to restore the database from a backup directory
+# made by bkup.sh: ./restore.sh <backup dir> [--drop]
 
 . ./common.sh
 
-for collection in ${GameCollections[@]}; do
-    echo "Restoring $collection"
-    $IMP --db=$DB --collection $collection --drop --file $BKUP_DIR/$collection.json
-done
+if [ -z "$1" ]
+then
+    echo "Usage: $0 <backup dir> [--drop] [--collections a,b]"
+    exit 1
+fi
+
+IN_DIR=$(cd "$1" && pwd)
+shift
+echo "Restoring from $IN_DIR"
+cd .. && CLOUD_MONGO=1 python -m data.backup restore $IN_DIR "$@"
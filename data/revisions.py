@@ -0,0 +1,207 @@
+"""
+This module stores the revisions of a manuscript's text as lists of
+content-addressed chunks.
+Chunk boundaries are picked by a rolling hash of the bytes around
+them (content-defined chunking), not by position: an edit changes
+the chunks it touches, and the chunks after it come out the same as
+before. Chunks are named by their sha256 and stored once, so each
+revision costs about the size of its edits, not of the manuscript.
+A client that chunks its text can also ask which chunks we are
+missing and upload only those (see missing()).
+"""
+import hashlib
+
+from bson.binary import Binary
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import data.blobs as blobs
+import data.db_connect as dbc
+
+CHUNKS_COLLECT = 'text_chunks'
+REVISIONS_COLLECT = 'revisions'
+
+# Chunks average about 2 ** AVG_BITS bytes: a few paragraphs.
+MIN_CHUNK = 512
+AVG_BITS = 11
+MAX_CHUNK = 8 * 1024
+
+# the fields of a chunk doc:
+DATA = 'data'
+LENGTH = 'length'
+
+# the fields of a revision doc:
+MANU_ID = 'manu_id'
+NUMBER = 'number'
+CHUNKS = 'chunks'
+SHA256 = 'sha256'
+
+DUPLICATE_KEY = 11000
+
+_MASK64 = (1 << 64) - 1
+# A fixed random value per byte value, for the Gear hash: any table
+# will do, but it must never change, or old texts chunk differently.
+GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'little')
+        for i in range(256)]
+
+
+def boundaries(data: bytes, min_size: int = MIN_CHUNK,
+               avg_bits: int = AVG_BITS, max_size: int = MAX_CHUNK) -> list:
+    """
+    Return the end offsets of data's chunks.
+    A chunk ends where the top avg_bits of the hash are all zero. The
+    hash shifts one bit per byte, so its top bits depend only on the
+    last 64 bytes: the same text gives the same boundary wherever it is.
+    """
+    mask = ((1 << avg_bits) - 1) << (64 - avg_bits)
+    ends = []
+    start = 0
+    length = len(data)
+    while start < length:
+        end = min(start + max_size, length)
+        pos = start + min_size
+        hsh = 0
+        while pos < end:
+            hsh = ((hsh << 1) + GEAR[data[pos]]) & _MASK64
+            pos += 1
+            if not hsh & mask:
+                end = pos
+                break
+        ends.append(end)
+        start = end
+    return ends
+
+
+def split(data: bytes) -> list:
+    """
+    Cut data into content-defined chunks.
+    """
+    chunks = []
+    start = 0
+    for end in boundaries(data):
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+
+def missing(digests: list, db=dbc.SE_DB) -> list:
+    """
+    Return the digests, of those given, whose chunks we don't have.
+    """
+    have = {doc[dbc.MONGO_ID] for doc in dbc.read_cursor(
+        CHUNKS_COLLECT, {dbc.MONGO_ID: {'$in': list(set(digests))}},
+        {dbc.MONGO_ID: 1}, db=db)}
+    return [digest for digest in dict.fromkeys(digests)
+            if digest not in have]
+
+
+def put_chunks(chunks: dict, db=dbc.SE_DB) -> int:
+    """
+    Store chunks (a dict of digest: bytes) we don't have already.
+    Raises ValueError if a digest doesn't match its bytes.
+    Return how many chunks were new.
+    """
+    for digest, chunk in chunks.items():
+        if blobs.content_hash(chunk) != digest:
+            raise ValueError(f'Chunk does not match its digest: {digest}')
+        if len(chunk) > MAX_CHUNK:
+            raise ValueError(f'Chunk is over {MAX_CHUNK} bytes: {digest}')
+    new = missing(list(chunks), db=db)
+    if not new:
+        return 0
+    docs = [{dbc.MONGO_ID: digest, DATA: Binary(chunks[digest]),
+             LENGTH: len(chunks[digest])} for digest in new]
+    try:
+        dbc.create_many(CHUNKS_COLLECT, docs, db=db, ordered=False)
+    except BulkWriteError as err:
+        # someone else stored the same chunk since we looked: fine
+        errors = err.details.get('writeErrors', [])
+        if any(error.get('code') != DUPLICATE_KEY for error in errors):
+            raise
+        return err.details.get('nInserted', 0)
+    return len(docs)
+
+
+def revision_id(manu_id: str, number: int) -> str:
+    return f'{manu_id}:{number}'
+
+
+def latest(manu_id: str, db=dbc.SE_DB):
+    """
+    Return the newest revision doc of a manuscript, or None.
+    """
+    cursor = dbc.read_cursor(REVISIONS_COLLECT, {MANU_ID: manu_id},
+                             db=db).sort(NUMBER, -1).limit(1)
+    for doc in cursor:
+        return doc
+    return None
+
+
+def add(manu_id: str, digests: list, db=dbc.SE_DB) -> dict:
+    """
+    Record a new revision of a manuscript made of the chunks named by
+    digests, which must all be stored already.
+    Raises LookupError, listing them, if some aren't.
+    Return the revision doc.
+    """
+    absent = missing(digests, db=db)
+    if absent:
+        raise LookupError(absent)
+    lengths = {doc[dbc.MONGO_ID]: doc[LENGTH] for doc in dbc.read_cursor(
+        CHUNKS_COLLECT, {dbc.MONGO_ID: {'$in': list(set(digests))}},
+        {LENGTH: 1}, db=db)}
+    whole = hashlib.sha256()
+    for digest in digests:
+        whole.update(bytes.fromhex(digest))
+    while True:
+        prev = latest(manu_id, db=db)
+        number = prev[NUMBER] + 1 if prev else 1
+        revision = {
+            dbc.MONGO_ID: revision_id(manu_id, number),
+            MANU_ID: manu_id,
+            NUMBER: number,
+            CHUNKS: list(digests),
+            LENGTH: sum(lengths[digest] for digest in digests),
+            # a hash of the chunk hashes: an ETag for the text
+            SHA256: whole.hexdigest(),
+        }
+        try:
+            dbc.create(REVISIONS_COLLECT, revision, db=db)
+            return revision
+        except DuplicateKeyError:
+            # another revision took this number first: take the next
+            continue
+
+
+def save(manu_id: str, data: bytes, db=dbc.SE_DB) -> dict:
+    """
+    Chunk data, store the chunks we lack and add it as a revision.
+    """
+    chunks = split(data)
+    digests = [blobs.content_hash(chunk) for chunk in chunks]
+    put_chunks(dict(zip(digests, chunks)), db=db)
+    return add(manu_id, digests, db=db)
+
+
+def read(revision: dict, db=dbc.SE_DB) -> bytes:
+    """
+    Put a revision's text back together from its chunks.
+    """
+    digests = revision[CHUNKS]
+    chunks = {doc[dbc.MONGO_ID]: doc[DATA] for doc in dbc.read_cursor(
+        CHUNKS_COLLECT, {dbc.MONGO_ID: {'$in': list(set(digests))}},
+        {DATA: 1}, db=db)}
+    return b''.join(chunks[digest] for digest in digests)
+
+
+def get(manu_id: str, number: int, db=dbc.SE_DB):
+    return dbc.read_one(REVISIONS_COLLECT,
+                        {dbc.MONGO_ID: revision_id(manu_id, number)}, db=db)
+
+
+def list_for(manu_id: str, db=dbc.SE_DB) -> list:
+    """
+    Return a manuscript's revisions, oldest first, without chunk lists.
+    """
+    return list(dbc.read_cursor(REVISIONS_COLLECT, {MANU_ID: manu_id},
+                                {dbc.MONGO_ID: 0, CHUNKS: 0, dbc.MOD: 0},
+                                db=db).sort(NUMBER, 1))
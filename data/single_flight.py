@@ -0,0 +1,82 @@
+"""
+This module coalesces identical loads that are running at the same
+time: the first caller runs the query, and callers that ask for the
+same thing while it runs wait for it and share its result.
+So a burst of requests for the masthead costs one full read of the
+people collection, not one each.
+Use it like this:
+
+    import data.single_flight as sf
+    people = sf.do(sf.make_key(COLLECT, filt), dbc.read, COLLECT, filt=filt)
+"""
+import copy
+import json
+from threading import Event, Lock
+
+LEADS = 'leads'
+SHARED = 'shared'
+
+lock = Lock()
+in_flight = {}
+counts = {LEADS: 0, SHARED: 0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def make_key(*parts) -> str:
+    """
+    Make a key from the things that decide what a load returns:
+    typically the collection, filter and projection.
+    Filters are dicts, so we key on their JSON.
+    """
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+def do(key: str, fn, *args, **kwargs):
+    """
+    Return fn(*args, **kwargs), unless a call with the same key is
+    already running: then wait for that call and return its result
+    (or raise its exception).
+    When a result is shared every caller gets its own deep copy, so
+    one can change what it got back without the others seeing it.
+    """
+    with lock:
+        call = in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            in_flight[key] = call
+            counts[LEADS] += 1
+        else:
+            call.waiters += 1
+            counts[SHARED] += 1
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+    try:
+        call.result = fn(*args, **kwargs)
+    except Exception as err:
+        call.error = err
+        raise
+    finally:
+        # No one can join once the call is out of in_flight, so
+        # waiters is final here.
+        with lock:
+            del in_flight[key]
+        call.done.set()
+    if call.waiters:
+        return copy.deepcopy(call.result)
+    return call.result
+
+
+def stats() -> dict:
+    with lock:
+        return dict(counts, in_flight=len(in_flight))
@@ -0,0 +1,95 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+import data.audit as audit
+
+TEST_ACTOR = 'jl12631@nyu.edu'
+
+
+@pytest.fixture(autouse=True)
+def empty_audit():
+    """
+    Start from an empty buffer with zeroed counts, and don't let
+    log_event() start the background flusher.
+    """
+    with patch('data.audit.flusher_pid', audit.os.getpid()):
+        audit.buffer.clear()
+        for key in audit.counts:
+            audit.counts[key] = 0
+        yield
+        audit.buffer.clear()
+
+
+def log_test_event(**kwargs):
+    return audit.log_event(TEST_ACTOR, 'people', 'delete', audit.PERMITTED,
+                           **kwargs)
+
+
+def test_log_event():
+    assert log_test_event(target='x@nyu.edu')
+    stats = audit.stats()
+    assert stats[audit.ENQUEUED] == 1
+    assert stats[audit.PENDING] == 1
+    event = audit.buffer[0]
+    assert event[audit.ACTOR] == TEST_ACTOR
+    assert event[audit.TARGET] == 'x@nyu.edu'
+    assert audit.FROM_STATE not in event
+
+
+def test_log_state_change():
+    log_test_event(manu_id='some id', from_state='SUB', to_state='REV')
+    event = audit.buffer[0]
+    assert event[audit.MANU_ID] == 'some id'
+    assert event[audit.FROM_STATE] == 'SUB'
+    assert event[audit.TO_STATE] == 'REV'
+
+
+def test_full_buffer_drops():
+    with patch('data.audit.BUFFER_SIZE', 2):
+        assert log_test_event()
+        assert log_test_event()
+        assert not log_test_event()
+    stats = audit.stats()
+    assert stats[audit.PENDING] == 2
+    assert stats[audit.DROPPED] == 1
+
+
+@patch('data.audit.dbc', autospec=True)
+def test_flush_in_batches(mock_dbc):
+    with patch('data.audit.BATCH_SIZE', 2):
+        for _ in range(5):
+            log_test_event()
+        assert audit.flush() == 2
+        audit.flush_all()
+    assert mock_dbc.create_many.call_count == 3
+    stats = audit.stats()
+    assert stats[audit.FLUSHED] == 5
+    assert stats[audit.PENDING] == 0
+
+
+@patch('data.audit.dbc', autospec=True)
+def test_flush_error_counted(mock_dbc):
+    mock_dbc.create_many.side_effect = Exception('DB down')
+    log_test_event()
+    assert audit.flush() == 0
+    stats = audit.stats()
+    assert stats[audit.FLUSH_ERRORS] == 1
+    assert stats[audit.DROPPED] == 1
+
+
+def test_flush_empty():
+    assert audit.flush() == 0
+
+
+@patch('data.audit.dbc', autospec=True)
+def test_background_flusher(mock_dbc):
+    with patch('data.audit.flusher_pid', None), \
+            patch('data.audit.FLUSH_SECS', 0.01):
+        log_test_event()
+        for _ in range(100):
+            if audit.stats()[audit.FLUSHED]:
+                break
+            time.sleep(0.01)
+    assert audit.stats()[audit.FLUSHED] == 1
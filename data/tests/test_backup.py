@@ -0,0 +1,171 @@
+import os
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import bson
+import pytest
+from bson import ObjectId
+from bson.timestamp import Timestamp
+from pymongo.errors import OperationFailure
+
+import data.backup as bkp
+import data.db_connect as dbc
+
+FAKE_BATCH_SIZE = 2
+
+clock = [100]
+
+
+def server_now() -> Timestamp:
+    clock[0] += 1
+    return Timestamp(clock[0], 1)
+
+
+class FakeCollection:
+    """
+    Stands in for a pymongo collection, keeping docs in a list.
+    Filters can only be {'_mod': {'$gt': timestamp}}.
+    """
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+
+    def find_raw_batches(self, filt=None, limit=0, session=None):
+        docs = self.docs
+        if filt:
+            since = filt[dbc.MOD]['$gt']
+            docs = [doc for doc in docs
+                    if doc.get(dbc.MOD) and doc[dbc.MOD] > since]
+        docs = docs[:limit] if limit else docs
+        for i in range(0, len(docs), FAKE_BATCH_SIZE):
+            yield b''.join(bson.encode(doc)
+                           for doc in docs[i:i + FAKE_BATCH_SIZE])
+
+    def insert_many(self, docs, ordered=True):
+        self.docs.extend(bson.decode(doc.raw) for doc in docs)
+
+    def drop(self):
+        self.docs = []
+
+    def find_one_and_update(self, filt, update, upsert=False,
+                            return_document=None):
+        doc = {**filt, dbc.MOD: server_now()}
+        self.docs = [doc]
+        return doc
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self.keys())
+
+
+class FakeClient(dict):
+    def __missing__(self, name):
+        self[name] = FakeDB()
+        return self[name]
+
+    def start_session(self, snapshot=False):
+        return MagicMock()
+
+
+def make_client() -> FakeClient:
+    client = FakeClient()
+    database = client[dbc.SE_DB]
+    database['people'] = FakeCollection([
+        {'_id': ObjectId(), 'email': f'p{i}@nyu.edu'} for i in range(5)])
+    database['manuscripts'] = FakeCollection([
+        {'_id': ObjectId(), 'title': 'T',
+         'created': datetime(2025, 1, 1)}])
+    database['rate_limits'] = FakeCollection([{'key': 'x'}])
+    return client
+
+
+def test_count_docs():
+    raw = b''.join(bson.encode({'i': i}) for i in range(3))
+    assert bkp.count_docs(raw) == 3
+    assert bkp.count_docs(b'') == 0
+
+
+def test_backup_and_restore(tmp_path):
+    client = make_client()
+    with patch.object(dbc, 'client', client):
+        manifest = bkp.backup(str(tmp_path))
+        assert set(manifest[bkp.COLLECTIONS]) == {'people', 'manuscripts'}
+        assert manifest[bkp.COLLECTIONS]['people'][bkp.COUNT] == 5
+        assert manifest[bkp.POINT_IN_TIME]
+        original = list(client[dbc.SE_DB]['manuscripts'].docs)
+        restored = bkp.restore(str(tmp_path), db_name='restoreDB',
+                               batch_size=2)
+    assert restored == {'people': 5, 'manuscripts': 1}
+    # types come back exactly:
+    assert client['restoreDB']['manuscripts'].docs == original
+
+
+def test_restore_drop(tmp_path):
+    client = make_client()
+    with patch.object(dbc, 'client', client):
+        bkp.backup(str(tmp_path), ['people'])
+        bkp.restore(str(tmp_path), drop=True)
+    assert len(client[dbc.SE_DB]['people'].docs) == 5
+
+
+def test_no_snapshots(tmp_path):
+    client = make_client()
+    with patch.object(dbc, 'client', client), \
+            patch.object(FakeCollection, 'find_raw_batches',
+                         autospec=True,
+                         side_effect=OperationFailure('no snapshots')):
+        assert bkp._start_snapshot(client, dbc.SE_DB, ['people']) is None
+
+
+def test_verify_catches_corruption(tmp_path):
+    with patch.object(dbc, 'client', make_client()):
+        bkp.backup(str(tmp_path), ['people'])
+    with open(os.path.join(tmp_path, 'people' + bkp.SUFFIX), 'ab') as f:
+        f.write(b'junk')
+    with pytest.raises(ValueError):
+        bkp.verify(str(tmp_path))
+
+
+def test_incremental_backup_and_merge(tmp_path):
+    client = make_client()
+    database = client[dbc.SE_DB]
+    people = database['people']
+    with patch.object(dbc, 'client', client):
+        bkp.backup(str(tmp_path / 'full'))
+        # an update, an insert and a delete, stamped as db_connect would:
+        people.docs[0] = {**people.docs[0], 'name': 'New',
+                          dbc.MOD: server_now()}
+        people.docs.append({'_id': ObjectId(), 'email': 'new@nyu.edu',
+                            dbc.MOD: server_now()})
+        gone = people.docs.pop(1)
+        database[dbc.TOMBSTONE_COLLECT].docs.append(
+            {**dbc.tombstone('people', gone['_id']), dbc.MOD: server_now()})
+        incr = bkp.backup(str(tmp_path / 'incr'),
+                          base_dir=str(tmp_path / 'full'))
+        assert incr[bkp.TYPE] == bkp.INCREMENTAL
+        assert incr[bkp.COLLECTIONS]['people'][bkp.COUNT] == 2
+        assert incr[bkp.COLLECTIONS]['manuscripts'][bkp.COUNT] == 0
+        merged = bkp.merge(str(tmp_path / 'full'), [str(tmp_path / 'incr')],
+                           str(tmp_path / 'merged'))
+        assert merged[bkp.CHECKPOINT] == incr[bkp.CHECKPOINT]
+        bkp.restore(str(tmp_path / 'merged'), db_name='restoreDB')
+    restored = client['restoreDB']['people'].docs
+    assert sorted(doc['email'] for doc in restored) == \
+        sorted(doc['email'] for doc in people.docs)
+    assert 'New' in [doc.get('name') for doc in restored]
+
+
+def test_merge_checks_the_chain(tmp_path):
+    with patch.object(dbc, 'client', make_client()):
+        bkp.backup(str(tmp_path / 'full'))
+        bkp.backup(str(tmp_path / 'incr'), base_dir=str(tmp_path / 'full'))
+        bkp.backup(str(tmp_path / 'full2'))
+        with pytest.raises(ValueError):
+            bkp.merge(str(tmp_path / 'full2'), [str(tmp_path / 'incr')],
+                      str(tmp_path / 'merged'))
+        with pytest.raises(ValueError):
+            bkp.restore(str(tmp_path / 'incr'))
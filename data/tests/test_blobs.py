@@ -0,0 +1,38 @@
+import io
+from unittest.mock import MagicMock, patch
+
+import data.blobs as blobs
+import data.db_connect as dbc
+
+DATA = b'some manuscript text'
+
+
+def test_iter_range():
+    blob = io.BytesIO(DATA)
+    assert b''.join(blobs.iter_range(blob, 5, 15, read_size=3)) == DATA[5:15]
+    assert b''.join(blobs.iter_range(blob, 0, len(DATA) + 10)) == DATA
+
+
+@patch('data.blobs.bucket', autospec=True)
+def test_put(mock_bucket):
+    with patch.object(dbc, 'client', MagicMock()) as client:
+        files = client[dbc.SE_DB][blobs.FILES_COLLECT]
+        files.find_one.return_value = None
+        ref = blobs.put(DATA, blobs.TEXT_TYPE)
+    assert ref == {blobs.SHA256: blobs.content_hash(DATA),
+                   blobs.LENGTH: len(DATA),
+                   blobs.CONTENT_TYPE: blobs.TEXT_TYPE}
+    upload = mock_bucket.return_value.upload_from_stream
+    assert upload.call_args.args[:2] == (ref[blobs.SHA256], DATA)
+    # stamped for incremental backups:
+    files.update_one.assert_called_once()
+
+
+@patch('data.blobs.bucket', autospec=True)
+def test_put_dedups(mock_bucket):
+    with patch.object(dbc, 'client', MagicMock()) as client:
+        files = client[dbc.SE_DB][blobs.FILES_COLLECT]
+        files.find_one.return_value = {dbc.MONGO_ID: 'already there'}
+        ref = blobs.put_text(DATA.decode())
+    assert ref[blobs.SHA256] == blobs.content_hash(DATA)
+    mock_bucket.return_value.upload_from_stream.assert_not_called()
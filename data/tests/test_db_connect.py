@@ -0,0 +1,54 @@
+from unittest.mock import MagicMock, patch
+
+from bson import ObjectId
+
+import data.db_connect as dbc
+
+
+def test_stamped():
+    doc = {'name': 'Joe'}
+    stamped = dbc.stamped(doc)
+    assert stamped[dbc.MOD] == dbc.SERVER_NOW
+    assert dbc.MOD not in doc
+
+
+def test_create_stamps():
+    with patch.object(dbc, 'client', MagicMock()) as client:
+        dbc.create('people', {'name': 'Joe'})
+    inserted = client[dbc.SE_DB]['people'].insert_one.call_args.args[0]
+    assert inserted[dbc.MOD] == dbc.SERVER_NOW
+
+
+def test_update_stamps():
+    with patch.object(dbc, 'client', MagicMock()) as client:
+        dbc.update('people', {'email': 'a@b.c'}, {'name': 'Joe'})
+    spec = client[dbc.SE_DB]['people'].update_one.call_args.args[1]
+    assert spec['$set'] == {'name': 'Joe'}
+    assert spec['$currentDate'] == {dbc.MOD: {'$type': 'timestamp'}}
+
+
+def test_delete_leaves_tombstone():
+    doc_id = ObjectId()
+    with patch.object(dbc, 'client', MagicMock()) as client:
+        people = client[dbc.SE_DB]['people']
+        people.find_one_and_delete.return_value = {dbc.MONGO_ID: doc_id}
+        assert dbc.delete('people', {'email': 'a@b.c'}) == 1
+    tombs = client[dbc.SE_DB][dbc.TOMBSTONE_COLLECT]
+    tomb = tombs.insert_one.call_args.args[0]
+    assert tomb[dbc.TOMB_COLLECTION] == 'people'
+    assert tomb[dbc.TOMB_DOC_ID] == doc_id
+
+
+def test_delete_missing():
+    with patch.object(dbc, 'client', MagicMock()) as client:
+        people = client[dbc.SE_DB]['people']
+        people.find_one_and_delete.return_value = None
+        assert dbc.delete('people', {'email': 'a@b.c'}) == 0
+    client[dbc.SE_DB][dbc.TOMBSTONE_COLLECT].insert_one.assert_not_called()
+
+
+def test_reads_leave_out_mod():
+    with patch.object(dbc, 'client', MagicMock()) as client:
+        client[dbc.SE_DB]['people'].find.return_value = []
+        dbc.read('people')
+    assert client[dbc.SE_DB]['people'].find.call_args.args[1] == dbc.NO_MOD
@@ -0,0 +1,53 @@
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from bson import ObjectId
+
+import data.export as exp
+
+DOCS = [{'_id': ObjectId(), 'title': f'Title {i}'} for i in range(5)]
+
+
+def test_projection():
+    assert exp.projection() == {'password_hash': 0, '_mod': 0}
+    assert exp.projection(['name', 'password_hash']) == {'name': 1}
+    # asking only for hidden fields must not mean every field:
+    assert exp.projection(['password_hash']) == {'password_hash': 0,
+                                                 '_mod': 0}
+
+
+def test_parse_fields():
+    assert exp.parse_fields(None) is None
+    assert exp.parse_fields('name, email,') == ['name', 'email']
+
+
+def test_ndjson_batches():
+    chunks = list(exp.ndjson(iter(DOCS), batch_size=2))
+    assert len(chunks) == 3
+    lines = b''.join(chunks).decode().splitlines()
+    assert len(lines) == len(DOCS)
+    assert json.loads(lines[0])['_id'] == str(DOCS[0]['_id'])
+
+
+def test_ndjson_empty():
+    assert list(exp.ndjson(iter([]))) == []
+
+
+def test_gzipped_round_trips():
+    chunks = list(exp.ndjson(iter(DOCS), batch_size=2))
+    compressed = b''.join(exp.gzipped(iter(chunks)))
+    assert gzip.decompress(compressed) == b''.join(chunks)
+
+
+@patch('data.db_connect.read_cursor', autospec=True, return_value=iter(DOCS))
+def test_export(mock_cursor):
+    out = b''.join(exp.export('manuscripts', ['title']))
+    assert out.count(b'\n') == len(DOCS)
+    assert mock_cursor.call_args.kwargs['projection'] == {'title': 1}
+
+
+def test_export_bad_collection():
+    with pytest.raises(ValueError):
+        exp.export('rate_limits')
@@ -0,0 +1,175 @@
+import io
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import data.importer as imp
+
+GOOD_PERSON = {'name': 'Joe Smith', 'email': 'joe@nyu.edu',
+               'affiliation': 'NYU', 'roles': ['ED']}
+GOOD_MANU = {'title': 'T', 'author': 'A', 'author_email': 'a@nyu.edu',
+             'abstract': 'Abs', 'text': 'Text'}
+
+
+@pytest.fixture(autouse=True)
+def blob_store():
+    with patch('data.blobs.put_text', autospec=True,
+               side_effect=lambda text: {'sha256': text}) as mock_put_text:
+        yield mock_put_text
+
+
+def ndjson(*docs) -> io.BytesIO:
+    return io.BytesIO('\n'.join(json.dumps(doc) for doc in docs).encode())
+
+
+def inserted(collection, docs, ordered=True):
+    return SimpleNamespace(inserted_ids=list(range(len(docs))))
+
+
+def test_parse_ndjson():
+    stream = io.BytesIO(b'{"a": 1}\n\nnot json\n[1]\n{"b": 2}\n')
+    rows = list(imp.parse_ndjson(stream))
+    assert rows[0] == (1, {'a': 1}, None)
+    assert rows[1][0] == 3 and rows[1][2].startswith('Bad JSON')
+    assert rows[2] == (4, None, 'Expected a JSON object')
+    assert rows[3] == (5, {'b': 2}, None)
+
+
+def test_parse_csv():
+    stream = io.BytesIO(b'name,email,roles\n'
+                        b'Joe Smith,joe@nyu.edu,ED;RE\n'
+                        b'Ann,ann@nyu.edu,\n'
+                        b'Bo,bo@nyu.edu,ED,extra\n')
+    rows = list(imp.parse_csv(stream))
+    assert rows[0] == (1, {'name': 'Joe Smith', 'email': 'joe@nyu.edu',
+                           'roles': ['ED', 'RE']}, None)
+    assert rows[1] == (2, {'name': 'Ann', 'email': 'ann@nyu.edu'}, None)
+    assert rows[2][1] is None
+    assert not stream.closed
+
+
+def test_prepare_person():
+    person = imp.prepare_person(GOOD_PERSON)
+    assert person['roles'] == ['ED']
+    with pytest.raises(ValueError):
+        imp.prepare_person({**GOOD_PERSON, 'email': 'bad'})
+    with pytest.raises(ValueError):
+        imp.prepare_person({**GOOD_PERSON, 'salary': 1})
+    for bad in [{'name': 5}, {'password': ['pw']}, {'roles': {'ED': 1}},
+                {'roles': [1]}]:
+        with pytest.raises(ValueError):
+            imp.prepare_person({**GOOD_PERSON, **bad})
+
+
+def test_prepare_manuscript():
+    manu = imp.prepare_manuscript({**GOOD_MANU, '_id': 'old'})
+    assert '_id' not in manu
+    assert manu['state'] == 'SUB'
+    assert manu['referees'] == []
+    with pytest.raises(ValueError):
+        imp.prepare_manuscript({'title': 'T'})
+    with pytest.raises(ValueError):
+        imp.prepare_manuscript({**GOOD_MANU, 'state': 'NOPE'})
+    for bad in [{'text': 5}, {'text': {'a': 1}}, {'text': ''},
+                {'title': ['T']}, {'state': 1}, {'referees': 'r@nyu.edu'},
+                {'referees': [{}]}, {'history': 'SUB'}]:
+        with pytest.raises(ValueError):
+            imp.prepare_manuscript({**GOOD_MANU, **bad})
+
+
+@patch('data.db_connect.create_many', autospec=True, side_effect=inserted)
+def test_load_in_batches(mock_create_many):
+    docs = [dict(GOOD_MANU, title=f'T{i}') for i in range(5)]
+    report = imp.load('manuscripts', imp.parse_ndjson(ndjson(*docs)),
+                      batch_size=2)
+    assert report[imp.INSERTED] == 5
+    assert report[imp.REJECTED] == 0
+    assert mock_create_many.call_count == 3
+
+
+@patch('data.db_connect.create_many', autospec=True, side_effect=inserted)
+def test_load_reports_bad_rows(mock_create_many):
+    rows = imp.parse_ndjson(ndjson(GOOD_MANU, {'title': 'T'}, GOOD_MANU))
+    report = imp.load('manuscripts', rows)
+    assert report[imp.INSERTED] == 2
+    assert report[imp.ERRORS][0][imp.ROW] == 2
+
+
+@patch('data.db_connect.create_many', autospec=True, side_effect=inserted)
+def test_load_ordered_stops(mock_create_many):
+    rows = imp.parse_ndjson(ndjson(GOOD_MANU, {'title': 'T'}, GOOD_MANU))
+    report = imp.load('manuscripts', rows, ordered=True)
+    assert report[imp.INSERTED] == 1
+    assert report[imp.REJECTED] == 1
+
+
+@patch('data.db_connect.create_many', autospec=True)
+def test_load_write_errors(mock_create_many):
+    mock_create_many.side_effect = BulkWriteError({
+        'nInserted': 1,
+        'writeErrors': [{'index': 1, 'errmsg': 'E11000 duplicate key'}],
+    })
+    rows = imp.parse_ndjson(ndjson(GOOD_MANU, GOOD_MANU))
+    report = imp.load('manuscripts', rows)
+    assert report[imp.INSERTED] == 1
+    assert report[imp.ERRORS] == [{imp.ROW: 2,
+                                   imp.ERROR: 'E11000 duplicate key'}]
+
+
+@patch('data.db_connect.create_many', autospec=True)
+def test_load_passes_on_inserted(mock_create_many):
+    mock_create_many.side_effect = BulkWriteError({
+        'nInserted': 2,
+        'writeErrors': [{'index': 1, 'errmsg': 'E11000 duplicate key'}],
+    })
+    batches = []
+    rows = imp.parse_ndjson(ndjson(*[dict(GOOD_MANU, title=f'T{i}')
+                                     for i in range(3)]))
+    imp.load('manuscripts', rows, on_insert=batches.append)
+    assert [[doc['title'] for doc in batch] for batch in batches] == \
+        [['T0', 'T2']]
+
+
+@patch('data.db_connect.create_many', autospec=True, side_effect=inserted)
+@patch('data.db_connect.read_cursor', autospec=True,
+       return_value=[{'email': 'old@nyu.edu'}])
+def test_load_people(mock_read_cursor, mock_create_many):
+    rows = imp.parse_ndjson(ndjson(
+        GOOD_PERSON,
+        {**GOOD_PERSON, 'password': 'pw'},
+        {**GOOD_PERSON, 'email': 'old@nyu.edu'},
+        {**GOOD_PERSON, 'email': 'new@nyu.edu', 'password': 'pw'},
+    ))
+    report = imp.load('people', rows,
+                      hash_passwords=lambda pws: [pw and f'hash:{pw}'
+                                                  for pw in pws])
+    assert report[imp.INSERTED] == 2
+    assert [error[imp.ROW] for error in report[imp.ERRORS]] == [2, 3]
+    docs = mock_create_many.call_args.args[1]
+    assert docs[1]['password_hash'] == 'hash:pw'
+    assert 'password' not in docs[1]
+
+
+def test_load_bad_collection():
+    with pytest.raises(ValueError):
+        imp.load('rate_limits', [])
+
+
+@patch('data.db_connect.create_many', autospec=True, side_effect=inserted)
+def test_load_stores_text_as_blob(mock_create_many):
+    imp.load('manuscripts', imp.parse_ndjson(ndjson(GOOD_MANU)))
+    doc = mock_create_many.call_args.args[1][0]
+    assert 'text' not in doc
+    assert doc['text_blob'] == {'sha256': 'Text'}
+
+
+@patch('data.db_connect.create_many', autospec=True, side_effect=inserted)
+def test_load_rejects_bad_text_per_row(mock_create_many):
+    report = imp.load('manuscripts', imp.parse_ndjson(
+        ndjson(GOOD_MANU, {**GOOD_MANU, 'text': 5}, GOOD_MANU)))
+    assert report[imp.INSERTED] == 2
+    assert report[imp.REJECTED] == 1
+    assert report[imp.ERRORS][0][imp.ROW] == 2
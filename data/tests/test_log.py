@@ -0,0 +1,113 @@
+import io
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+
+import data.log as log
+
+
+@pytest.fixture
+def capture():
+    """
+    A logger writing JSON lines to a string buffer.
+    """
+    stream = io.StringIO()
+    logger = logging.getLogger('test_log_capture')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    handler = log.make_handler(log.JSON, stream)
+    logger.addHandler(handler)
+    yield logger, stream
+    logger.removeHandler(handler)
+
+
+def lines(stream) -> list:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_get_logger():
+    with patch('data.log.configure', autospec=True) as mock_configure:
+        logger = log.get_logger(__name__)
+    assert isinstance(logger, logging.Logger)
+    # importing a module must not set up logging:
+    mock_configure.assert_not_called()
+
+
+def test_configure_once():
+    root = logging.getLogger()
+    with patch('data.log.configured', False), \
+            patch.object(root, 'handlers', []):
+        log.configure()
+        log.configure()
+        assert len(root.handlers) == 1
+        assert log.configured
+
+
+def test_clean_request_id():
+    assert log.clean_request_id('abc-123') == 'abc-123'
+    assert log.VALID_REQUEST_ID.fullmatch(log.clean_request_id('bad id'))
+
+
+def test_json_line(capture):
+    logger, stream = capture
+    logger.info('Read %d docs from %s', 3, 'people')
+    entry = lines(stream)[0]
+    assert entry['level'] == 'INFO'
+    assert entry['msg'] == 'Read 3 docs from people'
+    assert entry['logger'] == 'test_log_capture'
+
+
+def test_extra_fields(capture):
+    logger, stream = capture
+    logger.info('Done', extra={log.FIELDS: {'collection': 'people'}})
+    assert lines(stream)[0]['collection'] == 'people'
+
+
+def test_request_id(capture):
+    logger, stream = capture
+    req_id = log.set_request_id('abc-123')
+    assert req_id == 'abc-123'
+    logger.info('In a request')
+    assert lines(stream)[0]['request_id'] == 'abc-123'
+
+
+def test_bad_request_id_replaced():
+    req_id = log.set_request_id('bad id\nwith newline')
+    assert req_id != 'bad id\nwith newline'
+    assert log.VALID_REQUEST_ID.fullmatch(req_id)
+
+
+def test_new_request_id():
+    assert log.set_request_id() != log.set_request_id()
+
+
+def test_exception_logged(capture):
+    logger, stream = capture
+    try:
+        raise ValueError('oops')
+    except ValueError:
+        logger.exception('Failed')
+    assert 'ValueError' in lines(stream)[0]['exc']
+
+
+def test_debug_sampling(capture):
+    logger, stream = capture
+    with patch('data.log.DEBUG_SAMPLE_RATE', 0):
+        for _ in range(10):
+            logger.debug('Noisy')
+        logger.info('Kept')
+    assert [entry['msg'] for entry in lines(stream)] == ['Kept']
+
+
+def test_lazy_formatting(capture):
+    logger, stream = capture
+    logger.setLevel(logging.INFO)
+
+    class Expensive:
+        def __str__(self):
+            raise AssertionError('formatted a suppressed line')
+
+    logger.debug('Value: %s', Expensive())
+    assert stream.getvalue() == ''
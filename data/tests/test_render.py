@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+import pytest
+
+import data.render as rnd
+
+MD_TEXT = '# Title\n\nSome *emphasis* here.'
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    rnd.clear_cache()
+    yield
+    rnd.clear_cache()
+
+
+def test_render_returns_html():
+    rendered = rnd.render(MD_TEXT)
+    assert isinstance(rendered, str)
+    assert '<' in rendered
+    assert 'emphasis' in rendered
+
+
+def test_render_empty():
+    assert rnd.render('') == ''
+
+
+def test_render_strips_script():
+    rendered = rnd.render('Hello <script>alert("hi")</script> there')
+    assert '<script' not in rendered
+    assert 'alert' not in rendered
+    assert 'Hello' in rendered
+
+
+def test_sanitize_drops_unsafe_attrs():
+    clean = rnd.sanitize('<p onclick="evil()">x</p>'
+                         '<a href="javascript:evil()">link</a>'
+                         '<a href="https://nyu.edu" onmouseover="x">ok</a>')
+    assert 'onclick' not in clean
+    assert 'javascript' not in clean
+    assert 'onmouseover' not in clean
+    assert 'href="https://nyu.edu"' in clean
+
+
+def test_sanitize_escapes_text():
+    assert rnd.sanitize('<p>a &lt; b</p>') == '<p>a &lt; b</p>'
+
+
+@patch('data.render.get_markdown', return_value=None)
+def test_render_without_markdown(mock_get_markdown):
+    rendered = rnd.render('first para\n\nsecond <b>para</b>')
+    assert rendered.count('<p>') == 2
+    assert '<b>' not in rendered
+
+
+def test_render_is_cached():
+    with patch('data.render.to_html', wraps=rnd.to_html) as mock_to_html:
+        first = rnd.render(MD_TEXT)
+        second = rnd.render(MD_TEXT)
+    assert first == second
+    assert mock_to_html.call_count == 1
+    info = rnd.cache_info()
+    assert info['hits'] == 1
+    assert info['misses'] == 1
+
+
+def test_render_rerenders_after_edit():
+    with patch('data.render.to_html', wraps=rnd.to_html) as mock_to_html:
+        rnd.render(MD_TEXT)
+        rnd.render(MD_TEXT + ' Edited.')
+    assert mock_to_html.call_count == 2
+
+
+def test_cache_is_bounded():
+    with patch('data.render.CACHE_SIZE', 2):
+        for i in range(5):
+            rnd.render(f'page {i}')
+        assert rnd.cache_info()['size'] == 2
+
+
+def test_content_hash():
+    assert rnd.content_hash(MD_TEXT) == rnd.content_hash(MD_TEXT)
+    assert rnd.content_hash(MD_TEXT) != rnd.content_hash(MD_TEXT + '!')
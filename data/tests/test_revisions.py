@@ -0,0 +1,66 @@
+import random
+from unittest.mock import patch
+
+import pytest
+
+import data.blobs as blobs
+import data.revisions as revs
+
+
+def make_text(seed: int = 1, paragraphs: int = 100) -> bytes:
+    rng = random.Random(seed)
+    words = ['alpha', 'beta', 'gamma', 'delta', 'theory', 'model', 'data']
+    return '\n\n'.join(' '.join(rng.choice(words)
+                                for _ in range(rng.randint(40, 200)))
+                       for _ in range(paragraphs)).encode()
+
+
+TEXT = make_text()
+
+
+def test_split_round_trips():
+    chunks = revs.split(TEXT)
+    assert b''.join(chunks) == TEXT
+    assert len(chunks) > 1
+    assert all(len(chunk) <= revs.MAX_CHUNK for chunk in chunks)
+    assert all(len(chunk) >= revs.MIN_CHUNK for chunk in chunks[:-1])
+
+
+def test_split_small_and_empty():
+    assert revs.split(b'') == []
+    assert revs.split(b'short') == [b'short']
+
+
+def test_split_max_size():
+    # no boundaries in a run of one byte: every chunk is cut at the max
+    chunks = revs.split(b'x' * (3 * revs.MAX_CHUNK))
+    assert [len(chunk) for chunk in chunks] == [revs.MAX_CHUNK] * 3
+
+
+def test_edit_changes_few_chunks():
+    before = revs.split(TEXT)
+    middle = len(TEXT) // 2
+    after = revs.split(TEXT[:middle] + b' an inserted edit ' + TEXT[middle:])
+    assert len(set(after) - set(before)) <= 2
+
+
+def test_put_chunks_bad_digest():
+    with pytest.raises(ValueError):
+        revs.put_chunks({'not the hash': b'chunk'})
+
+
+@patch('data.db_connect.create_many', autospec=True)
+@patch('data.revisions.missing', autospec=True,
+       side_effect=lambda digests, db: digests[1:])
+def test_put_chunks_only_missing(mock_missing, mock_create_many):
+    chunks = {blobs.content_hash(chunk): chunk for chunk in (b'a', b'b')}
+    assert revs.put_chunks(chunks) == 1
+    docs = mock_create_many.call_args.args[1]
+    assert [doc[revs.LENGTH] for doc in docs] == [1]
+
+
+@patch('data.revisions.missing', autospec=True, return_value=['gone'])
+def test_add_missing_chunks(mock_missing):
+    with pytest.raises(LookupError) as err:
+        revs.add('manu', ['gone'])
+    assert err.value.args[0] == ['gone']
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+import data.single_flight as sf
+
+NUM_CALLERS = 8
+KEY = sf.make_key('people', {'roles': 'ED'}, True)
+
+
+def wait_for_waiters(key, num):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with sf.lock:
+            call = sf.in_flight.get(key)
+            if call is not None and call.waiters >= num:
+                return
+        time.sleep(0.001)
+    raise AssertionError(f'{num} waiters never arrived')
+
+
+def run_concurrently(key, fn):
+    """
+    Call sf.do(key, fn) from NUM_CALLERS threads while fn is held
+    running; return the results (or exceptions) and fn's call count.
+    """
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return fn()
+
+    results = [None] * NUM_CALLERS
+
+    def caller(i):
+        try:
+            results[i] = sf.do(key, load)
+        except Exception as err:
+            results[i] = err
+
+    threads = [threading.Thread(target=caller, args=(i,))
+               for i in range(NUM_CALLERS)]
+    for thread in threads:
+        thread.start()
+    wait_for_waiters(key, NUM_CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, len(calls)
+
+
+def test_make_key_ignores_dict_order():
+    key = sf.make_key('c', {'a': 1, 'b': 2})
+    assert key == sf.make_key('c', {'b': 2, 'a': 1})
+    assert sf.make_key('c', {'a': 1}) != sf.make_key('c', {'a': 2})
+
+
+def test_do_alone():
+    result = {'x': [1]}
+    assert sf.do(KEY, lambda: result) is result
+    assert KEY not in sf.in_flight
+
+
+def test_concurrent_calls_share_one_load():
+    results, num_calls = run_concurrently(KEY, lambda: {'x': [1, 2]})
+    assert num_calls == 1
+    assert all(result == {'x': [1, 2]} for result in results)
+    # each caller has its own copy:
+    results[0]['x'].append(3)
+    assert results[1] == {'x': [1, 2]}
+    assert KEY not in sf.in_flight
+
+
+def test_concurrent_calls_share_errors():
+    def fail():
+        raise ValueError('DB down')
+
+    results, num_calls = run_concurrently(KEY, fail)
+    assert num_calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    with pytest.raises(ValueError):
+        sf.do(KEY, fail)
+
+
+def test_stats():
+    before = sf.stats()
+    sf.do(KEY, lambda: 1)
+    after = sf.stats()
+    assert after[sf.LEADS] == before[sf.LEADS] + 1
+    assert after['in_flight'] == 0
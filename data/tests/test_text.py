@@ -12,3 +12,13 @@ def test_read_one():
 
 def test_read_one_not_found():
     assert txt.read_one('Not a page key!') == {}
+
+
+def test_read_one_rendered():
+    page = txt.read_one_rendered(txt.TEST_KEY)
+    assert txt.HTML in page
+    assert page[txt.TEXT] in page[txt.HTML]
+
+
+def test_read_one_rendered_not_found():
+    assert txt.read_one_rendered('Not a page key!') == {}
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import data.manuscripts as manu
+import data.people as ppl
+import data.workload as wl
+
+ABSTRACT = 'Graph algorithms for sparse graph partitioning.'
+
+
+def test_terms():
+    words = wl.terms(ABSTRACT)
+    assert words['graph'] == 2
+    assert 'for' not in words
+    assert wl.top_terms(ABSTRACT)[0] == 'graph'
+
+
+def test_changes_assign():
+    incs = wl.changes(['r1'], manu.IN_REF_REV, ['r1', 'r2'], manu.IN_REF_REV,
+                      ABSTRACT)
+    # r1 is as loaded as before, and keeps the terms it had:
+    assert list(incs) == ['r2']
+    assert incs['r2'][wl.ACTIVE] == 1
+    assert incs['r2'][f'{wl.BY_STATE}.{manu.IN_REF_REV}'] == 1
+    assert incs['r2'][f'{wl.TERMS}.graph'] == 1
+
+
+def test_changes_state():
+    incs = wl.changes(['r1'], manu.IN_REF_REV, ['r1'], manu.AUTHOR_REVISIONS)
+    assert incs == {'r1': {f'{wl.BY_STATE}.{manu.IN_REF_REV}': -1,
+                           f'{wl.BY_STATE}.{manu.AUTHOR_REVISIONS}': 1}}
+
+
+def test_changes_done():
+    incs = wl.changes(['r1'], manu.IN_REF_REV, ['r1'], manu.REJECTED)
+    assert incs['r1'][wl.ACTIVE] == -1
+    # going from one done state to another changes nothing:
+    assert wl.changes(['r1'], manu.REJECTED, ['r1'], manu.WITHDRAWN) == {}
+
+
+def test_similarity():
+    words = wl.terms(ABSTRACT)
+    assert wl.similarity(words, {}) == 0.0
+    assert round(wl.similarity(words, dict(words)), 6) == 1.0
+
+
+@patch('data.db_connect.bulk_write', autospec=True)
+def test_record(mock_bulk_write):
+    wl.record([], None, ['r1'], manu.SUBMITTED, ABSTRACT)
+    ops = mock_bulk_write.call_args.args[1]
+    assert len(ops) == 1
+    wl.record(['r1'], manu.REJECTED, ['r1'], manu.WITHDRAWN)
+    mock_bulk_write.assert_called_once()
+
+
+@patch('data.db_connect.bulk_write', autospec=True)
+def test_record_new(mock_bulk_write):
+    wl.record_new([{'referees': ['r1'], 'state': manu.IN_REF_REV},
+                   {'referees': ['r1', 'r2'], 'state': manu.IN_REF_REV},
+                   {'state': manu.SUBMITTED}])
+    ops = {op._filter['_id']: op._doc['$inc']
+           for op in mock_bulk_write.call_args.args[1]}
+    # one op a referee, incremented so concurrent changes are kept:
+    assert ops['r1'][wl.ACTIVE] == 2
+    assert ops['r2'][wl.ACTIVE] == 1
+
+
+PEOPLE = [{ppl.EMAIL: 'busy@nyu.edu', ppl.NAME: 'Busy'},
+          {ppl.EMAIL: 'free@nyu.edu', ppl.NAME: 'Free'},
+          {ppl.EMAIL: 'expert@nyu.edu', ppl.NAME: 'Expert'},
+          {ppl.EMAIL: 'author@nyu.edu', ppl.NAME: 'Author'}]
+LOADS = [{'_id': 'busy@nyu.edu', wl.ACTIVE: 3,
+          wl.BY_STATE: {manu.IN_REF_REV: 3, manu.SUBMITTED: 0}},
+         {'_id': 'expert@nyu.edu', wl.ACTIVE: 1,
+          wl.BY_STATE: {manu.IN_REF_REV: 1},
+          wl.TERMS: {'graph': 4, 'partitioning': 2, 'sparse': 1}}]
+
+
+def fake_read_cursor(collection, filt=None, projection=None, db=None):
+    if collection == ppl.PEOPLE_COLLECT:
+        return iter(PEOPLE)
+    return iter([load for load in LOADS
+                 if load['_id'] in filt['_id']['$in']])
+
+
+@patch('data.db_connect.read_cursor', autospec=True,
+       side_effect=fake_read_cursor)
+def test_recommend(mock_read_cursor):
+    manuscript = {'abstract': ABSTRACT, 'author_email': 'author@nyu.edu',
+                  'referees': []}
+    ranked = wl.recommend(manuscript)
+    assert [rec[ppl.EMAIL] for rec in ranked] == [
+        'expert@nyu.edu', 'free@nyu.edu', 'busy@nyu.edu']
+    assert ranked[0][wl.SIMILARITY] > 0
+    assert ranked[2][wl.BY_STATE] == {manu.IN_REF_REV: 3}
+    assert len(wl.recommend(manuscript, limit=1)) == 1
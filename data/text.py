@@ -1,9 +1,14 @@
+import data.log as log
+import data.render as rnd
+
+logger = log.get_logger(__name__)
 
 # fields
 KEY = 'key'
 TITLE = 'title'
 TEXT = 'text'
 EMAIL = 'email'
+HTML = 'html'
 
 TEST_KEY = 'HomePage'
 SUBM_KEY = 'SubmissionsPage'
@@ -32,7 +37,7 @@ def create(key: str, title: str, text: str, email: str = None) -> bool:
     Creates a new entry in text_dict if it is a unique key.
     """
     if key in text_dict:
-        print(f"Key '{key}' already exists.")
+        logger.info("Key '%s' already exists.", key)
         return False
 
     new_entry = {
@@ -86,6 +91,17 @@ def read_one(key: str) -> dict:
     return result
 
 
+def read_one_rendered(key: str) -> dict:
+    """
+    Like read_one(), but the page also carries its text
+    rendered to sanitized HTML.
+    """
+    page = read_one(key)
+    if page:
+        page = {**page, HTML: rnd.render(page.get(TEXT, ''))}
+    return page
+
+
 def main():
     print(read())
 
@@ -0,0 +1,224 @@
+"""
+This module keeps a running tally of each referee's workload, so
+finding who is free to referee doesn't mean reading every manuscript.
+A doc per referee in referee_loads holds their active assignments
+(on manuscripts not yet rejected, withdrawn or published), counted by
+the manuscript's state, and the words of the abstracts they have been
+given, which we match against a new abstract to find who knows the
+topic.
+record() keeps the tally as manuscripts change referees and states,
+record_new() as they are imported;
+rebuild() works it out afresh from the manuscripts.
+"""
+import math
+import re
+from collections import Counter
+
+from pymongo import UpdateOne
+
+import data.db_connect as dbc
+import data.manuscripts as manu
+import data.manuscripts.fields as flds
+import data.people as ppl
+import data.roles as rls
+
+LOADS_COLLECT = 'referee_loads'
+MANU_COLLECT = 'manuscripts'
+
+# the fields of a load:
+ACTIVE = 'active'
+BY_STATE = 'by_state'
+TERMS = 'terms'
+
+# the fields of a recommendation, besides ACTIVE and BY_STATE:
+SIMILARITY = 'similarity'
+SCORE = 'score'
+
+# a referee is done with manuscripts in these states:
+DONE_STATES = {manu.REJECTED, manu.WITHDRAWN, manu.PUBLISHED}
+
+# an abstract adds its TOP_TERMS commonest words to its referees' terms
+TOP_TERMS = 20
+MIN_WORD_LEN = 3
+WORD_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset("""
+    about after also among and are because been being between both but
+    can could does each for from had has have here how into its more
+    most not now one only other our over paper such than that the their
+    them then there these they this those through under use used using
+    was way well were what when where which while who why will with
+    would you your
+""".split())
+
+# a perfect topic match is worth this many fewer assignments:
+SIMILARITY_WEIGHT = 3
+DEFAULT_LIMIT = 10
+
+
+def terms(text: str) -> Counter:
+    """
+    Count the words of text worth matching on.
+    """
+    return Counter(word for word in WORD_RE.findall((text or '').lower())
+                   if len(word) >= MIN_WORD_LEN and word not in STOP_WORDS)
+
+
+def top_terms(text: str) -> list:
+    return [term for term, _ in terms(text).most_common(TOP_TERMS)]
+
+
+def is_active(state) -> bool:
+    return state is not None and state not in DONE_STATES
+
+
+def changes(old_referees: list, old_state, new_referees: list, new_state,
+            abstract: str = '') -> dict:
+    """
+    Work out how a manuscript going from old_state with old_referees
+    to new_state with new_referees changes its referees' loads.
+    A state of None means the manuscript didn't (or no longer) exists.
+    Return the $inc to apply for each referee whose load changes.
+    """
+    incs = {}
+    if is_active(old_state):
+        for referee in set(old_referees):
+            inc = incs.setdefault(referee, Counter())
+            inc[ACTIVE] -= 1
+            inc[f'{BY_STATE}.{old_state}'] -= 1
+    if is_active(new_state):
+        for referee in set(new_referees):
+            inc = incs.setdefault(referee, Counter())
+            inc[ACTIVE] += 1
+            inc[f'{BY_STATE}.{new_state}'] += 1
+    added = set(new_referees) - set(old_referees)
+    if added:
+        # Referees keep the terms of what they were given, even once
+        # they are taken off it: it still says what they know.
+        for term in top_terms(abstract):
+            for referee in added:
+                incs.setdefault(referee, Counter())[f'{TERMS}.{term}'] += 1
+    ret = {}
+    for referee, inc in incs.items():
+        inc = {field: amount for field, amount in inc.items() if amount}
+        if inc:
+            ret[referee] = inc
+    return ret
+
+
+def record(old_referees: list, old_state, new_referees: list, new_state,
+           abstract: str = '', db=dbc.SE_DB):
+    """
+    Apply a manuscript's change of referees or state to their loads,
+    in one round trip.
+    """
+    ops = [UpdateOne({dbc.MONGO_ID: referee}, {'$inc': inc, **dbc.STAMP},
+                     upsert=True)
+           for referee, inc in changes(old_referees, old_state,
+                                       new_referees, new_state,
+                                       abstract).items()]
+    if ops:
+        dbc.bulk_write(LOADS_COLLECT, ops, db=db)
+
+
+def record_new(manus: list, db=dbc.SE_DB):
+    """
+    Add newly created manuscripts to their referees' loads, in one
+    round trip however many there are: a batch of an import, say.
+    """
+    totals = {}
+    for doc in manus:
+        for referee, inc in changes([], None, doc.get(flds.REFEREES, []),
+                                    doc.get(flds.STATE),
+                                    doc.get(flds.ABSTRACT)).items():
+            totals.setdefault(referee, Counter()).update(inc)
+    ops = [UpdateOne({dbc.MONGO_ID: referee},
+                     {'$inc': dict(inc), **dbc.STAMP}, upsert=True)
+           for referee, inc in totals.items()]
+    if ops:
+        dbc.bulk_write(LOADS_COLLECT, ops, db=db)
+
+
+def _nest(inc: dict) -> dict:
+    load = {ACTIVE: 0, BY_STATE: {}, TERMS: {}}
+    for field, amount in inc.items():
+        if '.' in field:
+            group, key = field.split('.', 1)
+            load[group][key] = amount
+        else:
+            load[field] = amount
+    return load
+
+
+def rebuild(db=dbc.SE_DB) -> int:
+    """
+    Work out every referee's load afresh from the manuscripts: to
+    repair drift, say. This reads them all.
+    Return how many referees there are loads for.
+    """
+    totals = {}
+    fields = {dbc.MONGO_ID: 0, flds.REFEREES: 1, flds.STATE: 1,
+              flds.ABSTRACT: 1}
+    for doc in dbc.read_cursor(MANU_COLLECT, None, fields, db=db):
+        for referee, inc in changes([], None, doc.get(flds.REFEREES, []),
+                                    doc.get(flds.STATE),
+                                    doc.get(flds.ABSTRACT)).items():
+            totals.setdefault(referee, Counter()).update(inc)
+    # Zero the loads of referees with nothing now, rather than delete
+    # them (which would need tombstones).
+    for doc in dbc.read_cursor(LOADS_COLLECT, None, {dbc.MONGO_ID: 1},
+                               db=db):
+        totals.setdefault(doc[dbc.MONGO_ID], Counter())
+    ops = [UpdateOne({dbc.MONGO_ID: referee},
+                     {'$set': _nest(inc), **dbc.STAMP}, upsert=True)
+           for referee, inc in totals.items()]
+    if ops:
+        dbc.bulk_write(LOADS_COLLECT, ops, db=db)
+    return len(ops)
+
+
+def similarity(words: Counter, profile: dict) -> float:
+    """
+    The cosine of the angle between two word counts: 1 for the same
+    mix of words, 0 for none in common.
+    """
+    dot = sum(count * profile.get(word, 0) for word, count in words.items())
+    if not dot:
+        return 0.0
+    norms = (math.sqrt(sum(count * count for count in words.values()))
+             * math.sqrt(sum(count * count for count in profile.values())))
+    return dot / norms
+
+
+def recommend(manuscript: dict, limit: int = DEFAULT_LIMIT,
+              db=dbc.SE_DB) -> list:
+    """
+    Rank the referees who could take on a manuscript, best first:
+    those with the least on, nudged up by how well they know its
+    topic. Its author and its referees already are left out.
+    Costs two indexed queries, whatever the number of manuscripts.
+    """
+    exclude = set(manuscript.get(flds.REFEREES, []))
+    exclude.add(manuscript.get(flds.AUTHOR_EMAIL))
+    referees = {person[ppl.EMAIL]: person for person in dbc.read_cursor(
+        ppl.PEOPLE_COLLECT, {ppl.ROLES: rls.RE_CODE},
+        {dbc.MONGO_ID: 0, ppl.EMAIL: 1, ppl.NAME: 1}, db=db)
+        if person[ppl.EMAIL] not in exclude}
+    loads = {load[dbc.MONGO_ID]: load for load in dbc.read_cursor(
+        LOADS_COLLECT, {dbc.MONGO_ID: {'$in': list(referees)}}, db=db)}
+    words = terms(manuscript.get(flds.ABSTRACT))
+    ranked = []
+    for email, person in referees.items():
+        load = loads.get(email, {})
+        active = load.get(ACTIVE, 0)
+        match = similarity(words, load.get(TERMS, {}))
+        ranked.append({
+            ppl.EMAIL: email,
+            ppl.NAME: person.get(ppl.NAME),
+            ACTIVE: active,
+            BY_STATE: {state: count for state, count
+                       in load.get(BY_STATE, {}).items() if count},
+            SIMILARITY: round(match, 3),
+            SCORE: round(SIMILARITY_WEIGHT * match - active, 3),
+        })
+    ranked.sort(key=lambda rec: (-rec[SCORE], rec[ppl.EMAIL]))
+    return ranked[:limit]
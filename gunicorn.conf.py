@@ -0,0 +1,124 @@
+"""
+gunicorn settings for the API; gunicorn reads this file from the
+working directory on its own, so the launch command is just
+
+    gunicorn server.endpoints:app
+
+Everything can be overridden from the environment:
+    WEB_CONCURRENCY        number of worker processes (set here if not)
+    GUNICORN_WORKER_CLASS  'gthread' (default), 'gevent' or 'sync'
+    GUNICORN_THREADS       threads per gthread worker
+    GUNICORN_MAX_REQUESTS  recycle a worker after this many requests
+    PORT                   port to listen on
+"""
+import multiprocessing
+import os
+import sys
+
+GTHREAD = 'gthread'
+GEVENT = 'gevent'
+SYNC = 'sync'
+WORKER_CLASSES = (GTHREAD, GEVENT, SYNC)
+
+
+def cpu_count() -> int:
+    """
+    The CPUs this process may run on: in a container that can be
+    fewer than the host has.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return multiprocessing.cpu_count()
+
+
+def choose_worker_class(env=os.environ) -> str:
+    worker_cls = env.get('GUNICORN_WORKER_CLASS', GTHREAD)
+    if worker_cls not in WORKER_CLASSES:
+        raise ValueError(f'GUNICORN_WORKER_CLASS must be one of '
+                         f'{WORKER_CLASSES}, not {worker_cls!r}')
+    return worker_cls
+
+
+def choose_workers(worker_cls: str, cpus: int, env=os.environ) -> int:
+    """
+    A gevent worker keeps any number of requests going on one core,
+    so one per CPU is enough.
+    Sync and gthread workers block on the DB, so we run the usual
+    2 * CPUs + 1.
+    """
+    if env.get('WEB_CONCURRENCY'):
+        return int(env['WEB_CONCURRENCY'])
+    if worker_cls == GEVENT:
+        return cpus
+    return 2 * cpus + 1
+
+
+worker_class = choose_worker_class()
+
+if worker_class == GEVENT:
+    # With preload_app the app is imported here, in the arbiter, before
+    # gevent's worker would patch anything: patch first, or the locks
+    # and sockets made at import are the blocking kind.
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = choose_workers(worker_class, cpu_count())
+# The app sizes per-worker pools (passwords') from this; set it before
+# preload_app imports the app.
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# for gevent: the most requests one worker has going at once
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+# We run behind a load balancer that reuses connections:
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then to bound slow leaks; the jitter keeps
+# them from all restarting at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+# Import the app once in the arbiter, so workers start fast and share
+# its memory pages. Nothing made at import may hold a socket or thread
+# into the workers: see post_fork.
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    import data.indexes as indexes
+    # Runs once, in the arbiter: the workers reconnect in post_fork.
+    try:
+        indexes.ensure()
+    except Exception:
+        server.log.exception('Could not make the DB indexes')
+
+
+def post_fork(server, worker):
+    import data.db_connect as dbc
+    import server.metrics as metrics
+    # The arbiter may have connected while the app was imported:
+    dbc.reset_client()
+    max_reqs = worker.max_requests
+    if max_reqs >= sys.maxsize:  # how gunicorn spells "never"
+        max_reqs = 0
+    metrics.worker_started(worker.pid, server.cfg.worker_class_str, max_reqs)
+    server.log.info('Worker %s started (max_requests=%s)', worker.pid,
+                    max_reqs)
+
+
+def worker_exit(server, worker):
+    server.log.info('Worker %s exiting after %s requests', worker.pid,
+                    worker.nr)
+
+
+def worker_abort(worker):
+    worker.log.warning('Worker %s aborted: it timed out after %ss',
+                       worker.pid, worker.cfg.timeout)
+
+
+def child_exit(server, worker):
+    # runs in the arbiter, once the worker process is gone
+    server.log.info('Worker %s exited', worker.pid)
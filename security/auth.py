@@ -0,0 +1,206 @@
+"""
+This module handles logging in: checking passwords against the
+hashes stored with each person, and issuing and validating signed
+session tokens.
+Validating a token is a local signature check (plus a cache of
+recently validated tokens), so it never needs the DB.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+
+import data.db_connect as dbc
+import data.log as log
+import data.people as ppl
+import security.passwords as pwd
+
+PASSWORD_HASH = 'password_hash'
+
+REVOKED_COLLECT = 'revoked_tokens'
+TOKEN_ID = 'token_id'
+EXPIRES = 'expires'
+
+TOKEN_TTL_SECS = int(os.environ.get('SESSION_TTL_SECS', 8 * 60 * 60))
+TOKEN_CACHE_SIZE = 4096
+# How long a worker may go before picking up other workers' revocations:
+MAX_STALE_SECS = float(os.environ.get('SESSION_MAX_STALE_SECS', 5))
+
+logger = log.get_logger(__name__)
+
+SECRET_KEY = os.environ.get('SESSION_SECRET')
+if not SECRET_KEY:
+    # Tokens from one worker won't validate in another, but we can run.
+    logger.warning('SESSION_SECRET not set: '
+                   + 'using a per-process session secret.')
+    SECRET_KEY = secrets.token_hex(32)
+
+# token -> (user_id, expires, token_id) for recently validated tokens:
+token_cache = OrderedDict()
+cache_lock = Lock()
+# token_id -> expires for revoked tokens that have not yet expired:
+revoked = {}
+last_revoked_check = 0
+revoked_lock = Lock()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(SECRET_KEY.encode('utf-8'), payload,
+                    hashlib.sha256).digest()
+
+
+def issue_token(user_id: str, ttl: int = None) -> str:
+    """
+    Return a signed session token for user_id that expires after
+    ttl seconds.
+    """
+    if ttl is None:
+        ttl = TOKEN_TTL_SECS
+    expires = int(time.time()) + ttl
+    token_id = secrets.token_hex(8)
+    payload = f'{user_id}|{expires}|{token_id}'.encode('utf-8')
+    return f'{_b64encode(payload)}.{_b64encode(_sign(payload))}'
+
+
+def parse_token(token: str):
+    """
+    Check the token's signature and return (user_id, expires, token_id),
+    or None if the token is malformed or was not signed by us.
+    Expiry and revocation are not checked here.
+    """
+    try:
+        payload_part, sig_part = token.split('.')
+        payload = _b64decode(payload_part)
+        sig = _b64decode(sig_part)
+    except (ValueError, AttributeError):
+        return None
+    if not hmac.compare_digest(sig, _sign(payload)):
+        return None
+    try:
+        user_id, expires, token_id = payload.decode('utf-8').rsplit('|', 2)
+        return user_id, int(expires), token_id
+    except ValueError:
+        return None
+
+
+def load_revoked():
+    """
+    Read the revocations that have not yet expired from the DB.
+    Ones made in this worker meanwhile are kept.
+    """
+    global revoked, last_revoked_check
+    last_revoked_check = time.monotonic()
+    dbc.connect_db()
+    now = time.time()
+    docs = dbc.read(REVOKED_COLLECT, filt={EXPIRES: {'$gt': now}})
+    fresh = {doc[TOKEN_ID]: doc[EXPIRES] for doc in docs}
+    fresh.update((token_id, expires) for token_id, expires
+                 in list(revoked.items()) if expires > now)
+    revoked = fresh
+
+
+def _reload_revoked():
+    try:
+        load_revoked()
+    except Exception:
+        logger.exception('Error reading revoked tokens')
+    finally:
+        revoked_lock.release()
+
+
+def refresh_revoked():
+    """
+    Pick up other workers' revocations at most once every MAX_STALE_SECS.
+    The read runs in a background thread, so validate_token() never
+    waits on the DB: it checks against what we have meanwhile.
+    """
+    if time.monotonic() - last_revoked_check <= MAX_STALE_SECS:
+        return
+    if not revoked_lock.acquire(blocking=False):
+        return
+    try:
+        Thread(target=_reload_revoked, name='revoked-tokens',
+               daemon=True).start()
+    except Exception:
+        revoked_lock.release()
+        raise
+
+
+def validate_token(token: str):
+    """
+    Return the user id the token was issued to, or None if it is
+    invalid, expired or revoked.
+    """
+    if not token:
+        return None
+    refresh_revoked()
+    with cache_lock:
+        claims = token_cache.get(token)
+        if claims is not None:
+            token_cache.move_to_end(token)
+    if claims is None:
+        claims = parse_token(token)
+        if claims is None:
+            return None
+        with cache_lock:
+            token_cache[token] = claims
+            if len(token_cache) > TOKEN_CACHE_SIZE:
+                token_cache.popitem(last=False)
+    user_id, expires, token_id = claims
+    if expires <= time.time() or token_id in revoked:
+        return None
+    return user_id
+
+
+def revoke_token(token: str) -> bool:
+    """
+    Revoke a token in this worker at once, and in the others
+    within MAX_STALE_SECS.
+    Returns False if the token was not valid to begin with.
+    """
+    claims = parse_token(token)
+    if claims is None:
+        return False
+    _, expires, token_id = claims
+    revoked[token_id] = expires
+    dbc.connect_db()
+    dbc.create(REVOKED_COLLECT, {TOKEN_ID: token_id, EXPIRES: expires})
+    return True
+
+
+def check_password(email: str, password: str) -> bool:
+    person = ppl.read_one(email)
+    if not person:
+        return False
+    return pwd.verify_password(person.get(PASSWORD_HASH), password)
+
+
+def login(email: str, password: str):
+    """
+    Return a new session token if the password is right, else None.
+    """
+    if not check_password(email, password):
+        return None
+    return issue_token(email)
+
+
+def main():
+    token = issue_token('jl12631@nyu.edu')
+    print(f'{token=}')
+    print(f'{parse_token(token)=}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+This module hashes and checks passwords.
+pbkdf2 is deliberately slow, and running it in a request thread
+holds the GIL and stalls every other request on that worker.
+So the work is done in a bounded pool of worker processes instead.
+"""
+import os
+from threading import BoundedSemaphore, Lock
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def default_pool_size(cpus: int = None, env=os.environ) -> int:
+    """
+    Every gunicorn worker has a pool of its own, so they share the
+    CPUs out between them (gunicorn.conf.py sets WEB_CONCURRENCY to
+    how many there are) rather than each start a process per CPU.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    workers = int(env.get('WEB_CONCURRENCY') or 1)
+    return max(1, cpus // workers)
+
+
+# The pbkdf2 work factor. Stored hashes record their own iteration
+# count, so raising this does not break existing passwords.
+HASH_ITERATIONS = int(os.environ.get('PW_HASH_ITERATIONS', 600_000))
+# Processes doing the hashing, in each worker; 0 means hash in the
+# calling thread.
+POOL_SIZE = int(os.environ.get('PW_HASH_WORKERS', default_pool_size()))
+# Most hash jobs a worker will queue before turning requests away:
+MAX_PENDING = int(os.environ.get('PW_HASH_MAX_PENDING',
+                                 4 * max(POOL_SIZE, 1)))
+# Seconds to wait for a queue slot before giving up:
+QUEUE_TIMEOUT = float(os.environ.get('PW_HASH_QUEUE_TIMEOUT', 10))
+
+pool = None
+pool_lock = Lock()
+pending = BoundedSemaphore(MAX_PENDING)
+
+
+def hash_method() -> str:
+    return f'pbkdf2:sha256:{HASH_ITERATIONS}'
+
+
+def _hash(password: str, method: str) -> str:
+    if password is None:
+        return None
+    return generate_password_hash(password, method=method)
+
+
+def get_pool():
+    """
+    The pool is created on first use, so under gunicorn each worker
+    gets its own after the fork (and multiprocessing, slow to import,
+    stays out of startup).
+    We spawn rather than fork the pool's processes: forking a
+    threaded server process is not safe.
+    """
+    global pool
+    with pool_lock:
+        if pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(
+                max_workers=POOL_SIZE,
+                mp_context=multiprocessing.get_context('spawn'))
+        return pool
+
+
+def shutdown():
+    global pool
+    with pool_lock:
+        if pool is not None:
+            pool.shutdown(wait=True)
+            pool = None
+
+
+def _run(fn, *args):
+    if POOL_SIZE < 1:
+        return fn(*args)
+    if not pending.acquire(timeout=QUEUE_TIMEOUT):
+        raise TimeoutError('Too many passwords waiting to be hashed.')
+    try:
+        return get_pool().submit(fn, *args).result()
+    finally:
+        pending.release()
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password, hash_method())
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    if not password_hash or not password:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+
+def hash_many(passwords: list) -> list:
+    """
+    Hash a batch of passwords in parallel across the pool.
+    None passwords give None hashes.
+    The whole batch takes one queue slot.
+    """
+    method = hash_method()
+    if POOL_SIZE < 1:
+        return [_hash(password, method) for password in passwords]
+    if not pending.acquire(timeout=QUEUE_TIMEOUT):
+        raise TimeoutError('Too many passwords waiting to be hashed.')
+    try:
+        chunksize = max(1, len(passwords) // (POOL_SIZE * 4))
+        return list(get_pool().map(_hash, passwords,
+                                   [method] * len(passwords),
+                                   chunksize=chunksize))
+    finally:
+        pending.release()
@@ -1,6 +1,15 @@
+import os
+import time
+from collections import namedtuple
 from functools import wraps
+from threading import Lock
+from types import MappingProxyType
 
-# import data.db_connect as dbc
+import pymongo as pm
+
+import data.db_connect as dbc
+import data.log as log
+import security.auth as auth
 
 """
 Our record format to meet our requirements will be:
@@ -49,6 +58,12 @@ Our record format to meet our requirements will be:
 """
 
 COLLECT_NAME = 'security'
+# each feature is stored as its own doc in COLLECT_NAME:
+FEATURE_NAME = 'feature_name'
+PROTECTION = 'protection'
+# ...along with one doc holding the version of the whole record set:
+VERSION_DOC = '_version'
+VERSION = 'version'
 CREATE = 'create'
 READ = 'read'
 UPDATE = 'update'
@@ -67,8 +82,22 @@ BAD_FEATURE = 'baaaad feature'
 PEOPLE_MISSING_ACTION = READ
 GOOD_USER_ID = 'jl12631@nyu.edu'
 
+# How long a worker may go before checking for newer records:
+MAX_STALE_SECS = float(os.environ.get('SECURITY_MAX_STALE_SECS', 5))
+# ...and how long that check may take: it runs in a request, so with
+# the DB down it must give up long before the driver's 30s default.
+VERSION_CHECK_SECS = float(os.environ.get('SECURITY_VERSION_CHECK_SECS',
+                                          0.5))
+
 security_recs = None
-# These will come from the DB soon:
+# security_recs compiled by compile_recs(), keyed on (feature, action):
+permission_index = None
+recs_version = None
+last_version_check = 0
+reload_lock = Lock()
+
+logger = log.get_logger(__name__)
+# Used when the DB holds no security records:
 TEST_RECS = {
     PEOPLE: {
         CREATE: {
@@ -85,6 +114,10 @@ TEST_RECS = {
             },
         },
     },
+}
+
+# These must fail to compile:
+BAD_RECS = {
     BAD_FEATURE: {
         CREATE: {
             USER_LIST: [GOOD_USER_ID],
@@ -98,9 +131,9 @@ TEST_RECS = {
 
 def is_valid_key(user_id: str, login_key: str):
     """
-    This is just a mock of the real is_valid_key() we'll write later.
+    A login key is valid if it is a live session token issued to user_id.
     """
-    return True
+    return auth.validate_token(login_key) == user_id
 
 
 def check_login(user_id: str, **kwargs):
@@ -126,22 +159,168 @@ CHECK_FUNCS = {
 }
 
 
+# The compiled form of one (feature, action) protection.
+# users is a frozenset of user ids, or None if any user may pass.
+# checks is a tuple of the check functions that must all pass.
+Protection = namedtuple('Protection', ['users', 'checks'])
+
+
+def compile_recs(recs: dict) -> MappingProxyType:
+    """
+    Turn security records into a read-only index keyed on
+    (feature, action), so is_permitted() does no list scans
+    and no check lookups by name.
+    Raises ValueError for an unknown check, so bad records are
+    caught when they are loaded, not when a request comes in.
+    """
+    index = {}
+    for feature_name, feature in recs.items():
+        for action, prot in feature.items():
+            users = None
+            if USER_LIST in prot:
+                users = frozenset(prot[USER_LIST])
+            checks = []
+            for check, required in prot.get(CHECKS, {}).items():
+                if check not in CHECK_FUNCS:
+                    raise ValueError(f'Bad check for {feature_name} '
+                                     + f'{action}: {check}')
+                if required:
+                    checks.append(CHECK_FUNCS[check])
+            index[(feature_name, action)] = Protection(users, tuple(checks))
+    return MappingProxyType(index)
+
+
+def read_version():
+    """
+    Return the version of the records in the DB, or 0 if they
+    have never been written.
+    Raises pymongo's errors if the DB can't answer within
+    VERSION_CHECK_SECS.
+    """
+    dbc.connect_db()
+    with pm.timeout(VERSION_CHECK_SECS):
+        doc = dbc.fetch_one(COLLECT_NAME, {FEATURE_NAME: VERSION_DOC})
+    if doc is None:
+        return 0
+    return doc.get(VERSION, 0)
+
+
+def read_from_db() -> tuple:
+    """
+    Return (records, version) as stored in the DB.
+    Raises pymongo's errors if the DB can't answer within
+    VERSION_CHECK_SECS.
+    """
+    dbc.connect_db()
+    recs = {}
+    version = 0
+    with pm.timeout(VERSION_CHECK_SECS):
+        docs = dbc.read(COLLECT_NAME)
+    for doc in docs:
+        if doc.get(FEATURE_NAME) == VERSION_DOC:
+            version = doc.get(VERSION, 0)
+        else:
+            recs[doc[FEATURE_NAME]] = doc.get(PROTECTION, {})
+    return recs, version
+
+
+def load(recs: dict, version=None):
+    """
+    Compile recs and make them the ones is_permitted() uses.
+    The index is swapped in with a single assignment, so checks
+    running in other threads see either the old or the new one.
+    """
+    global security_recs, permission_index, recs_version
+    permission_index = compile_recs(recs)
+    security_recs = recs
+    recs_version = version
+
+
 def read() -> dict:
-    global security_recs
-    # dbc.read()
-    security_recs = TEST_RECS
+    """
+    Load the records from the DB.
+    If it can't be read, keep the records we have: the next refresh()
+    tries again. With none loaded yet the error is raised, so the
+    check it was for fails rather than lets anyone through.
+    TEST_RECS are used only if the DB has never had records (version
+    0) and none are loaded.
+    """
+    global last_version_check
+    try:
+        recs, version = read_from_db()
+    except Exception:
+        if permission_index is None:
+            raise
+        logger.exception('Error reading security records; keeping '
+                         'version %s', recs_version)
+        return security_recs
+    if not recs and not version:
+        if permission_index is not None:
+            return security_recs
+        recs = TEST_RECS
+    load(recs, version)
+    last_version_check = time.monotonic()
     return security_recs
 
 
+def write(recs: dict) -> int:
+    """
+    Store recs in the DB and bump the version, so every worker
+    picks them up within MAX_STALE_SECS.
+    Compiles them first: bad records never reach the DB.
+    """
+    compile_recs(recs)
+    old_recs, _ = read_from_db()
+    for feature_name, prot in recs.items():
+        dbc.update(COLLECT_NAME, {FEATURE_NAME: feature_name},
+                   {FEATURE_NAME: feature_name, PROTECTION: prot},
+                   upsert=True)
+    for old_feature in old_recs:
+        if old_feature not in recs:
+            dbc.delete(COLLECT_NAME, {FEATURE_NAME: old_feature})
+    # the version the increment made, not one read earlier: another
+    # writer may have bumped it in between
+    doc = dbc.find_one_and_update(COLLECT_NAME, {FEATURE_NAME: VERSION_DOC},
+                                  {'$inc': {VERSION: 1}}, upsert=True)
+    new_version = doc[VERSION]
+    load(recs, new_version)
+    return new_version
+
+
+def refresh():
+    """
+    Reload the records if their version in the DB has moved on.
+    Only one thread checks at a time; the others keep using the
+    records they have.
+    """
+    global last_version_check
+    if not reload_lock.acquire(blocking=False):
+        return
+    try:
+        last_version_check = time.monotonic()
+        try:
+            version = read_version()
+        except Exception:
+            logger.exception('Error checking security records version')
+            return
+        if version != recs_version:
+            read()
+    finally:
+        reload_lock.release()
+
+
 def needs_recs(fn):
     """
     Should be used to decorate any function that directly accesses sec recs.
+    Loads the records on first use, then looks for a newer version
+    at most once every MAX_STALE_SECS.
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        global security_recs
-        if not security_recs:
-            security_recs = read()
+        if permission_index is None:
+            read()
+        elif time.monotonic() - last_version_check > MAX_STALE_SECS:
+            refresh()
         return fn(*args, **kwargs)
     return wrapper
 
@@ -157,19 +336,12 @@ def read_feature(feature_name: str) -> dict:
 @needs_recs
 def is_permitted(feature_name: str, action: str,
                  user_id: str, **kwargs) -> bool:
-    prot = read_feature(feature_name)
+    prot = permission_index.get((feature_name, action))
     if prot is None:
         return True
-    if action not in prot:
-        return True
-    if USER_LIST in prot[action]:
-        if user_id not in prot[action][USER_LIST]:
-            return False
-    if CHECKS not in prot[action]:
-        return True
-    for check in prot[action][CHECKS]:
-        if check not in CHECK_FUNCS:
-            raise ValueError(f'Bad check passed to is_permitted: {check}')
-        if not CHECK_FUNCS[check](user_id, **kwargs):
+    if prot.users is not None and user_id not in prot.users:
+        return False
+    for check in prot.checks:
+        if not check(user_id, **kwargs):
             return False
     return True
@@ -0,0 +1,137 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import security.auth as auth
+
+TEST_USER = 'jl12631@nyu.edu'
+TEST_PASSWORD = 'a good password'
+TEST_PERSON = {
+    'email': TEST_USER,
+    auth.PASSWORD_HASH: generate_password_hash(TEST_PASSWORD,
+                                               method='pbkdf2:sha256:1000'),
+}
+
+
+@pytest.fixture(autouse=True)
+def no_db():
+    """
+    Keep revocations local: nothing here should touch the DB.
+    """
+    with patch('security.auth.dbc', autospec=True), \
+            patch('security.auth.last_revoked_check', time.monotonic()), \
+            patch('security.auth.MAX_STALE_SECS', 60):
+        auth.revoked.clear()
+        auth.token_cache.clear()
+        yield
+    auth.revoked.clear()
+
+
+def test_issue_and_validate():
+    token = auth.issue_token(TEST_USER)
+    assert isinstance(token, str)
+    assert auth.validate_token(token) == TEST_USER
+
+
+def test_validate_none():
+    assert auth.validate_token(None) is None
+
+
+def test_validate_garbage():
+    assert auth.validate_token('not.a.token') is None
+    assert auth.validate_token('garbage') is None
+
+
+def test_validate_tampered():
+    token = auth.issue_token(TEST_USER)
+    other = auth.issue_token('someone@nyu.edu')
+    forged = token.split('.')[0] + '.' + other.split('.')[1]
+    assert auth.validate_token(forged) is None
+
+
+def test_validate_expired():
+    token = auth.issue_token(TEST_USER, ttl=-1)
+    assert auth.validate_token(token) is None
+
+
+def test_validate_is_cached():
+    token = auth.issue_token(TEST_USER)
+    auth.validate_token(token)
+    with patch('security.auth.parse_token') as mock_parse:
+        assert auth.validate_token(token) == TEST_USER
+    mock_parse.assert_not_called()
+
+
+def test_token_cache_is_bounded():
+    with patch('security.auth.TOKEN_CACHE_SIZE', 3):
+        for i in range(10):
+            auth.validate_token(auth.issue_token(f'user{i}@nyu.edu'))
+        assert len(auth.token_cache) == 3
+
+
+def test_revoke_token():
+    token = auth.issue_token(TEST_USER)
+    assert auth.validate_token(token) == TEST_USER
+    assert auth.revoke_token(token)
+    assert auth.validate_token(token) is None
+    auth.dbc.create.assert_called_once()
+
+
+def test_revoke_bad_token():
+    assert not auth.revoke_token('garbage')
+    assert not auth.revoke_token(None)
+
+
+def test_revocations_from_other_workers():
+    token = auth.issue_token(TEST_USER)
+    _, expires, token_id = auth.parse_token(token)
+    auth.dbc.read.return_value = [{auth.TOKEN_ID: token_id,
+                                   auth.EXPIRES: expires}]
+    with patch('security.auth.MAX_STALE_SECS', -1):
+        assert auth.validate_token(token) is None
+
+
+@patch('data.people.read_one', autospec=True, return_value=TEST_PERSON)
+def test_login(mock_read_one):
+    token = auth.login(TEST_USER, TEST_PASSWORD)
+    assert auth.validate_token(token) == TEST_USER
+
+
+@patch('data.people.read_one', autospec=True, return_value=TEST_PERSON)
+def test_login_bad_password(mock_read_one):
+    assert auth.login(TEST_USER, 'wrong password') is None
+
+
+@patch('data.people.read_one', autospec=True, return_value=None)
+def test_login_no_such_person(mock_read_one):
+    assert auth.login('nobody@nyu.edu', TEST_PASSWORD) is None
+
+
+def test_refresh_revoked_in_background():
+    started = []
+    with patch('security.auth.last_revoked_check', 0), \
+            patch('security.auth.Thread', autospec=True) as mock_thread:
+        mock_thread.return_value.start.side_effect = \
+            lambda: started.append(True)
+        token = auth.issue_token(TEST_USER)
+        # validates at once, without waiting on the read:
+        assert auth.validate_token(token) == TEST_USER
+        assert started == [True]
+        assert mock_thread.call_args.kwargs['target'] is auth._reload_revoked
+        # a second call finds the reload running and starts no other:
+        auth.validate_token(token)
+        assert started == [True]
+    auth._reload_revoked()
+    assert not auth.revoked_lock.locked()
+
+
+def test_load_revoked_keeps_local():
+    token = auth.issue_token(TEST_USER)
+    auth.revoke_token(token)
+    auth.dbc.read.return_value = [{auth.TOKEN_ID: 'other',
+                                   auth.EXPIRES: time.time() + 60}]
+    auth.load_revoked()
+    assert 'other' in auth.revoked
+    assert auth.validate_token(token) is None
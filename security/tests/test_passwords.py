@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import pytest
+
+import security.passwords as pwd
+
+TEST_PASSWORD = 'a good password'
+FAST_ITERATIONS = 1000
+
+
+@pytest.fixture(autouse=True)
+def fast_hashes():
+    with patch('security.passwords.HASH_ITERATIONS', FAST_ITERATIONS):
+        yield
+
+
+@pytest.fixture
+def inline():
+    with patch('security.passwords.POOL_SIZE', 0):
+        yield
+
+
+@pytest.fixture(scope='module')
+def small_pool():
+    with patch('security.passwords.POOL_SIZE', 2):
+        yield
+        pwd.shutdown()
+
+
+def test_hash_method():
+    assert pwd.hash_method() == f'pbkdf2:sha256:{FAST_ITERATIONS}'
+
+
+def test_hash_and_verify_inline(inline):
+    pw_hash = pwd.hash_password(TEST_PASSWORD)
+    assert pw_hash.startswith(pwd.hash_method())
+    assert pwd.verify_password(pw_hash, TEST_PASSWORD)
+    assert not pwd.verify_password(pw_hash, 'wrong password')
+
+
+def test_verify_missing(inline):
+    assert not pwd.verify_password(None, TEST_PASSWORD)
+    assert not pwd.verify_password('some hash', '')
+
+
+def test_hash_many_inline(inline):
+    hashes = pwd.hash_many([TEST_PASSWORD, None])
+    assert hashes[1] is None
+    assert pwd.verify_password(hashes[0], TEST_PASSWORD)
+
+
+def test_hash_and_verify_in_pool(small_pool):
+    pw_hash = pwd.hash_password(TEST_PASSWORD)
+    assert pwd.verify_password(pw_hash, TEST_PASSWORD)
+    assert pwd.pool is not None
+
+
+def test_hash_many_in_pool(small_pool):
+    passwords = [f'password {i}' for i in range(6)]
+    hashes = pwd.hash_many(passwords)
+    assert len(hashes) == len(passwords)
+    for password, pw_hash in zip(passwords, hashes):
+        assert pwd.verify_password(pw_hash, password)
+
+
+def test_busy_pool_times_out():
+    with patch('security.passwords.POOL_SIZE', 1), \
+            patch('security.passwords.pending') as mock_pending:
+        mock_pending.acquire.return_value = False
+        with pytest.raises(TimeoutError):
+            pwd.hash_password(TEST_PASSWORD)
+        with pytest.raises(TimeoutError):
+            pwd.hash_many([TEST_PASSWORD])
+
+
+def test_default_pool_size():
+    assert pwd.default_pool_size(8, env={}) == 8
+    # nine workers on eight CPUs get a process each, not eight:
+    assert pwd.default_pool_size(8, env={'WEB_CONCURRENCY': '9'}) == 1
+    assert pwd.default_pool_size(8, env={'WEB_CONCURRENCY': '2'}) == 4
@@ -1,18 +1,42 @@
+import time
+from unittest.mock import patch
+
 import pytest
 
+import security.auth as auth
 import security.security as sec
 
 
 def test_check_login_good():
     assert sec.check_login(sec.GOOD_USER_ID,
-                           login_key='any key will do for now')
+                           login_key=auth.issue_token(sec.GOOD_USER_ID))
+
+
+def test_check_login_wrong_user():
+    assert not sec.check_login(sec.GOOD_USER_ID,
+                               login_key=auth.issue_token('other@nyu.edu'))
 
 
 def test_check_login_bad():
     assert not sec.check_login(sec.GOOD_USER_ID)
 
 
-def test_read():
+@pytest.fixture(autouse=True)
+def fresh_db_recs():
+    """
+    Start each test with TEST_RECS loaded, as a fresh DB gives, so
+    none of them needs a live DB.
+    """
+    sec.load(sec.TEST_RECS, 0)
+    sec.last_version_check = time.monotonic()
+    yield
+    sec.load(sec.TEST_RECS, 0)
+
+
+@patch('security.security.permission_index', None)
+@patch('security.security.read_from_db', autospec=True,
+       return_value=({}, 0))
+def test_read(mock_read_from_db):
     recs = sec.read()
     assert isinstance(recs, dict)
     for feature in recs:
@@ -37,11 +61,178 @@ def test_is_permitted_bad_user():
     assert not sec.is_permitted(sec.PEOPLE, sec.CREATE, 'non-existent user')
 
 
-def test_is_permitted_bad_check():
+def test_compile_recs_bad_check():
     with pytest.raises(ValueError):
-        sec.is_permitted(sec.BAD_FEATURE, sec.CREATE, sec.GOOD_USER_ID)
+        sec.compile_recs(sec.BAD_RECS)
+
+
+def test_compile_recs():
+    index = sec.compile_recs(sec.TEST_RECS)
+    prot = index[(sec.PEOPLE, sec.CREATE)]
+    assert isinstance(prot.users, frozenset)
+    assert sec.GOOD_USER_ID in prot.users
+    assert prot.checks == (sec.check_login,)
+
+
+def test_compile_recs_is_read_only():
+    index = sec.compile_recs(sec.TEST_RECS)
+    with pytest.raises(TypeError):
+        index[(sec.PEOPLE, sec.READ)] = None
+
+
+def test_compile_recs_skips_disabled_checks():
+    recs = {sec.PEOPLE: {sec.READ: {sec.CHECKS: {sec.LOGIN: False}}}}
+    prot = sec.compile_recs(recs)[(sec.PEOPLE, sec.READ)]
+    assert prot.users is None
+    assert prot.checks == ()
+
+
+def test_is_permitted_bad_feature_not_loaded():
+    assert sec.is_permitted(sec.BAD_FEATURE, sec.CREATE, sec.GOOD_USER_ID)
 
 
 def test_is_permitted_all_good():
     assert sec.is_permitted(sec.PEOPLE, sec.CREATE, sec.GOOD_USER_ID,
-                            login_key='any key for now')
\ No newline at end of file
+                            login_key=auth.issue_token(sec.GOOD_USER_ID))
+
+
+DB_RECS = {
+    sec.PEOPLE: {
+        sec.UPDATE: {
+            sec.USER_LIST: ['db_user@nyu.edu'],
+        },
+    },
+}
+
+
+@pytest.fixture
+def db_recs():
+    with patch('security.security.read_from_db', autospec=True,
+               return_value=(DB_RECS, 1)):
+        sec.read()
+        yield
+    sec.load(sec.TEST_RECS)
+
+
+def test_read_from_db(db_recs):
+    assert sec.recs_version == 1
+    assert sec.is_permitted(sec.PEOPLE, sec.UPDATE, 'db_user@nyu.edu')
+    assert not sec.is_permitted(sec.PEOPLE, sec.UPDATE, sec.GOOD_USER_ID)
+
+
+@patch('security.security.permission_index', None)
+@patch('security.security.read_from_db', autospec=True,
+       return_value=({}, 0))
+def test_read_empty_db_uses_defaults(mock_read_from_db):
+    recs = sec.read()
+    assert recs == sec.TEST_RECS
+
+
+def test_read_empty_db_keeps_loaded(db_recs):
+    with patch('security.security.read_from_db',
+               return_value=({}, 0)):
+        assert sec.read() == DB_RECS
+
+
+@patch('security.security.permission_index', None)
+@patch('security.security.read_from_db', autospec=True,
+       side_effect=Exception('DB down'))
+def test_read_db_error_nothing_loaded(mock_read_from_db):
+    # no records to fall back on: fail, don't let everyone through
+    with pytest.raises(Exception):
+        sec.read()
+
+
+def test_read_db_error_keeps_loaded(db_recs):
+    with patch('security.security.read_from_db',
+               side_effect=Exception('DB down')):
+        assert sec.read() == DB_RECS
+    assert sec.recs_version == 1
+    assert not sec.is_permitted(sec.PEOPLE, sec.UPDATE, sec.GOOD_USER_ID)
+
+
+def test_refresh_read_error_keeps_loaded(db_recs):
+    # the version check works, then the full read fails:
+    with patch('security.security.read_version', autospec=True,
+               return_value=2), \
+            patch('security.security.read_from_db',
+                  side_effect=Exception('DB down')), \
+            patch('security.security.MAX_STALE_SECS', -1):
+        assert sec.is_permitted(sec.PEOPLE, sec.UPDATE, 'db_user@nyu.edu')
+    assert sec.recs_version == 1
+
+
+@patch('security.security.dbc', autospec=True)
+def test_read_from_db_is_bounded(mock_dbc):
+    mock_dbc.read.return_value = [
+        {sec.FEATURE_NAME: sec.VERSION_DOC, sec.VERSION: 3},
+        {sec.FEATURE_NAME: sec.PEOPLE, sec.PROTECTION: {}}]
+    with patch('security.security.pm.timeout') as mock_timeout:
+        assert sec.read_from_db() == ({sec.PEOPLE: {}}, 3)
+    mock_timeout.assert_called_once_with(sec.VERSION_CHECK_SECS)
+
+
+def test_no_reload_within_stale_window(db_recs):
+    with patch('security.security.read_version', autospec=True,
+               return_value=2) as mock_read_version:
+        sec.is_permitted(sec.PEOPLE, sec.UPDATE, 'db_user@nyu.edu')
+    mock_read_version.assert_not_called()
+
+
+def test_reload_when_version_changes(db_recs):
+    new_recs = {sec.PEOPLE: {sec.UPDATE: {sec.USER_LIST: ['new@nyu.edu']}}}
+    with patch('security.security.read_version', autospec=True,
+               return_value=2), \
+            patch('security.security.read_from_db',
+                  return_value=(new_recs, 2)), \
+            patch('security.security.MAX_STALE_SECS', -1):
+        assert sec.is_permitted(sec.PEOPLE, sec.UPDATE, 'new@nyu.edu')
+    assert sec.recs_version == 2
+
+
+def test_same_version_not_reloaded(db_recs):
+    with patch('security.security.read_version', autospec=True,
+               return_value=1), \
+            patch('security.security.read_from_db') as mock_read_from_db, \
+            patch('security.security.MAX_STALE_SECS', -1):
+        sec.is_permitted(sec.PEOPLE, sec.UPDATE, 'db_user@nyu.edu')
+    mock_read_from_db.assert_not_called()
+
+
+@patch('security.security.dbc', autospec=True)
+def test_read_version_is_bounded(mock_dbc):
+    mock_dbc.fetch_one.return_value = {sec.VERSION: 3}
+    with patch('security.security.pm.timeout') as mock_timeout:
+        assert sec.read_version() == 3
+    mock_timeout.assert_called_once_with(sec.VERSION_CHECK_SECS)
+
+
+def test_version_check_error_keeps_recs(db_recs):
+    with patch('security.security.read_version', autospec=True,
+               side_effect=Exception('DB down')), \
+            patch('security.security.read_from_db') as mock_read_from_db, \
+            patch('security.security.MAX_STALE_SECS', -1):
+        assert sec.is_permitted(sec.PEOPLE, sec.UPDATE, 'db_user@nyu.edu')
+    mock_read_from_db.assert_not_called()
+    assert sec.recs_version == 1
+
+
+def test_write_rejects_bad_recs():
+    with patch('security.security.dbc', autospec=True) as mock_dbc:
+        with pytest.raises(ValueError):
+            sec.write(sec.BAD_RECS)
+    mock_dbc.update.assert_not_called()
+
+
+def test_write_bumps_version():
+    with patch('security.security.dbc', autospec=True) as mock_dbc, \
+            patch('security.security.read_from_db', autospec=True,
+                  return_value=(DB_RECS, 4)):
+        # another writer got in between: the DB says 6, not 4 + 1
+        mock_dbc.find_one_and_update.return_value = {sec.VERSION: 6}
+        version = sec.write(sec.TEST_RECS)
+        sec_version = sec.recs_version
+    sec.load(sec.TEST_RECS)
+    assert version == 6
+    assert sec_version == 6
+    mock_dbc.find_one_and_update.assert_called_once()
@@ -0,0 +1,259 @@
+"""
+The ASGI entry point: run the API with an async server, e.g.
+
+    uvicorn server.asgi:app --workers 2
+
+The busiest read paths and receive_action are served here by async
+handlers over data.db_connect_async, so one process can keep
+hundreds of requests waiting on the DB at once.
+Everything else falls through to the Flask app in server.endpoints,
+run in a thread pool.
+The native routes get what the Flask app gives every request: a
+request id, the rate limiter, metrics and CORS headers (preflight
+OPTIONS requests go to Flask, which answers them).
+"""
+import asyncio
+import json
+import re
+import time
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from bson import ObjectId
+from bson.errors import InvalidId
+import werkzeug.exceptions as wz
+
+import data.db_connect_async as adbc
+import data.log as log
+import data.manuscripts as manu
+import data.people as ppl
+import server.endpoints as ep
+import server.metrics as metrics
+import server.rate_limit as rate_limit
+
+MANU_COLLECT = 'manuscripts'
+JSON_HEADERS = [(b'content-type', b'application/json')]
+# what flask-cors sends with its defaults:
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def header(scope: dict, name: bytes):
+    """
+    Return the value of header name (lower case), or None.
+    """
+    for key, value in scope.get('headers', []):
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+def query_arg(scope: dict, name: str):
+    args = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    values = args.get(name)
+    return values[0] if values else None
+
+
+async def read_json(receive) -> dict:
+    body = b''
+    more = True
+    while more:
+        message = await receive()
+        body += message.get('body', b'')
+        more = message.get('more_body', False)
+    try:
+        return json.loads(body or b'{}')
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'Body is not valid JSON')
+
+
+def object_id(manu_id: str) -> ObjectId:
+    try:
+        return ObjectId(manu_id)
+    except (InvalidId, TypeError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f'Bad id: {manu_id}')
+
+
+async def list_manuscripts(scope, receive):
+    manuscripts = await adbc.read(MANU_COLLECT, no_id=False)
+    for manuscript in manuscripts:
+        manuscript['manu_id'] = manuscript[adbc.MONGO_ID]
+    return manuscripts
+
+
+async def get_manuscript(scope, receive, manu_id):
+    manuscript = await adbc.fetch_one(MANU_COLLECT,
+                                      {adbc.MONGO_ID: object_id(manu_id)})
+    if not manuscript:
+        raise HTTPError(HTTPStatus.NOT_FOUND, ep.MSG_NOT_FOUND)
+    return manuscript
+
+
+async def get_person(scope, receive, email):
+    person = await adbc.read_one(ppl.PEOPLE_COLLECT, {ppl.EMAIL: email})
+    if not person:
+        raise HTTPError(HTTPStatus.NOT_FOUND, f'No such record: {email}')
+    return person
+
+
+async def masthead(scope, receive):
+    people = await adbc.read_dict(ppl.PEOPLE_COLLECT, ppl.EMAIL)
+    return {ep.MASTHEAD: ppl.build_masthead(people)}
+
+
+async def receive_action(scope, receive):
+    """
+    The async twin of endpoints.ReceiveAction.put().
+    """
+    data = await read_json(receive)
+    manu_id = data.get(manu.MANU_ID)
+    curr_state = data.get(manu.CURR_STATE)
+    action = data.get(manu.ACTION)
+    referee = data.get(manu.REFEREE)
+    user_id = query_arg(scope, 'user_id')
+    try:
+        user = await adbc.read_one(ppl.PEOPLE_COLLECT, {ppl.EMAIL: user_id})
+        if not user:
+            raise ValueError(f'No user found with email: {user_id}')
+        manu_filt = {adbc.MONGO_ID: ObjectId(manu_id)}
+        manuscript = await adbc.fetch_one(MANU_COLLECT, manu_filt)
+        if not manuscript:
+            raise ValueError(ep.MSG_NOT_FOUND)
+        # this may load the journal's workflow, or audit a refusal,
+        # with the sync driver:
+        ret, update_fields = await asyncio.to_thread(
+            ep.plan_action, user_id, user, manuscript, manu_id,
+            curr_state, action, referee)
+        res = await adbc.update(MANU_COLLECT,
+                                ep.action_filter(manu_id, manuscript),
+                                update_fields)
+        if res.matched_count != 1:
+            raise HTTPError(HTTPStatus.CONFLICT, ep.MSG_CHANGED)
+        # this writes workloads with the sync driver:
+        await asyncio.to_thread(ep.action_taken, user_id, manuscript,
+                                manu_id, curr_state, action, update_fields)
+    except wz.Forbidden as err:
+        raise HTTPError(HTTPStatus.FORBIDDEN, err.description)
+    except HTTPError:
+        raise
+    except Exception as err:
+        raise HTTPError(HTTPStatus.NOT_ACCEPTABLE, f'Bad action: {err=}')
+    return {ep.MESSAGE: 'Action received!', ep.RETURN: ret}
+
+
+# (method, path pattern, handler); the first match wins.
+ROUTES = [
+    ('GET', re.compile(r'/manuscripts/?'), list_manuscripts),
+    ('GET', re.compile(r'/manuscripts/(?P<manu_id>[0-9a-fA-F]{24})'),
+     get_manuscript),
+    ('PUT', re.compile(r'/manuscripts/receive_action'), receive_action),
+    ('GET', re.compile(r'/people/masthead'), masthead),
+    ('GET', re.compile(r'/people/(?P<email>[^/]+@[^/]+)'), get_person),
+]
+
+
+def find_route(method: str, path: str):
+    """
+    Return (handler, path params, route pattern) for an async route,
+    or (None, None, None).
+    """
+    for route_method, pattern, handler in ROUTES:
+        if method != route_method:
+            continue
+        match = pattern.fullmatch(path)
+        if match:
+            return handler, match.groupdict(), pattern.pattern
+    return None, None, None
+
+
+def match_route(method: str, path: str):
+    """
+    Return (handler, path params) for an async route, or (None, None).
+    """
+    return find_route(method, path)[:2]
+
+
+async def send_json(send, status: HTTPStatus, body, headers=()):
+    payload = json.dumps(body, default=str).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': int(status),
+                'headers': JSON_HEADERS + list(headers)
+                + [(b'content-length', str(len(payload)).encode())]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+def limit_wait(scope: dict):
+    """
+    Charge the request to its caller's bucket, as the Flask app's
+    rate_limit.check_limit() does. Returns None, or seconds to wait.
+    """
+    client = scope.get('client')
+    addr = rate_limit.client_addr(header(scope, b'x-forwarded-for'),
+                                  client[0] if client else None)
+    caller = rate_limit.caller_key(header(scope, b'authorization'), addr)
+    return rate_limit.retry_after(scope['method'], scope['path'], caller)
+
+
+async def serve(scope, receive, send, handler, params: dict, route: str):
+    """
+    Run an async route inside what the Flask app wraps every request
+    in: a request id, the rate limiter, metrics and CORS headers.
+    """
+    method = scope['method']
+    req_id = log.clean_request_id(header(scope, b'x-request-id'))
+    req_id_token = log.request_id.set(req_id)
+    headers = [(log.REQUEST_ID_HEADER.lower().encode(), req_id.encode())]
+    if header(scope, b'origin'):
+        headers += CORS_HEADERS
+    start = time.perf_counter()
+    metrics.IN_FLIGHT.inc()
+    try:
+        # the limiter and token checks may read the DB:
+        wait = await asyncio.to_thread(limit_wait, scope)
+        if wait is not None:
+            status = HTTPStatus.TOO_MANY_REQUESTS
+            body = {ep.MESSAGE: rate_limit.MSG_TOO_MANY}
+            headers.append((b'retry-after', str(wait).encode()))
+        else:
+            try:
+                body = await handler(scope, receive, **params)
+                status = HTTPStatus.OK
+            except HTTPError as err:
+                status, body = err.status, {ep.MESSAGE: err.message}
+        metrics.REQUEST_SECS.observe(route, method,
+                                     value=time.perf_counter() - start)
+        metrics.REQUESTS.inc(route, method, str(int(status)))
+        await send_json(send, status, body, headers)
+    finally:
+        metrics.IN_FLIGHT.dec()
+        log.request_id.reset(req_id_token)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            adbc.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+flask_app = WsgiToAsgi(ep.app)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http':
+        handler, params, route = find_route(scope['method'], scope['path'])
+        if handler is not None:
+            return await serve(scope, receive, send, handler, params, route)
+    return await flask_app(scope, receive, send)
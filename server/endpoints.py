@@ -2,26 +2,66 @@
 This is the file containing all the endpoints for our flask app.
 The endpoint called `endpoints` will return all available endpoints.
 """
+import base64
 from http import HTTPStatus
+from itertools import chain
 
-from flask import Flask, request
+from flask import Flask, Response, g, request, stream_with_context
 from flask_restx import Resource, Api, fields
 from flask_cors import CORS
 from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
 import werkzeug.exceptions as wz
-from werkzeug.security import generate_password_hash
 
+import data.audit as audit
+import data.blobs as blobs
+import data.export as exp
+import data.importer as imp
+import data.log as log
 import data.roles as rls
 import data.people as ppl
 import data.manuscripts as manu
-from data.db_connect import create, read, delete, update, fetch_one
-
-import subprocess  # Need for developer endpoint
+import data.manuscripts.fields as flds
+import data.manuscripts.listing as listing
+import data.render as rnd
+import data.revisions as revs
+import data.single_flight as sf
+import data.workload as wl
+from data.db_connect import (create, read, delete, update, fetch_one,
+                             find_one_and_update)
+import server.log_tail as log_tail
+import server.metrics as metrics
+import server.rate_limit as rate_limit
+import security.auth as auth
+import security.passwords as pwd
 import security.security as sec
 
-app = Flask(__name__)
-CORS(app)
-api = Api(app)
+logger = log.get_logger(__name__)
+
+# Resources register on api here; create_app() binds it to an app.
+api = Api()
+
+
+def set_request_id():
+    req_id = log.clean_request_id(request.headers.get(log.REQUEST_ID_HEADER))
+    g.request_id_token = log.request_id.set(req_id)
+
+
+def add_request_id(response):
+    response.headers[log.REQUEST_ID_HEADER] = log.request_id.get()
+    return response
+
+
+def reset_request_id(exc):
+    """
+    Untag the thread once the request is done, so what it logs next
+    (outside any request) doesn't carry this request's id.
+    """
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        log.request_id.reset(token)
+
 
 person_model = api.model('Person', {
     'name': fields.String(required=True, description='The person\'s name',
@@ -61,13 +101,61 @@ PEOPLE_EP = '/people'
 MANU_EP = '/manuscripts'
 TEXT_EP = '/text'
 ROLES_EP = '/roles'
+LOGIN_EP = '/login'
+LOGOUT_EP = '/logout'
+
+FORMAT = 'format'
+HTML_FORMAT = 'html'
 
 MESSAGE = 'Message'
 RETURN = 'return'
 MSG_INTERNAL_ERROR = 'Internal server error'
 MSG_NOT_FOUND = 'Not found'
+MSG_CHANGED = 'The manuscript changed meanwhile: reload it and retry'
 MSG_DELETED = 'Deleted successfully'
 MSG_CREATED = 'Created successfully'
+TOKEN = 'token'
+
+AUTH_HEADER = 'Authorization'
+AUTH_SCHEME = 'Bearer '
+
+
+def get_login_key():
+    """
+    The session token comes in an `Authorization: Bearer <token>`
+    header, or else as a login_key query arg.
+    """
+    auth_header = request.headers.get(AUTH_HEADER, '')
+    if auth_header.startswith(AUTH_SCHEME):
+        return auth_header[len(AUTH_SCHEME):]
+    return request.args.get(sec.LOGIN_KEY)
+
+
+def check_editor(user_id: str,
+                 message: str = "Only editors can create new people"):
+    """
+    Raise Forbidden, with message, unless user_id belongs to an editor.
+    """
+    if not user_id:
+        raise wz.Forbidden("Missing user ID")
+    user = ppl.read_one(user_id)
+    if not user:
+        raise wz.Forbidden("Invalid user ID")
+    if rls.ED_CODE not in user.get('roles', []):
+        raise wz.Forbidden(message)
+
+
+def check_logged_in_editor(message: str) -> str:
+    """
+    Return who the request's session token was issued to, raising
+    Unauthorized without a valid one, and Forbidden, with message,
+    unless they are an editor.
+    """
+    user_id = auth.validate_token(get_login_key())
+    if not user_id:
+        raise wz.Unauthorized('Not logged in')
+    check_editor(user_id, message)
+    return user_id
 
 
 @api.route(TITLE_EP)
@@ -104,7 +192,7 @@ class People(Resource):
                 return {}, HTTPStatus.OK  # Return empty instead of error
             return people, HTTPStatus.OK
         except Exception as e:
-            print(f"Error in get(): {e}")
+            logger.exception('Error in get(): %s', e)
             return ({MESSAGE: MSG_INTERNAL_ERROR},
                     HTTPStatus.INTERNAL_SERVER_ERROR)
 
@@ -118,17 +206,7 @@ class People(Resource):
         This method creates a new person.
         """
         try:
-            # Extract user ID from query string
-            user_id = request.args.get("user_id")
-            if not user_id:
-                raise wz.Forbidden("Missing user ID")
-
-            user = ppl.read_one(user_id)
-            if not user:
-                raise wz.Forbidden("Invalid user ID")
-
-            if 'ED' not in user.get('roles', []):
-                raise wz.Forbidden("Only editors can create new people")
+            check_editor(request.args.get("user_id"))
 
             form_data = request.json
             name = form_data.get('name')
@@ -136,12 +214,7 @@ class People(Resource):
             email = form_data.get('email')
             roles = form_data.get('roles')
             password = form_data.get('password')
-            if password:
-                password_hash = generate_password_hash(
-                    password, method='pbkdf2:sha256'
-                )
-            else:
-                password_hash = None
+            password_hash = pwd.hash_password(password) if password else None
             ret = ppl.create_person(name, affiliation, email,
                                     roles, password_hash)
             return ({MESSAGE:
@@ -149,6 +222,8 @@ class People(Resource):
                     HTTPStatus.CREATED)
         except ValueError as e:
             api.abort(HTTPStatus.BAD_REQUEST, message=str(e))
+        except TimeoutError as e:
+            raise wz.ServiceUnavailable(str(e))
 
     @api.doc('update_person')
     @api.expect(multi_role_person_model)
@@ -190,6 +265,97 @@ class People(Resource):
             raise wz.BadRequest(str(e))
 
 
+@api.route(f'{PEOPLE_EP}/bulk')
+class BulkPeople(Resource):
+    @api.doc('create_people')
+    @api.expect([multi_role_person_model])
+    @api.response(HTTPStatus.CREATED, MSG_CREATED)
+    @api.response(HTTPStatus.BAD_REQUEST, 'Expected a list of people')
+    @api.response(HTTPStatus.SERVICE_UNAVAILABLE, 'Password hashing busy')
+    def post(self):
+        """
+        Create many people at once.
+        Their passwords are hashed in parallel across cores, once the
+        people are known to be valid.
+        People that can't be created are reported in Errors by email.
+        """
+        check_editor(request.args.get("user_id"))
+        people = request.json
+        if not isinstance(people, list):
+            raise wz.BadRequest('Expected a list of people')
+        created = []
+        errors = {}
+        valid = []
+        for person in people:
+            email = person.get('email')
+            try:
+                ppl.is_valid_person(person.get('name'),
+                                    person.get('affiliation'), email,
+                                    roles=person.get('roles'))
+                valid.append(person)
+            except (ValueError, TypeError) as e:
+                errors[str(email)] = str(e)
+        try:
+            # as in People.post, a blank password gets no hash
+            hashes = pwd.hash_many([person.get('password') or None
+                                    for person in valid])
+        except TimeoutError as e:
+            raise wz.ServiceUnavailable(str(e))
+        for person, password_hash in zip(valid, hashes):
+            email = person.get('email')
+            try:
+                created.append(ppl.create_person(person.get('name'),
+                                                 person.get('affiliation'),
+                                                 email,
+                                                 person.get('roles'),
+                                                 password_hash))
+            except (ValueError, TypeError) as e:
+                errors[str(email)] = str(e)
+        return ({MESSAGE: MSG_CREATED, 'Created': created, 'Errors': errors},
+                HTTPStatus.CREATED)
+
+
+login_model = api.model('Login', {
+    'email': fields.String(required=True, description='Login email'),
+    'password': fields.String(required=True, description='Password'),
+})
+
+
+@api.route(LOGIN_EP)
+class Login(Resource):
+    @api.expect(login_model)
+    @api.response(HTTPStatus.OK, 'Logged in')
+    @api.response(HTTPStatus.UNAUTHORIZED, 'Bad email or password')
+    @api.response(HTTPStatus.SERVICE_UNAVAILABLE, 'Password hashing busy')
+    def post(self):
+        """
+        Check a password and return a session token to use as
+        the `Authorization: Bearer` header on later requests.
+        """
+        form_data = request.json or {}
+        try:
+            token = auth.login(form_data.get('email'),
+                               form_data.get('password'))
+        except TimeoutError as e:
+            raise wz.ServiceUnavailable(str(e))
+        if token is None:
+            raise wz.Unauthorized('Bad email or password')
+        return {TOKEN: token}, HTTPStatus.OK
+
+
+@api.route(LOGOUT_EP)
+class Logout(Resource):
+    @api.response(HTTPStatus.OK, 'Logged out')
+    @api.response(HTTPStatus.UNAUTHORIZED, 'Not logged in')
+    def post(self):
+        """
+        Revoke the session token the request was made with.
+        """
+        if not auth.revoke_token(get_login_key()):
+            raise wz.Unauthorized('Not logged in')
+        return {MESSAGE: 'Logged out'}, HTTPStatus.OK
+
+
 @api.route(f'{PEOPLE_EP}/delete/<string:email>/<string:user_id>')
 class DeletePerson(Resource):
     """
@@ -198,12 +364,24 @@ class DeletePerson(Resource):
     @api.response(HTTPStatus.OK, 'Success.')
     @api.response(HTTPStatus.NOT_FOUND, MSG_NOT_FOUND)
     @api.response(HTTPStatus.FORBIDDEN, 'Not authorized.')
+    @api.response(HTTPStatus.SERVICE_UNAVAILABLE,
+                  'Security records unavailable')
     def delete(self, email, user_id):
         """
         Delete a person from email and user id
         """
-        kwargs = {sec.LOGIN_KEY: 'any-login-key-for-now'}
-        if not sec.is_permitted(sec.PEOPLE, sec.DELETE, user_id, **kwargs):
+        kwargs = {sec.LOGIN_KEY: get_login_key()}
+        try:
+            permitted = sec.is_permitted(sec.PEOPLE, sec.DELETE, user_id,
+                                         **kwargs)
+        except Exception as e:
+            # no records to check against: refuse
+            logger.exception('Could not check permissions: %s', e)
+            raise wz.ServiceUnavailable('Could not check permissions')
+        audit.log_event(user_id, sec.PEOPLE, sec.DELETE,
+                        audit.PERMITTED if permitted else audit.DENIED,
+                        target=email)
+        if not permitted:
             raise wz.Forbidden(
                 'You do not have permission to delete this person.')
 
@@ -230,6 +408,50 @@ class GetPerson(Resource):
             raise wz.NotFound(f'No such record: {email}')
 
 
+@api.route(f'{PEOPLE_EP}/<string:email>/assignments')
+class Assignments(Resource):
+    @api.doc(params={'after': 'The Next of the page before',
+                     'limit': f'How many to list (default '
+                              f'{listing.PAGE_SIZE})'})
+    def get(self, email):
+        """
+        List the manuscripts a referee is assigned, newest first, with
+        the actions they can take on each.
+        """
+        person = ppl.read_one(email)
+        if not person:
+            raise wz.NotFound(f'No such record: {email}')
+        try:
+            return listing.for_referee(
+                email, person.get(ppl.ROLES, []),
+                after=request.args.get('after'),
+                limit=request.args.get('limit', listing.PAGE_SIZE, type=int))
+        except ValueError as e:
+            raise wz.BadRequest(str(e))
+
+
+@api.route(f'{PEOPLE_EP}/<string:email>/manuscripts')
+class AuthorManuscripts(Resource):
+    @api.doc(params={'after': 'The Next of the page before',
+                     'limit': f'How many to list (default '
+                              f'{listing.PAGE_SIZE})'})
+    def get(self, email):
+        """
+        List the manuscripts an author has submitted, newest first,
+        with how many they have in each state.
+        """
+        person = ppl.read_one(email)
+        if not person:
+            raise wz.NotFound(f'No such record: {email}')
+        try:
+            return listing.for_author(
+                email, person.get(ppl.ROLES, []),
+                after=request.args.get('after'),
+                limit=request.args.get('limit', listing.PAGE_SIZE, type=int))
+        except ValueError as e:
+            raise wz.BadRequest(str(e))
+
+
 MASTHEAD = 'Masthead'
 
 
@@ -320,11 +542,100 @@ MANU_ACTION_FLDS = api.model('ManuscriptAction', {
 })
 
 
+# the feature name manuscript actions are audited under:
+MANU_FEATURE = 'manuscripts'
+
+
+def record_loads(*args):
+    """
+    Pass a manuscript's change of referees or state on to their
+    workloads. The change has been made by now: if this fails, log
+    it rather than fail the request (workload.rebuild() catches up).
+    """
+    try:
+        wl.record(*args)
+    except Exception as e:
+        logger.exception('Could not update referee workloads: %s', e)
+
+
+def record_new_loads(manus: list):
+    """
+    Add imported manuscripts to their referees' workloads, as
+    record_loads() does a change.
+    """
+    try:
+        wl.record_new(manus)
+    except Exception as e:
+        logger.exception('Could not update referee workloads: %s', e)
+
+
+def plan_action(user_id: str, user: dict, manuscript: dict, manu_id: str,
+                curr_state: str, action: str, referee=None) -> tuple:
+    """
+    Check that user may take action on manuscript now, and work out
+    what it does, leaving manuscript as it was. ReceiveAction and its
+    async twin in server.asgi both go through here.
+    Returns (what handle_action returned, the fields to update).
+    Raises wz.Forbidden, and audits it, if they may not.
+    """
+    workflow = manu.workflow_for(manuscript)
+    available_actions = manu.get_available_actions(manuscript, workflow)
+    role_actions = manu.filter_actions_by_roles(
+        available_actions, user.get("roles", []), workflow
+    )
+    if action not in role_actions:
+        audit.log_event(user_id, MANU_FEATURE, action, audit.DENIED,
+                        manu_id=manu_id, from_state=curr_state)
+        raise wz.Forbidden("You are not authorized to perform this action")
+    # handle_action's effects change the referees in place:
+    changed = {**manuscript,
+               "referees": list(manuscript.get("referees", []))}
+    ret = manu.handle_action(
+        manu_id, curr_state, action, workflow=workflow, manu=changed,
+        referee=referee
+    )
+    update_fields = {
+        "state": ret.get("new_state"),
+        "history": manuscript.get("history", []) + [curr_state],
+        "referees": changed["referees"],
+    }
+    return ret, update_fields
+
+
+def action_filter(manu_id: str, manuscript: dict) -> dict:
+    """
+    Match manuscript only while it is as plan_action() read it, so an
+    action saved meanwhile makes our update match nothing rather than
+    be overwritten, and the workload deltas stay right.
+    """
+    filt = {"_id": ObjectId(manu_id)}
+    for field in ("state", "referees", "history"):
+        filt[field] = (manuscript[field] if field in manuscript
+                       else {"$exists": False})
+    return filt
+
+
+def action_taken(user_id: str, manuscript: dict, manu_id: str,
+                 curr_state: str, action: str, update_fields: dict):
+    """
+    Audit an action plan_action() worked out, once it has been saved,
+    and pass the change on to the referees' workloads.
+    """
+    new_state = update_fields["state"]
+    audit.log_event(user_id, MANU_FEATURE, action, audit.PERMITTED,
+                    manu_id=manu_id, from_state=curr_state,
+                    to_state=new_state)
+    record_loads(manuscript.get("referees", []), manuscript.get("state"),
+                 update_fields["referees"], new_state,
+                 manuscript.get("abstract"))
+
+
 @api.route(f'{MANU_EP}/receive_action')
 class ReceiveAction(Resource):
     @api.response(HTTPStatus.OK, 'Success')
     @api.response(HTTPStatus.NOT_ACCEPTABLE, 'Not acceptable')
     @api.response(HTTPStatus.FORBIDDEN, 'Not authorized')
+    @api.response(HTTPStatus.CONFLICT, 'Manuscript changed meanwhile')
     @api.expect(MANU_ACTION_FLDS)
     def put(self):
         """
@@ -343,36 +654,23 @@ class ReceiveAction(Resource):
             if not user:
                 raise wz.NotFound(f"No user found with email: {user_id}")
 
-            role_codes = user.get("roles", [])
             manuscript = fetch_one("manuscripts", {"_id": ObjectId(manu_id)})
             if not manuscript:
                 raise ValueError(MSG_NOT_FOUND)
 
-            # Check if user is authorized to perform this action
-            available_actions = manu.get_available_actions(manuscript)
-            role_actions = manu.filter_actions_by_roles(
-                available_actions, role_codes
-            )
-            if action not in role_actions:
-                raise wz.Forbidden(
-                    "You are not authorized to perform this action"
-                )
-            history = manuscript.get("history", [])
-            ret = manu.handle_action(
-                manu_id, curr_state, action, manu=manuscript, referee=referee
-            )
-            new_state = ret.get("new_state")
-            history.append(curr_state)
-            update_fields = {
-                "state": new_state,
-                "history": history,
-                "referees": manuscript.get("referees", [])
-            }
+            ret, update_fields = plan_action(user_id, user, manuscript,
+                                             manu_id, curr_state, action,
+                                             referee)
             update_res = update(
-                "manuscripts", {"_id": ObjectId(manu_id)}, update_fields
+                "manuscripts", action_filter(manu_id, manuscript),
+                update_fields
             )
+            if update_res.matched_count != 1:
+                raise wz.Conflict(MSG_CHANGED)
+            action_taken(user_id, manuscript, manu_id, curr_state, action,
+                         update_fields)
 
-        except wz.Forbidden as err:
+        except (wz.Forbidden, wz.Conflict) as err:
             raise err
         except Exception as err:
             raise wz.NotAcceptable(f'Bad action: {err=}')
@@ -428,12 +726,16 @@ class Manuscripts(Resource):
                 'author_email': data.get('author_email'),
                 'state': data.get('state', 'SUB'),
                 'abstract': data.get('abstract'),
-                'text': data.get('text'),
+                # the body goes in the blob store, out of the way of
+                # everything that only needs the metadata:
+                flds.TEXT_BLOB: blobs.put_text(data.get('text')),
                 'referees': data.get('referees', []),
                 'history': []
             }
 
             result = create('manuscripts', manuscript)
+            record_loads([], None, manuscript['referees'],
+                         manuscript['state'], manuscript['abstract'])
             return {MESSAGE: MSG_CREATED,
                     'id': str(result.inserted_id)}, HTTPStatus.CREATED
         except Exception:
@@ -443,7 +745,9 @@ class Manuscripts(Resource):
     def get(self):
         """Get all manuscripts"""
         try:
-            manuscripts = read('manuscripts', no_id=False)
+            # a burst of list requests shares one read:
+            manuscripts = sf.do(sf.make_key('manuscripts', None, False),
+                                read, 'manuscripts', no_id=False)
             for manuscript in manuscripts:
                 manuscript['manu_id'] = str(manuscript['_id'])
             return manuscripts, HTTPStatus.OK
@@ -457,14 +761,18 @@ class ManuscriptById(Resource):
     def delete(self, id):
         """Delete a manuscript by MongoDB _id"""
         try:
+            manuscript = fetch_one('manuscripts', {'_id': ObjectId(id)})
             delete_count = delete('manuscripts', {'_id': ObjectId(id)})
             if delete_count > 0:
+                if manuscript:
+                    record_loads(manuscript.get('referees', []),
+                                 manuscript.get('state'), [], None)
                 return {MESSAGE: MSG_DELETED}, HTTPStatus.OK
             else:
                 return ({MESSAGE: MSG_NOT_FOUND},
                         HTTPStatus.NOT_FOUND)
         except Exception as e:
-            print(f"Error in delete(): {e}")
+            logger.exception('Error in delete(): %s', e)
             return ({MESSAGE: MSG_INTERNAL_ERROR},
                     HTTPStatus.INTERNAL_SERVER_ERROR)
 
@@ -478,11 +786,159 @@ class ManuscriptById(Resource):
                 return ({MESSAGE: MSG_NOT_FOUND},
                         HTTPStatus.NOT_FOUND)
         except Exception as e:
-            print(f"Error in get(): {e}")
+            logger.exception('Error in get(): %s', e)
             return ({MESSAGE: 'Invalid ID format or internal server error'},
                     HTTPStatus.BAD_REQUEST)
 
 
+@api.route(f'{MANU_EP}/<string:id>/text')
+class ManuscriptText(Resource):
+    @api.response(HTTPStatus.PARTIAL_CONTENT, 'The requested range')
+    @api.response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, 'Bad range')
+    def get(self, id):
+        """
+        Stream a manuscript's text.
+        Send a Range header (bytes=start-end) to get just part of it.
+        """
+        try:
+            manuscript = fetch_one('manuscripts', {'_id': ObjectId(id)})
+        except InvalidId:
+            return {MESSAGE: f'Bad id: {id}'}, HTTPStatus.BAD_REQUEST
+        if not manuscript:
+            return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
+        number = request.args.get(revs.NUMBER, type=int,
+                                  default=manuscript.get(flds.TEXT_REVISION))
+        if number is not None:
+            revision = revs.get(id, number)
+            if revision is None:
+                return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
+            text = revs.read(revision)
+            response = Response(text, content_type=blobs.TEXT_TYPE)
+            response.set_etag(revision[revs.SHA256])
+            return response.make_conditional(request, accept_ranges=True,
+                                             complete_length=len(text))
+        ref = manuscript.get(flds.TEXT_BLOB)
+        if ref is None:
+            # stored inline, from before the blob store
+            text = (manuscript.get('text') or '').encode('utf-8')
+            response = Response(text, content_type=blobs.TEXT_TYPE)
+            return response.make_conditional(request, accept_ranges=True,
+                                             complete_length=len(text))
+        try:
+            blob = blobs.open_blob(ref)
+        except NoFile:
+            logger.error('Text of manuscript %s is missing: %s', id, ref)
+            return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
+        length = ref[blobs.LENGTH]
+        start, end = 0, length
+        status = HTTPStatus.OK
+        headers = {'Accept-Ranges': 'bytes',
+                   'ETag': f'"{ref[blobs.SHA256]}"'}
+        if request.range is not None:
+            byte_range = request.range.range_for_length(length)
+            if byte_range is None:
+                return Response(
+                    status=HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={'Content-Range': f'bytes */{length}'})
+            start, end = byte_range
+            status = HTTPStatus.PARTIAL_CONTENT
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+        headers['Content-Length'] = str(end - start)
+        return Response(stream_with_context(blobs.iter_range(blob, start,
+                                                             end)),
+                        status=status, content_type=ref[blobs.CONTENT_TYPE],
+                        headers=headers)
+
+
+def _original_text(manuscript: dict) -> bytes:
+    ref = manuscript.get(flds.TEXT_BLOB)
+    if ref is None:
+        return (manuscript.get(flds.TEXT) or '').encode('utf-8')
+    return blobs.open_blob(ref).read()
+
+
+def _set_text_revision(manu_id: str, number: int):
+    find_one_and_update('manuscripts', {'_id': ObjectId(manu_id)},
+                        {'$max': {flds.TEXT_REVISION: number}})
+
+
+REVISION_FLDS = api.model('Revision', {
+    flds.TEXT: fields.String(description='The whole revised text'),
+    revs.CHUNKS: fields.List(fields.String,
+                             description='sha256s of the chunks of the text,'
+                                         ' in order, in place of the text'),
+    revs.DATA: fields.Raw(description='base64 of the chunks we lack, '
+                                      'by sha256'),
+})
+
+
+@api.route(f'{MANU_EP}/<string:id>/revisions')
+class ManuscriptRevisions(Resource):
+    def get(self, id):
+        """
+        List a manuscript's text revisions, oldest first.
+        """
+        return revs.list_for(id), HTTPStatus.OK
+
+    @api.response(HTTPStatus.CREATED, 'Revision added')
+    @api.response(HTTPStatus.CONFLICT, 'Chunks missing: send their data')
+    @api.response(HTTPStatus.NOT_ACCEPTABLE, 'Not awaiting revisions')
+    @api.response(HTTPStatus.FORBIDDEN, 'Not the author')
+    @api.expect(REVISION_FLDS)
+    def post(self, id):
+        """
+        Add a revision of the text, while the author is revising.
+        Send the whole text, or save bandwidth by sending the sha256s
+        of its chunks and the data of only those we lack: if any are
+        missing the reply is a 409 listing them, so send them again
+        with their data. The first revision of a manuscript is its
+        text as submitted.
+        """
+        try:
+            manuscript = fetch_one('manuscripts', {'_id': ObjectId(id)})
+        except InvalidId:
+            return {MESSAGE: f'Bad id: {id}'}, HTTPStatus.BAD_REQUEST
+        if not manuscript:
+            return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
+        if request.args.get('user_id') != manuscript.get(flds.AUTHOR_EMAIL):
+            raise wz.Forbidden('Only the author can revise a manuscript')
+        if manuscript.get(flds.STATE) != manu.AUTHOR_REVISIONS:
+            raise wz.NotAcceptable('This manuscript is not awaiting '
+                                   'revisions')
+        body = request.json or {}
+        # read the whole body before writing anything
+        try:
+            if flds.TEXT in body:
+                text = body[flds.TEXT].encode('utf-8')
+            else:
+                text = None
+                digests = list(body.get(revs.CHUNKS, []))
+                chunks = {digest: base64.b64decode(data, validate=True)
+                          for digest, data in body.get(revs.DATA,
+                                                       {}).items()}
+        except (ValueError, TypeError, AttributeError) as err:
+            raise wz.BadRequest(f'Bad revision: {err}')
+        if manuscript.get(flds.TEXT_REVISION) is None:
+            # Mark the original saved as soon as it is, so a POST that
+            # fails from here on doesn't save it again when retried.
+            original = revs.save(id, _original_text(manuscript))
+            _set_text_revision(id, original[revs.NUMBER])
+        try:
+            if text is not None:
+                revision = revs.save(id, text)
+            else:
+                revs.put_chunks(chunks)
+                revision = revs.add(id, digests)
+        except (ValueError, TypeError, AttributeError) as err:
+            raise wz.BadRequest(f'Bad revision: {err}')
+        except LookupError as err:
+            return ({MESSAGE: 'Send the data of the missing chunks',
+                     'Missing': err.args[0]}, HTTPStatus.CONFLICT)
+        _set_text_revision(id, revision[revs.NUMBER])
+        return ({MESSAGE: MSG_CREATED, revs.NUMBER: revision[revs.NUMBER],
+                 revs.LENGTH: revision[revs.LENGTH]}, HTTPStatus.CREATED)
+
+
 text_model = api.model('Text', {
     'title': fields.String(required=True, description="Text title"),
     'content': fields.String(required=True, description="Content of the text"),
@@ -504,17 +960,19 @@ class ActionsForManuscript(Resource):
                 raise wz.NotFound(f"No user found with email: {email}")
 
             role_codes = user.get("roles", [])
-            available_actions = manu.get_available_actions(manuscript)
+            workflow = manu.workflow_for(manuscript)
+            available_actions = manu.get_available_actions(manuscript,
+                                                           workflow)
 
             # check if current user is author of manuscript
             if ((rls.AUTHOR_CODE in role_codes) and
                     (manuscript.get(manu.AUTHOR_EMAIL) != email)):
-                author_only = manu.ROLE_PERMISSIONS.get(rls.AUTHOR_CODE, set())
+                author_only = workflow.role_actions.get(rls.AUTHOR_CODE, ())
                 available_actions = [action for action in available_actions
                                      if action not in author_only]
 
             role_actions = manu.filter_actions_by_roles(available_actions,
-                                                        role_codes)
+                                                        role_codes, workflow)
             return role_actions, HTTPStatus.OK
         except Exception as e:
             return {MESSAGE: str(e)}, HTTPStatus.BAD_REQUEST
@@ -561,12 +1019,19 @@ class Texts(Resource):
             return {MESSAGE: MSG_CREATED}, HTTPStatus.CREATED
 
     def get(self):
-        """Get all text documents"""
+        """
+        Get all text documents.
+        Pass ?format=html to also get each text rendered as HTML.
+        """
         try:
             texts = read('texts')
+            if request.args.get(FORMAT) == HTML_FORMAT:
+                for text_doc in texts:
+                    text_doc[HTML_FORMAT] = rnd.render(
+                        text_doc.get('content') or '')
             return texts, HTTPStatus.OK
         except Exception as e:
-            print(f"Error in get(): {e}")
+            logger.exception('Error in get(): %s', e)
             return ({MESSAGE: MSG_INTERNAL_ERROR},
                     HTTPStatus.INTERNAL_SERVER_ERROR)
 
@@ -574,19 +1039,25 @@ class Texts(Resource):
 @api.route(f'{TEXT_EP}/<string:title>')
 class TextByTitle(Resource):
     def get(self, title):
-        """Get the content of a text by title"""
+        """
+        Get the content of a text by title.
+        Pass ?format=html to also get the content rendered as HTML.
+        """
         try:
             texts = read('texts')
             text_doc = next((text for text in texts if text['title'] == title),
                             None)
             if text_doc:
-                return {
+                ret = {
                     'title': text_doc['title'], 'content': text_doc['content']
-                }, HTTPStatus.OK
+                }
+                if request.args.get(FORMAT) == HTML_FORMAT:
+                    ret[HTML_FORMAT] = rnd.render(text_doc['content'] or '')
+                return ret, HTTPStatus.OK
             else:
                 return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
         except Exception as e:
-            print(f"Error in get(): {e}")
+            logger.exception('Error in get(): %s', e)
             return ({MESSAGE: MSG_INTERNAL_ERROR},
                     HTTPStatus.INTERNAL_SERVER_ERROR)
 
@@ -601,7 +1072,7 @@ class TextByTitle(Resource):
             else:
                 return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
         except Exception as e:
-            print(f"Error in delete(): {e}")
+            logger.exception('Error in delete(): %s', e)
             return ({MESSAGE: MSG_INTERNAL_ERROR},
                     HTTPStatus.INTERNAL_SERVER_ERROR)
 
@@ -622,7 +1093,7 @@ class TextByTitle(Resource):
             else:
                 return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
         except Exception as e:
-            print(f"Error in put(): {e}")
+            logger.exception('Error in put(): %s', e)
             return ({MESSAGE: MSG_INTERNAL_ERROR},
                     HTTPStatus.INTERNAL_SERVER_ERROR)
 
@@ -644,28 +1115,184 @@ DEV_ERROR_LOG_EP = '/dev/error_logs'
 ELOG_LOC = '/var/log/sejutimannan.pythonanywhere.com.error.log'
 
 
+DEFAULT_LOG_LINES = 50
+LOG_OUTPUT = 'log_output'
+LOG_OFFSET = 'offset'
+
+
 @api.route(DEV_ERROR_LOG_EP)
 class DevLogs(Resource):
+    @api.doc(params={
+        'lines': f'How many lines to show (default {DEFAULT_LOG_LINES})',
+        'since': 'Only show lines after this offset from a previous call',
+        'follow': 'Set to 1 to stream new lines as server-sent events',
+    })
     def get(self):
         """
         Developer endpoint to view the error log from Python Anywhere.
+        Each response includes the offset to pass as ?since= next time.
         """
         try:
-            # show last 50 lines of the error log file
-            result = subprocess.run(f'tail -n 50 {ELOG_LOC}', shell=True,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    text=True)
+            lines = int(request.args.get('lines', DEFAULT_LOG_LINES))
+            since = request.args.get('since')
+            since = int(since) if since is not None else None
+        except ValueError:
+            return ({MESSAGE: 'lines and since must be integers'},
+                    HTTPStatus.BAD_REQUEST)
+        try:
+            if request.args.get('follow') == '1':
+                last_event_id = request.headers.get('Last-Event-ID')
+                if last_event_id and last_event_id.isdigit():
+                    since = int(last_event_id)
+                stream = log_tail.follow(ELOG_LOC, since)
+                return Response(stream_with_context(stream),
+                                mimetype='text/event-stream',
+                                headers={'Cache-Control': 'no-cache'})
+            if since is not None:
+                log_lines, offset = log_tail.read_since(ELOG_LOC, since)
+            else:
+                log_lines, offset = log_tail.tail(ELOG_LOC, lines)
+            return ({LOG_OUTPUT: log_lines, LOG_OFFSET: offset},
+                    HTTPStatus.OK)
+        except OSError as e:
+            return {
+                MESSAGE: 'Failed to read logs',
+                'error': str(e)
+            }, HTTPStatus.INTERNAL_SERVER_ERROR
+        except Exception as e:
+            return ({MESSAGE: f'Error reading logs: {str(e)}'},
+                    HTTPStatus.INTERNAL_SERVER_ERROR)
 
-            if result.returncode != 0:
-                return {
-                    MESSAGE: 'Failed to read logs',
-                    'error': result.stderr.strip()
-                }, HTTPStatus.INTERNAL_SERVER_ERROR
 
-            return ({'log_output': result.stdout.strip().split('\n')},
-                    HTTPStatus.OK)
+EXPORT_EP = '/export'
+
 
+@api.route(f'{EXPORT_EP}/<string:collection>')
+class Export(Resource):
+    @api.doc(params={
+        'fields': 'Comma-separated fields to export (default: all)',
+    })
+    @api.response(HTTPStatus.UNAUTHORIZED, 'Not logged in')
+    @api.response(HTTPStatus.FORBIDDEN, 'Not an editor')
+    def get(self, collection):
+        """
+        Stream a collection as newline-delimited JSON, gzipped if the
+        client accepts gzip. Only editors, logged in, can export.
+        """
+        check_logged_in_editor('Only editors can export')
+        if not exp.is_exportable(collection):
+            return ({MESSAGE: f'Cannot export {collection}'},
+                    HTTPStatus.NOT_FOUND)
+        fields = exp.parse_fields(request.args.get('fields'))
+        compress = request.accept_encodings[exp.GZIP] > 0
+        try:
+            chunks = exp.export(collection, fields, compress)
+            # Fetch the first batch now, so a DB failure is a 500
+            # rather than a truncated 200:
+            chunks = chain([next(chunks, b'')], chunks)
         except Exception as e:
-            return ({MESSAGE: f'Error reading logs: {str(e)}'},
+            logger.exception('Error exporting %s: %s', collection, e)
+            return ({MESSAGE: MSG_INTERNAL_ERROR},
+                    HTTPStatus.INTERNAL_SERVER_ERROR)
+        headers = {
+            'Content-Disposition':
+                f'attachment; filename={collection}.ndjson',
+            'Vary': 'Accept-Encoding',
+        }
+        if compress:
+            headers['Content-Encoding'] = exp.GZIP
+        return Response(stream_with_context(chunks),
+                        mimetype=exp.NDJSON_MIME, headers=headers)
+
+
+IMPORT_EP = '/import'
+
+
+@api.route(f'{IMPORT_EP}/<string:collection>')
+class Import(Resource):
+    @api.doc(params={
+        'format': f'{imp.NDJSON} (default) or {imp.CSV}; a text/csv '
+                  'Content-Type also means CSV',
+        'ordered': 'Set to 1 to stop at the first bad row',
+    })
+    @api.response(HTTPStatus.CREATED, MSG_CREATED)
+    @api.response(HTTPStatus.UNAUTHORIZED, 'Not logged in')
+    @api.response(HTTPStatus.FORBIDDEN, 'Not an editor')
+    @api.response(HTTPStatus.SERVICE_UNAVAILABLE, 'Password hashing busy')
+    def post(self, collection):
+        """
+        Load people or manuscripts from an NDJSON or CSV request body.
+        The body is read and written a batch at a time. Rows that
+        can't be loaded are listed in Errors by row number.
+        Only editors, logged in, can import.
+        """
+        check_logged_in_editor('Only editors can import')
+        if not imp.is_importable(collection):
+            return ({MESSAGE: f'Cannot import into {collection}'},
+                    HTTPStatus.NOT_FOUND)
+        fmt = request.args.get(FORMAT, imp.NDJSON)
+        if request.mimetype in imp.CSV_MIMES:
+            fmt = imp.CSV
+        if fmt not in (imp.NDJSON, imp.CSV):
+            raise wz.BadRequest(f'Unknown format: {fmt}')
+        try:
+            on_insert = (record_new_loads
+                         if collection == wl.MANU_COLLECT else None)
+            report = imp.load(collection, imp.parse(request.stream, fmt),
+                              ordered=request.args.get('ordered') == '1',
+                              hash_passwords=pwd.hash_many,
+                              on_insert=on_insert)
+        except TimeoutError as e:
+            raise wz.ServiceUnavailable(str(e))
+        except Exception as e:
+            logger.exception('Error importing into %s: %s', collection, e)
+            return ({MESSAGE: MSG_INTERNAL_ERROR},
                     HTTPStatus.INTERNAL_SERVER_ERROR)
+        return {MESSAGE: MSG_CREATED, **report}, HTTPStatus.CREATED
+
+
+REFEREES_EP = '/referees'
+
+
+@api.route(f'{REFEREES_EP}/recommend')
+class RecommendReferees(Resource):
+    @api.doc(params={'manu_id': 'The manuscript to find referees for',
+                     'limit': f'How many to list (default '
+                              f'{wl.DEFAULT_LIMIT})'})
+    def get(self):
+        """
+        Suggest referees for a manuscript, best first: those with the
+        fewest active assignments, nudged up by how close what they
+        have refereed is to its abstract.
+        """
+        manu_id = request.args.get('manu_id')
+        limit = request.args.get('limit', wl.DEFAULT_LIMIT, type=int)
+        try:
+            manuscript = fetch_one('manuscripts', {'_id': ObjectId(manu_id)})
+        except (InvalidId, TypeError):
+            return {MESSAGE: f'Bad id: {manu_id}'}, HTTPStatus.BAD_REQUEST
+        if not manuscript:
+            return {MESSAGE: MSG_NOT_FOUND}, HTTPStatus.NOT_FOUND
+        return wl.recommend(manuscript, limit), HTTPStatus.OK
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Build the app, with settings from config on top of Flask's defaults.
+    This does no I/O: the DB is first touched by the first request
+    that needs it.
+    """
+    log.configure()
+    app = Flask(__name__)
+    app.config.update(config or {})
+    CORS(app)
+    app.before_request(set_request_id)
+    app.after_request(add_request_id)
+    app.teardown_request(reset_request_id)
+    metrics.init_app(app)
+    rate_limit.init_app(app)
+    api.init_app(app)
+    return app
+
+
+app = create_app()
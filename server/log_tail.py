@@ -0,0 +1,105 @@
+"""
+This module reads the end of a log file in-process, so viewing the
+logs doesn't mean forking a shell.
+Offsets are byte positions in the file: a client that remembers the
+offset it was given can ask for just the lines written since.
+"""
+import os
+import time
+
+BLOCK_SIZE = 8192
+MAX_LINES = 1000
+# most we return from one incremental read:
+MAX_READ_BYTES = 1024 * 1024
+FOLLOW_POLL_SECS = 1.0
+# a follow stream ends after this long; clients reconnect with Last-Event-ID
+FOLLOW_MAX_SECS = 300
+HEARTBEAT_SECS = 15
+
+
+def _decode(raw: bytes) -> list:
+    return raw.decode('utf-8', errors='replace').splitlines()
+
+
+def tail(path: str, num_lines: int = 50, block_size: int = BLOCK_SIZE):
+    """
+    Return (last num_lines lines of the file, offset of its end).
+    Reads backward from the end a block at a time, so the cost
+    depends on num_lines, not on the size of the file.
+    """
+    num_lines = max(0, min(num_lines, MAX_LINES))
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        if num_lines == 0:
+            return [], end
+        pos = end
+        chunks = []
+        newlines = 0
+        # a trailing newline ends the last line; it doesn't start a new one
+        while pos > 0 and newlines <= num_lines:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            chunk = f.read(read_size)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+        raw = b''.join(reversed(chunks))
+    lines = _decode(raw)
+    return lines[-num_lines:], end
+
+
+def _read_raw_since(path: str, offset: int, max_bytes: int) -> tuple:
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        if offset > end or offset < 0:
+            offset = 0
+        f.seek(offset)
+        raw = f.read(min(max_bytes, end - offset))
+    last_newline = raw.rfind(b'\n')
+    if last_newline >= 0:
+        raw = raw[:last_newline + 1]
+    elif len(raw) < max_bytes:
+        raw = b''
+    # else one line longer than max_bytes: hand it over in pieces
+    return raw, offset
+
+
+def read_since(path: str, offset: int, max_bytes: int = MAX_READ_BYTES):
+    """
+    Return (complete lines written after offset, offset to ask from next).
+    If the file is now shorter than offset it has been rotated or
+    truncated, so we start again from the top.
+    A partly written last line is left for the next call.
+    """
+    raw, offset = _read_raw_since(path, offset, max_bytes)
+    return _decode(raw), offset + len(raw)
+
+
+def _sse_event(offset: int, line: str) -> str:
+    return f'id: {offset}\ndata: {line}\n\n'
+
+
+def follow(path: str, offset: int = None, poll_secs: float = None,
+           max_secs: float = None):
+    """
+    Yield server-sent events for lines as they are written, starting
+    at offset (or the current end of the file).
+    Each event's id is the offset after it, for reconnecting.
+    """
+    poll_secs = FOLLOW_POLL_SECS if poll_secs is None else poll_secs
+    max_secs = FOLLOW_MAX_SECS if max_secs is None else max_secs
+    if offset is None:
+        offset = os.path.getsize(path)
+    start = last_sent = time.monotonic()
+    while time.monotonic() - start < max_secs:
+        raw, offset = _read_raw_since(path, offset, MAX_READ_BYTES)
+        if raw:
+            for raw_line in raw.splitlines(keepends=True):
+                offset += len(raw_line)
+                line = raw_line.decode('utf-8', errors='replace')
+                yield _sse_event(offset, line.rstrip('\r\n'))
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent > HEARTBEAT_SECS:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        time.sleep(poll_secs)
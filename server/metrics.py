@@ -0,0 +1,240 @@
+"""
+This module collects request and DB timings and serves them at
+/metrics in the Prometheus text exposition format.
+Each gunicorn worker keeps its own metrics: a scrape shows the
+worker that answered it.
+"""
+import time
+from threading import Lock
+
+from flask import Response, g, request
+
+import data.db_connect as dbc
+
+METRICS_EP = '/metrics'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UNMATCHED_ROUTE = 'unmatched'
+
+registry_lock = Lock()
+registry = []
+
+
+def _escape(value) -> str:
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+
+def _fmt_num(num) -> str:
+    if num == float('inf'):
+        return '+Inf'
+    if isinstance(num, float) and num.is_integer():
+        return str(int(num))
+    return str(num)
+
+
+class Metric:
+    """
+    A named family of values, one per combination of label values.
+    """
+    kind = None
+
+    def __init__(self, name: str, descr: str, labels: tuple = ()):
+        self.name = name
+        self.descr = descr
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = Lock()
+        with registry_lock:
+            registry.append(self)
+
+    def _header(self) -> list:
+        return [f'# HELP {self.name} {self.descr}',
+                f'# TYPE {self.name} {self.kind}']
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    kind = COUNTER
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = (self.values.get(label_values, 0)
+                                         + amount)
+
+    def get(self, *label_values):
+        return self.values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = self._header()
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f'{self.name}'
+                             f'{_fmt_labels(self.labels, label_values)}'
+                             f' {_fmt_num(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = GAUGE
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value=0):
+        with self.lock:
+            self.values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = HISTOGRAM
+
+    def __init__(self, name: str, descr: str, labels: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, descr, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, *label_values, value):
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                # one count per bucket, then the sum and the count:
+                counts = [0] * len(self.buckets) + [0.0, 0]
+                self.values[label_values] = counts
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def get_count(self, *label_values) -> int:
+        counts = self.values.get(label_values)
+        return counts[-1] if counts else 0
+
+    def render(self) -> list:
+        lines = self._header()
+        with self.lock:
+            for label_values, counts in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _fmt_labels(self.labels, label_values,
+                                         f'le="{_fmt_num(bound)}"')
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _fmt_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {counts[-2]}')
+                lines.append(f'{self.name}_count{labels} {counts[-1]}')
+        return lines
+
+
+def render() -> str:
+    lines = []
+    with registry_lock:
+        metrics = list(registry)
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+REQUESTS = Counter('http_requests_total',
+                   'HTTP requests by route, method and status.',
+                   ('route', 'method', 'status'))
+REQUEST_SECS = Histogram('http_request_duration_seconds',
+                         'HTTP request latency by route and method.',
+                         ('route', 'method'))
+IN_FLIGHT = Gauge('http_requests_in_flight',
+                  'HTTP requests being handled right now.')
+IN_FLIGHT.set(value=0)
+DB_SECS = Histogram('mongo_operation_duration_seconds',
+                    'DB call latency by operation and collection.',
+                    ('operation', 'collection'))
+DB_DOCS = Counter('mongo_documents_returned_total',
+                  'Docs returned by DB reads.',
+                  ('operation', 'collection'))
+WORKER_START = Gauge('gunicorn_worker_start_time_seconds',
+                     'When the worker answering this scrape started.',
+                     ('pid', 'worker_class'))
+WORKER_MAX_REQUESTS = Gauge('gunicorn_worker_max_requests',
+                            'Requests the worker serves before it is '
+                            'recycled (0: never).',
+                            ('pid', 'worker_class'))
+
+
+def worker_started(pid: int, worker_class: str, max_requests: int):
+    """
+    Called in each gunicorn worker right after it forks.
+    """
+    WORKER_START.set(str(pid), worker_class, value=time.time())
+    WORKER_MAX_REQUESTS.set(str(pid), worker_class, value=max_requests)
+
+
+def observe_db(operation: str, collection: str, secs: float, ndocs):
+    DB_SECS.observe(operation, collection, value=secs)
+    if ndocs:
+        DB_DOCS.inc(operation, collection, amount=ndocs)
+
+
+def _route() -> str:
+    if request.url_rule is None:
+        return UNMATCHED_ROUTE
+    return request.url_rule.rule
+
+
+def start_timer():
+    g.metrics_start = time.perf_counter()
+    g.metrics_in_flight = True
+    IN_FLIGHT.inc()
+
+
+def record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        route = _route()
+        REQUEST_SECS.observe(route, request.method,
+                             value=time.perf_counter() - start)
+        REQUESTS.inc(route, request.method, str(response.status_code))
+    return response
+
+
+def end_request(exc):
+    if g.pop('metrics_in_flight', False):
+        IN_FLIGHT.dec()
+
+
+def serve_metrics():
+    return Response(render(), mimetype=None, content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    """
+    Time every request on app, time every DB call, and serve the
+    results at METRICS_EP.
+    Call this before registering other before_request hooks, so
+    requests they turn away are counted too.
+    """
+    app.before_request(start_timer)
+    app.after_request(record_request)
+    app.teardown_request(end_request)
+    app.add_url_rule(METRICS_EP, 'metrics', serve_metrics)
+    if observe_db not in dbc.observers:
+        dbc.add_observer(observe_db)
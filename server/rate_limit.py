@@ -0,0 +1,243 @@
+"""
+This module rate limits API calls with token buckets.
+Each caller gets a bucket per class of endpoint, so a client
+hammering the collection scans can't starve everyone else.
+A caller is the logged-in user if the request carries a valid
+session token, else the client IP address.
+Behind a reverse proxy every request comes from the proxy's address,
+so set TRUSTED_PROXIES to how many proxies append to X-Forwarded-For:
+the client is then the address the outermost of them saw. Leave it
+at 0 when clients reach the app directly, or they could pick their
+own address by sending the header.
+Buckets live in this process by default; set RATE_LIMIT_BACKEND
+to 'mongo' to share them across gunicorn workers.
+"""
+import math
+import os
+import time
+from http import HTTPStatus
+from threading import Lock
+
+from flask import request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import data.db_connect as dbc
+import data.log as log
+import security.auth as auth
+
+ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'local')
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+# endpoint classes
+LIST = 'list'
+SEARCH = 'search'
+EXPORT = 'export'
+WRITE = 'write'
+DEFAULT = 'default'
+
+RATE = 'rate'  # tokens added per second
+BURST = 'burst'  # most tokens a bucket holds
+
+LIMITS = {
+    LIST: {RATE: 2, BURST: 20},
+    SEARCH: {RATE: 1, BURST: 10},
+    EXPORT: {RATE: 0.1, BURST: 10},
+    WRITE: {RATE: 5, BURST: 20},
+    DEFAULT: {RATE: 20, BURST: 100},
+}
+
+# GETs on these paths read whole collections:
+LIST_PATHS = {'/people', '/manuscripts', '/text'}
+SEARCH_MARKERS = ('/search', '/people/roles/')
+# GETs under this stream a whole collection out:
+EXPORT_PREFIX = '/export/'
+EXEMPT_PATHS = {'/metrics', '/swagger.json'}
+
+RATE_LIMIT_COLLECT = 'rate_limits'
+TOKENS = 'tokens'
+UPDATED = 'updated'
+ALLOWED = 'allowed'
+
+MSG_TOO_MANY = 'Too many requests'
+
+logger = log.get_logger(__name__)
+
+
+def classify(method: str, path: str) -> str:
+    if method not in ('GET', 'HEAD', 'OPTIONS'):
+        return WRITE
+    if path.startswith(EXPORT_PREFIX):
+        return EXPORT
+    if any(marker in path for marker in SEARCH_MARKERS):
+        return SEARCH
+    if path.rstrip('/') in LIST_PATHS:
+        return LIST
+    return DEFAULT
+
+
+def _retry_after(tokens: float, rate: float) -> float:
+    return (1 - tokens) / rate
+
+
+class LocalBackend:
+    """
+    Buckets held in this process's memory.
+    """
+    MAX_KEYS = 100_000
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = Lock()
+
+    def take(self, key: str, rate: float, burst: float,
+             now: float = None) -> tuple:
+        """
+        Take a token from key's bucket.
+        Returns (allowed, seconds to wait before retrying).
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if key not in self.buckets and len(self.buckets) >= self.MAX_KEYS:
+                self._evict(now)
+            self.buckets[key] = (tokens, now)
+        if allowed:
+            return True, 0
+        return False, _retry_after(tokens, rate)
+
+    def _evict(self, now: float):
+        """
+        Forget buckets idle long enough to have refilled: a fresh
+        bucket would be the same.
+        """
+        idle_secs = max(limit[BURST] / limit[RATE]
+                        for limit in LIMITS.values())
+        for key, (_, updated) in list(self.buckets.items()):
+            if now - updated > idle_secs:
+                del self.buckets[key]
+
+
+class MongoBackend:
+    """
+    Buckets held in the DB, shared by every worker.
+    Each take() is one atomic find-and-update.
+    """
+    def take(self, key: str, rate: float, burst: float,
+             now: float = None) -> tuple:
+        if now is None:
+            now = time.time()
+        refill = {'$multiply': [
+            {'$subtract': [now, {'$ifNull': [f'${UPDATED}', now]}]},
+            rate]}
+        tokens = {'$min': [burst, {'$add': [
+            {'$ifNull': [f'${TOKENS}', burst]}, refill]}]}
+        pipeline = [
+            {'$set': {TOKENS: tokens, UPDATED: now}},
+            {'$set': {ALLOWED: {'$gte': [f'${TOKENS}', 1]}}},
+            {'$set': {TOKENS: {'$cond': [f'${ALLOWED}',
+                                         {'$subtract': [f'${TOKENS}', 1]},
+                                         f'${TOKENS}']}}},
+        ]
+        dbc.connect_db()
+        doc = dbc.find_one_and_update(RATE_LIMIT_COLLECT, {'_id': key},
+                                      pipeline, upsert=True)
+        if doc[ALLOWED]:
+            return True, 0
+        return False, _retry_after(doc[TOKENS], rate)
+
+
+def make_backend(name: str = BACKEND):
+    if name == 'mongo':
+        return MongoBackend()
+    return LocalBackend()
+
+
+backend = make_backend()
+
+
+def client_addr(forwarded_for: str, remote_addr: str,
+                trusted: int = None) -> str:
+    """
+    The client's address, as werkzeug's ProxyFix works it out with
+    x_for=trusted (default TRUSTED_PROXIES): the trusted-th address
+    from the right of X-Forwarded-For, else remote_addr.
+    """
+    if trusted is None:
+        trusted = TRUSTED_PROXIES
+    if trusted <= 0 or not forwarded_for:
+        return remote_addr
+    hops = [hop.strip() for hop in forwarded_for.split(',')]
+    if len(hops) < trusted:
+        return remote_addr
+    return hops[-trusted]
+
+
+def caller_key(auth_header: str, remote_addr: str) -> str:
+    """
+    Who to charge a request with these headers and address to.
+    """
+    if auth_header and auth_header.startswith('Bearer '):
+        user_id = auth.validate_token(auth_header[len('Bearer '):])
+        if user_id:
+            return f'user:{user_id}'
+    return f'ip:{remote_addr}'
+
+
+def caller_id() -> str:
+    """
+    Who to charge this request to.
+    """
+    return caller_key(request.headers.get('Authorization', ''),
+                      request.remote_addr)
+
+
+def retry_after(method: str, path: str, caller: str):
+    """
+    Take a token from caller's bucket for this endpoint class.
+    Returns None if the request may go ahead, else how many whole
+    seconds to wait. Shared by the Flask app and server.asgi.
+    """
+    if not ENABLED or path in EXEMPT_PATHS:
+        return None
+    ep_class = classify(method, path)
+    limit = LIMITS[ep_class]
+    try:
+        allowed, wait = backend.take(f'{caller}:{ep_class}', limit[RATE],
+                                     limit[BURST])
+    except Exception:
+        # don't take the API down with the limiter:
+        logger.exception('Error checking rate limit')
+        return None
+    if allowed:
+        return None
+    return math.ceil(wait)
+
+
+def check_limit():
+    """
+    Runs before every request: returns a 429 response if the
+    caller's bucket for this endpoint class is empty.
+    """
+    wait = retry_after(request.method, request.path, caller_id())
+    if wait is None:
+        return None
+    return ({'Message': MSG_TOO_MANY},
+            HTTPStatus.TOO_MANY_REQUESTS,
+            {'Retry-After': str(wait)})
+
+
+def init_app(app):
+    """
+    Limit every request on app. With TRUSTED_PROXIES set (or the
+    app's config), take request.remote_addr from X-Forwarded-For.
+    """
+    trusted = app.config.get('TRUSTED_PROXIES', TRUSTED_PROXIES)
+    if trusted > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted)
+    app.before_request(check_limit)
@@ -0,0 +1,303 @@
+import asyncio
+import json
+import threading
+from http import HTTPStatus
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import data.log as log
+import server.asgi as asgi
+import server.endpoints as ep
+import server.metrics as metrics
+import server.rate_limit as rl
+
+MANU_ID = '67c7700a985d03e678e4513e'
+TEST_EDITOR = {'email': 'ed@nyu.edu', 'roles': ['ED']}
+TEST_MANU = {'_id': MANU_ID, 'title': 'A title', 'state': 'SUB',
+             'referees': [], 'history': []}
+UPDATED = SimpleNamespace(matched_count=1)
+
+
+def call(method: str, path: str, body: dict = None, query: str = '',
+         headers: dict = None, sent: list = None):
+    """
+    Run one request through the ASGI app; return (status, json body).
+    Pass sent to get the raw ASGI messages too.
+    """
+    scope = {'type': 'http', 'http_version': '1.1', 'scheme': 'http',
+             'method': method, 'path': path, 'root_path': '',
+             'query_string': query.encode(),
+             'headers': [(name.lower().encode(), value.encode())
+                         for name, value in (headers or {}).items()],
+             'client': ('10.0.0.1', 5000), 'server': ('testserver', 80)}
+    raw_body = json.dumps(body).encode() if body is not None else b''
+    messages = [{'type': 'http.request', 'body': raw_body,
+                 'more_body': False}]
+    if sent is None:
+        sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    status = sent[0]['status']
+    payload = b''.join(m.get('body', b'') for m in sent[1:])
+    return status, json.loads(payload)
+
+
+def response_headers(sent: list) -> dict:
+    return {name.decode(): value.decode()
+            for name, value in sent[0]['headers']}
+
+
+def test_match_route():
+    assert asgi.match_route('GET', '/manuscripts')[0] \
+        is asgi.list_manuscripts
+    handler, params = asgi.match_route('GET', f'/manuscripts/{MANU_ID}')
+    assert handler is asgi.get_manuscript
+    assert params == {'manu_id': MANU_ID}
+    assert asgi.match_route('GET', '/people/masthead')[0] is asgi.masthead
+    assert asgi.match_route('GET', '/people/a@nyu.edu')[0] is asgi.get_person
+    assert asgi.match_route('GET', '/manuscripts/metadata') == (None, None)
+    assert asgi.match_route('POST', '/manuscripts') == (None, None)
+
+
+@patch('data.db_connect_async.read', new_callable=AsyncMock,
+       return_value=[{'_id': MANU_ID, 'title': 'A title'}])
+def test_list_manuscripts(mock_read):
+    status, body = call('GET', '/manuscripts')
+    assert status == HTTPStatus.OK
+    assert body[0]['manu_id'] == MANU_ID
+
+
+@patch('data.db_connect_async.fetch_one', new_callable=AsyncMock,
+       return_value=None)
+def test_get_manuscript_not_found(mock_fetch_one):
+    status, _ = call('GET', f'/manuscripts/{MANU_ID}')
+    assert status == HTTPStatus.NOT_FOUND
+
+
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value={'name': 'Joe Schmoe'})
+def test_get_person(mock_read_one):
+    status, body = call('GET', '/people/joe@nyu.edu')
+    assert status == HTTPStatus.OK
+    assert body['name'] == 'Joe Schmoe'
+
+
+@patch('data.db_connect_async.read_dict', new_callable=AsyncMock,
+       return_value={'ed@nyu.edu': {'name': 'Ed', 'affiliation': 'NYU',
+                                    'roles': ['ED']}})
+def test_masthead(mock_read_dict):
+    status, body = call('GET', '/people/masthead')
+    assert status == HTTPStatus.OK
+    assert body['Masthead']['Editor'] == [{'name': 'Ed',
+                                           'affiliation': 'NYU'}]
+
+
+@patch('data.workload.record', autospec=True)
+@patch('data.audit.log_event', autospec=True)
+@patch('data.db_connect_async.update', new_callable=AsyncMock,
+       return_value=UPDATED)
+@patch('data.db_connect_async.fetch_one', new_callable=AsyncMock,
+       return_value=TEST_MANU)
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value=TEST_EDITOR)
+def test_receive_action(mock_read_one, mock_fetch_one, mock_update,
+                        mock_log_event, mock_record):
+    status, body = call('PUT', '/manuscripts/receive_action',
+                        body={'_id': MANU_ID, 'curr_state': 'SUB',
+                              'action': 'REJ'},
+                        query='user_id=ed@nyu.edu')
+    assert status == HTTPStatus.OK
+    assert body['return']['new_state'] == 'REJ'
+    assert mock_update.await_args.args[2]['state'] == 'REJ'
+    # the workloads are kept up as by the Flask endpoint:
+    mock_record.assert_called_once_with([], 'SUB', [], 'REJ', None)
+
+
+@patch('data.workload.record', autospec=True)
+@patch('data.audit.log_event', autospec=True)
+@patch('data.db_connect_async.update', new_callable=AsyncMock,
+       return_value=UPDATED)
+@patch('data.db_connect_async.fetch_one', new_callable=AsyncMock,
+       return_value=TEST_MANU)
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value=TEST_EDITOR)
+def test_receive_action_assigns_referee(mock_read_one, mock_fetch_one,
+                                        mock_update, mock_log_event,
+                                        mock_record):
+    status, body = call('PUT', '/manuscripts/receive_action',
+                        body={'_id': MANU_ID, 'curr_state': 'SUB',
+                              'action': 'ARF', 'referee': 're@nyu.edu'},
+                        query='user_id=ed@nyu.edu')
+    assert status == HTTPStatus.OK
+    assert mock_update.await_args.args[2]['referees'] == ['re@nyu.edu']
+    mock_record.assert_called_once_with([], 'SUB', ['re@nyu.edu'], 'REV',
+                                        None)
+    # the manuscript as read is left alone:
+    assert TEST_MANU['referees'] == []
+
+
+PLAN_THREADS = []
+plan_action = ep.plan_action
+
+
+def plan_in_thread(*args):
+    PLAN_THREADS.append(threading.get_ident())
+    return plan_action(*args)
+
+
+@patch('server.endpoints.plan_action', autospec=True,
+       side_effect=plan_in_thread)
+@patch('data.workload.record', autospec=True)
+@patch('data.audit.log_event', autospec=True)
+@patch('data.db_connect_async.update', new_callable=AsyncMock,
+       return_value=UPDATED)
+@patch('data.db_connect_async.fetch_one', new_callable=AsyncMock,
+       return_value=TEST_MANU)
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value=TEST_EDITOR)
+def test_receive_action_plans_off_loop(mock_read_one, mock_fetch_one,
+                                       mock_update, mock_log_event,
+                                       mock_record, mock_plan_action):
+    # planning may read a journal's workflow with the sync driver, so
+    # it must not block the event loop (which runs in this thread):
+    status, _ = call('PUT', '/manuscripts/receive_action',
+                     body={'_id': MANU_ID, 'curr_state': 'SUB',
+                           'action': 'REJ'},
+                     query='user_id=ed@nyu.edu')
+    assert status == HTTPStatus.OK
+    assert PLAN_THREADS and threading.get_ident() not in PLAN_THREADS
+
+
+@patch('data.workload.record', autospec=True)
+@patch('data.audit.log_event', autospec=True)
+@patch('data.db_connect_async.update', new_callable=AsyncMock,
+       return_value=SimpleNamespace(matched_count=0))
+@patch('data.db_connect_async.fetch_one', new_callable=AsyncMock,
+       return_value=TEST_MANU)
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value=TEST_EDITOR)
+def test_receive_action_changed_meanwhile(mock_read_one, mock_fetch_one,
+                                          mock_update, mock_log_event,
+                                          mock_record):
+    status, _ = call('PUT', '/manuscripts/receive_action',
+                     body={'_id': MANU_ID, 'curr_state': 'SUB',
+                           'action': 'REJ'},
+                     query='user_id=ed@nyu.edu')
+    assert status == HTTPStatus.CONFLICT
+    assert mock_update.await_args.args[1]['state'] == 'SUB'
+    mock_record.assert_not_called()
+
+
+@patch('data.audit.log_event', autospec=True)
+@patch('data.db_connect_async.fetch_one', new_callable=AsyncMock,
+       return_value=TEST_MANU)
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value={'email': 'au@nyu.edu', 'roles': ['AU']})
+def test_receive_action_forbidden(mock_read_one, mock_fetch_one,
+                                  mock_log_event):
+    status, _ = call('PUT', '/manuscripts/receive_action',
+                     body={'_id': MANU_ID, 'curr_state': 'SUB',
+                           'action': 'REJ'},
+                     query='user_id=au@nyu.edu')
+    assert status == HTTPStatus.FORBIDDEN
+
+
+def test_falls_back_to_flask():
+    status, body = call('GET', '/title')
+    assert status == HTTPStatus.OK
+    assert 'Title' in body
+
+
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value={'name': 'Joe Schmoe'})
+def test_native_route_headers(mock_read_one):
+    sent = []
+    status, _ = call('GET', '/people/joe@nyu.edu', sent=sent,
+                     headers={'Origin': 'http://example.com',
+                              'X-Request-ID': 'abc-123'})
+    assert status == HTTPStatus.OK
+    headers = response_headers(sent)
+    assert headers['access-control-allow-origin'] == '*'
+    assert headers['x-request-id'] == 'abc-123'
+
+
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value={'name': 'Joe Schmoe'})
+def test_native_route_new_request_id(mock_read_one):
+    sent = []
+    call('GET', '/people/joe@nyu.edu', sent=sent)
+    headers = response_headers(sent)
+    assert headers['x-request-id']
+    assert 'access-control-allow-origin' not in headers
+
+
+@patch('data.db_connect_async.read', new_callable=AsyncMock,
+       return_value=[])
+def test_native_route_rate_limited(mock_read):
+    limit = rl.LIMITS[rl.LIST]
+    with patch('server.rate_limit.ENABLED', True), \
+            patch('server.rate_limit.backend', rl.LocalBackend()):
+        for _ in range(limit[rl.BURST]):
+            assert call('GET', '/manuscripts')[0] == HTTPStatus.OK
+        sent = []
+        status, body = call('GET', '/manuscripts', sent=sent)
+    assert status == HTTPStatus.TOO_MANY_REQUESTS
+    assert body == {'Message': rl.MSG_TOO_MANY}
+    assert int(response_headers(sent)['retry-after']) >= 1
+    # the handler never ran for the turned away request:
+    assert mock_read.await_count == limit[rl.BURST]
+
+
+@patch('data.db_connect_async.read', new_callable=AsyncMock,
+       return_value=[])
+def test_native_route_metrics(mock_read):
+    route = asgi.find_route('GET', '/manuscripts')[2]
+    before = metrics.REQUESTS.get(route, 'GET', '200')
+    call('GET', '/manuscripts')
+    assert metrics.REQUESTS.get(route, 'GET', '200') == before + 1
+
+
+@patch('data.db_connect_async.read', new_callable=AsyncMock,
+       return_value=[])
+def test_native_route_limits_forwarded_client(mock_read):
+    limit = rl.LIMITS[rl.LIST]
+    with patch('server.rate_limit.ENABLED', True), \
+            patch('server.rate_limit.TRUSTED_PROXIES', 1), \
+            patch('server.rate_limit.backend', rl.LocalBackend()):
+        for _ in range(limit[rl.BURST]):
+            call('GET', '/manuscripts',
+                 headers={'X-Forwarded-For': '1.1.1.1'})
+        status, _ = call('GET', '/manuscripts',
+                         headers={'X-Forwarded-For': '2.2.2.2'})
+    assert status == HTTPStatus.OK
+
+
+@patch('data.db_connect_async.read_one', new_callable=AsyncMock,
+       return_value={'name': 'Joe Schmoe'})
+def test_native_route_resets_request_id(mock_read_one):
+    scope = {'type': 'http', 'method': 'GET', 'path': '/people/joe@nyu.edu',
+             'query_string': b'', 'headers': [(b'x-request-id', b'abc-123')],
+             'client': ('10.0.0.1', 5000)}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    async def run():
+        before = log.request_id.get()
+        await asgi.app(scope, receive, send)
+        # still in the same task, which the request ran in:
+        return before, log.request_id.get()
+
+    before, after = asyncio.run(run())
+    assert after == before != 'abc-123'
@@ -1,28 +1,42 @@
 from http.client import (
     BAD_REQUEST, # 400
+    CONFLICT,
     FORBIDDEN,
     NOT_ACCEPTABLE,
     NOT_FOUND, # 404
     OK, # 200
     SERVICE_UNAVAILABLE,
+    UNAUTHORIZED,
+    INTERNAL_SERVER_ERROR,
     CREATED, # 201
+    PARTIAL_CONTENT,
+    REQUESTED_RANGE_NOT_SATISFIABLE,
 )
 
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import pytest
 
 import server.endpoints as ep
 
+import data.log as log
 import data.manuscripts as manu
 import data.people as ppl
 from data.people import NAME
 from werkzeug.security import generate_password_hash
+from security.security import GOOD_USER_ID
+from security.auth import issue_token
 
 TEST_CLIENT = ep.app.test_client()
 
 PEOPLE_LOC = 'data.people.'
-from security.security import GOOD_USER_ID
 
 
 # def test_hello():
@@ -120,7 +134,9 @@ def test_delete_person():
         'email': 'johndoe@nyu.edu'
     }
 
-    resp = TEST_CLIENT.delete(f"/people/delete/{existing_person['email']}/{GOOD_USER_ID}")
+    resp = TEST_CLIENT.delete(
+        f"/people/delete/{existing_person['email']}/{GOOD_USER_ID}",
+        headers={ep.AUTH_HEADER: ep.AUTH_SCHEME + issue_token(GOOD_USER_ID)})
     resp_json = resp.get_json()
 
     assert resp.status_code == OK
@@ -193,3 +209,575 @@ def test_get_people_with_invalid_role(mock_is_valid):
 #                                manu.REFEREE: 'some ref',
 #                            })
 #     assert resp.status_code == OK
+
+
+RECEIVE_MANU = {'_id': '67c7700a985d03e678e4513e', 'state': 'SUB',
+                'referees': [], 'history': []}
+REJECT = {manu.MANU_ID: '67c7700a985d03e678e4513e',
+          manu.CURR_STATE: 'SUB', manu.ACTION: 'REJ'}
+RECEIVE_EDITOR = {'email': 'ed@nyu.edu', 'roles': ['ED']}
+
+
+@patch('data.workload.record', autospec=True)
+@patch('data.audit.log_event', autospec=True)
+@patch('server.endpoints.update', autospec=True,
+       return_value=SimpleNamespace(matched_count=1))
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value=RECEIVE_MANU)
+@patch('data.people.read_one', autospec=True, return_value=RECEIVE_EDITOR)
+def test_receive_action(mock_read_one, mock_fetch_one, mock_update,
+                        mock_log_event, mock_record):
+    resp = TEST_CLIENT.put(f'{ep.MANU_EP}/receive_action?user_id=ed',
+                           json=REJECT)
+    assert resp.status_code == OK
+    # only the manuscript as it was read gets updated:
+    filt = mock_update.call_args.args[1]
+    assert (filt['state'], filt['referees'], filt['history']) == \
+        ('SUB', [], [])
+    mock_record.assert_called_once_with([], 'SUB', [], 'REJ', None)
+
+
+@patch('data.workload.record', autospec=True)
+@patch('data.audit.log_event', autospec=True)
+@patch('server.endpoints.update', autospec=True,
+       return_value=SimpleNamespace(matched_count=0))
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value=RECEIVE_MANU)
+@patch('data.people.read_one', autospec=True, return_value=RECEIVE_EDITOR)
+def test_receive_action_changed_meanwhile(mock_read_one, mock_fetch_one,
+                                          mock_update, mock_log_event,
+                                          mock_record):
+    resp = TEST_CLIENT.put(f'{ep.MANU_EP}/receive_action?user_id=ed',
+                           json=REJECT)
+    assert resp.status_code == CONFLICT
+    # nothing was saved, so there is nothing to audit or count:
+    mock_log_event.assert_not_called()
+    mock_record.assert_not_called()
+
+
+def test_action_filter_missing_fields():
+    filt = ep.action_filter('67c7700a985d03e678e4513e', {'state': 'SUB'})
+    assert filt['state'] == 'SUB'
+    assert filt['referees'] == {'$exists': False}
+
+
+@patch('server.endpoints.read', autospec=True, return_value=[
+    {'title': 'Home', 'content': 'Welcome to *the* journal.'},
+])
+def test_get_text_as_html(mock_read):
+    resp = TEST_CLIENT.get(f'{ep.TEXT_EP}/Home?{ep.FORMAT}={ep.HTML_FORMAT}')
+    assert resp.status_code == OK
+    resp_json = resp.get_json()
+    assert resp_json['content'] == 'Welcome to *the* journal.'
+    assert '<em>the</em>' in resp_json[ep.HTML_FORMAT]
+
+
+@patch('security.security.read_from_db', autospec=True,
+       return_value=({}, 0))
+@patch('data.audit.log_event', autospec=True)
+def test_delete_person_not_logged_in(mock_log_event, mock_read_from_db):
+    resp = TEST_CLIENT.delete(f"/people/delete/johndoe@nyu.edu/{GOOD_USER_ID}")
+    assert resp.status_code == FORBIDDEN
+    mock_log_event.assert_called_once()
+    assert 'denied' in mock_log_event.call_args.args
+
+
+@patch('security.security.permission_index', None)
+@patch('security.security.read_from_db', autospec=True,
+       side_effect=Exception('DB down'))
+@patch('data.audit.log_event', autospec=True)
+def test_delete_person_no_security_recs(mock_log_event, mock_read_from_db):
+    resp = TEST_CLIENT.delete(f"/people/delete/johndoe@nyu.edu/{GOOD_USER_ID}")
+    assert resp.status_code == SERVICE_UNAVAILABLE
+    mock_log_event.assert_not_called()
+
+
+@patch('security.auth.login', autospec=True, return_value='a-token')
+def test_login(mock_login):
+    resp = TEST_CLIENT.post(ep.LOGIN_EP,
+                            json={'email': GOOD_USER_ID, 'password': 'pw'})
+    assert resp.status_code == OK
+    assert resp.get_json()[ep.TOKEN] == 'a-token'
+    mock_login.assert_called_once_with(GOOD_USER_ID, 'pw')
+
+
+@patch('security.auth.login', autospec=True, return_value=None)
+def test_login_bad_password(mock_login):
+    resp = TEST_CLIENT.post(ep.LOGIN_EP,
+                            json={'email': GOOD_USER_ID, 'password': 'bad'})
+    assert resp.status_code == UNAUTHORIZED
+
+
+@patch('security.auth.login', autospec=True,
+       side_effect=TimeoutError('Too many passwords waiting to be hashed.'))
+def test_login_busy(mock_login):
+    resp = TEST_CLIENT.post(ep.LOGIN_EP,
+                            json={'email': GOOD_USER_ID, 'password': 'pw'})
+    assert resp.status_code == SERVICE_UNAVAILABLE
+
+
+@patch('security.auth.revoke_token', autospec=True, return_value=True)
+def test_logout(mock_revoke):
+    resp = TEST_CLIENT.post(ep.LOGOUT_EP,
+                            headers={ep.AUTH_HEADER: ep.AUTH_SCHEME + 'tok'})
+    assert resp.status_code == OK
+    mock_revoke.assert_called_once_with('tok')
+
+
+@patch('security.passwords.POOL_SIZE', 0)
+@patch('security.passwords.HASH_ITERATIONS', 1000)
+@patch('data.people.create_person', autospec=True,
+       side_effect=['ann@nyu.edu', ValueError('Person already exists')])
+@patch('data.people.read_one', autospec=True,
+       return_value={'email': GOOD_USER_ID, 'roles': ['ED']})
+def test_bulk_create_people(mock_read_one, mock_create_person):
+    resp = TEST_CLIENT.post(f'{ep.PEOPLE_EP}/bulk?user_id={GOOD_USER_ID}',
+                            json=[{'name': 'A', 'email': 'ann@nyu.edu',
+                                   'roles': ['AU'], 'password': 'pw'},
+                                  {'name': 'B', 'email': 'bob@nyu.edu',
+                                   'roles': ['AU']}])
+    assert resp.status_code == CREATED
+    resp_json = resp.get_json()
+    assert resp_json['Created'] == ['ann@nyu.edu']
+    assert 'bob@nyu.edu' in resp_json['Errors']
+    a_hash = mock_create_person.call_args_list[0].args[4]
+    assert a_hash.startswith('pbkdf2:sha256:1000')
+    assert mock_create_person.call_args_list[1].args[4] is None
+
+
+@patch('security.passwords.hash_many', autospec=True,
+       side_effect=lambda passwords: [f'hash:{pw}' if pw else None
+                                      for pw in passwords])
+@patch('data.people.create_person', autospec=True,
+       side_effect=lambda name, aff, email, roles, pw_hash: email)
+@patch('data.people.read_one', autospec=True,
+       return_value={'email': GOOD_USER_ID, 'roles': ['ED']})
+def test_bulk_create_people_validates_first(mock_read_one,
+                                            mock_create_person,
+                                            mock_hash_many):
+    resp = TEST_CLIENT.post(f'{ep.PEOPLE_EP}/bulk?user_id={GOOD_USER_ID}',
+                            json=[{'name': 'A', 'email': 'ann@nyu.edu',
+                                   'roles': ['AU'], 'password': 'pw'},
+                                  {'name': 'B', 'email': 'not an email',
+                                   'roles': ['AU'], 'password': 'pw2'},
+                                  {'name': 'C', 'email': 'cy@nyu.edu',
+                                   'roles': ['AU'], 'password': ''}])
+    assert resp.status_code == CREATED
+    resp_json = resp.get_json()
+    assert resp_json['Created'] == ['ann@nyu.edu', 'cy@nyu.edu']
+    assert 'not an email' in resp_json['Errors']
+    # the bad row is never hashed, nor is the blank password
+    mock_hash_many.assert_called_once_with(['pw', None])
+    assert mock_create_person.call_args_list[1].args[4] is None
+
+
+@patch('data.people.read_one', autospec=True,
+       return_value={'email': GOOD_USER_ID, 'roles': ['AU']})
+def test_bulk_create_people_not_editor(mock_read_one):
+    resp = TEST_CLIENT.post(f'{ep.PEOPLE_EP}/bulk?user_id={GOOD_USER_ID}',
+                            json=[])
+    assert resp.status_code == FORBIDDEN
+
+
+def test_request_id_header():
+    resp = TEST_CLIENT.get(ep.TITLE_EP, headers={'X-Request-ID': 'req-42'})
+    assert resp.headers['X-Request-ID'] == 'req-42'
+    resp = TEST_CLIENT.get(ep.TITLE_EP)
+    assert resp.headers['X-Request-ID']
+
+
+def test_request_id_reset():
+    token = log.request_id.set(None)
+    try:
+        TEST_CLIENT.get(ep.TITLE_EP, headers={'X-Request-ID': 'req-43'})
+        # the id doesn't outlive its request:
+        assert log.request_id.get() is None
+    finally:
+        log.request_id.reset(token)
+
+
+def test_create_app_configures_logging():
+    with patch('data.log.configure', autospec=True) as mock_configure:
+        ep.create_app()
+    mock_configure.assert_called_once()
+
+
+def test_dev_logs(tmp_path):
+    log_path = tmp_path / 'error.log'
+    log_path.write_text(''.join(f'line {i}\n' for i in range(100)))
+    with patch('server.endpoints.ELOG_LOC', str(log_path)):
+        resp = TEST_CLIENT.get(f'{ep.DEV_ERROR_LOG_EP}?lines=3')
+        assert resp.status_code == OK
+        resp_json = resp.get_json()
+        assert resp_json[ep.LOG_OUTPUT] == ['line 97', 'line 98', 'line 99']
+        with open(log_path, 'a') as f:
+            f.write('line 100\n')
+        resp = TEST_CLIENT.get(
+            f'{ep.DEV_ERROR_LOG_EP}?since={resp_json[ep.LOG_OFFSET]}')
+        assert resp.get_json()[ep.LOG_OUTPUT] == ['line 100']
+
+
+@patch('server.endpoints.ELOG_LOC', '/no/such/file.log')
+def test_dev_logs_missing_file():
+    resp = TEST_CLIENT.get(ep.DEV_ERROR_LOG_EP)
+    assert resp.status_code == INTERNAL_SERVER_ERROR
+
+
+def test_create_app():
+    app = ep.create_app({'TESTING': True})
+    assert app is not ep.app
+    assert app.config['TESTING']
+    resp = app.test_client().get(ep.TITLE_EP)
+    assert resp.status_code == OK
+
+
+# Modules we load on first use, not at startup:
+LAZY_MODULES = ['markdown', 'multiprocessing', 'concurrent.futures.process']
+# Generous, so a slow CI box doesn't fail; a regression is usually
+# a lot bigger than the noise.
+IMPORT_BUDGET_US = int(os.environ.get('IMPORT_BUDGET_US', 3_000_000))
+
+
+def test_import_is_fast_and_quiet():
+    """
+    Time a cold import of the app with python -X importtime.
+    """
+    root = os.path.join(os.path.dirname(__file__), '..', '..')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import server.endpoints'],
+        cwd=root, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                import_times[name.strip()] = int(cumulative)
+    for module in LAZY_MODULES:
+        assert module not in import_times
+    assert import_times['server.endpoints'] < IMPORT_BUDGET_US
+    # no client means no connection attempt:
+    assert 'Connecting to Mongo' not in result.stderr
+
+
+EDITOR = {'email': 'editor@nyu.edu', 'roles': ['ED']}
+
+
+def logged_in(email: str) -> dict:
+    return {ep.AUTH_HEADER: ep.AUTH_SCHEME + issue_token(email)}
+
+
+@patch('data.people.read_one', autospec=True, return_value=EDITOR)
+@patch('data.db_connect.read_cursor', autospec=True, return_value=iter([
+    {'name': 'Joe', 'email': 'joe@nyu.edu'},
+    {'name': 'Ann', 'email': 'ann@nyu.edu'},
+]))
+def test_export(mock_cursor, mock_read_one):
+    resp = TEST_CLIENT.get(f'{ep.EXPORT_EP}/people?fields=name',
+                           headers={'Accept-Encoding': 'gzip',
+                                    **logged_in('editor@nyu.edu')})
+    assert resp.status_code == OK
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(resp.data).decode().splitlines()
+    assert [json.loads(line)['name'] for line in lines] == ['Joe', 'Ann']
+    assert mock_cursor.call_args.kwargs['projection'] == {'name': 1}
+
+
+@patch('data.people.read_one', autospec=True, return_value=EDITOR)
+@patch('data.db_connect.read_cursor', autospec=True, return_value=iter([]))
+def test_export_hidden_fields_only(mock_cursor, mock_read_one):
+    resp = TEST_CLIENT.get(f'{ep.EXPORT_EP}/people?fields=password_hash',
+                           headers=logged_in('editor@nyu.edu'))
+    assert resp.status_code == OK
+    assert mock_cursor.call_args.kwargs['projection']['password_hash'] == 0
+
+
+def test_export_no_user():
+    resp = TEST_CLIENT.get(f'{ep.EXPORT_EP}/people')
+    assert resp.status_code == UNAUTHORIZED
+
+
+@patch('data.people.read_one', autospec=True, return_value=EDITOR)
+def test_export_user_id_not_enough(mock_read_one):
+    # naming an editor is not being logged in as one:
+    resp = TEST_CLIENT.get(f'{ep.EXPORT_EP}/people?user_id=editor@nyu.edu')
+    assert resp.status_code == UNAUTHORIZED
+
+
+@patch('data.people.read_one', autospec=True, return_value={
+    'email': 'author@nyu.edu', 'roles': ['AU']})
+def test_export_not_editor(mock_read_one):
+    resp = TEST_CLIENT.get(f'{ep.EXPORT_EP}/people',
+                           headers=logged_in('author@nyu.edu'))
+    assert resp.status_code == FORBIDDEN
+    assert 'export' in resp.get_json()['message']
+
+
+@patch('data.people.read_one', autospec=True, return_value=EDITOR)
+def test_export_bad_collection(mock_read_one):
+    resp = TEST_CLIENT.get(f'{ep.EXPORT_EP}/rate_limits',
+                           headers=logged_in('editor@nyu.edu'))
+    assert resp.status_code == NOT_FOUND
+
+
+@patch('data.people.read_one', autospec=True, return_value=EDITOR)
+@patch('data.db_connect.read_cursor', autospec=True,
+       side_effect=Exception('DB down'))
+def test_export_db_error(mock_cursor, mock_read_one):
+    resp = TEST_CLIENT.get(f'{ep.EXPORT_EP}/manuscripts',
+                           headers=logged_in('editor@nyu.edu'))
+    assert resp.status_code == INTERNAL_SERVER_ERROR
+
+
+@patch('data.workload.record_new', autospec=True,
+       side_effect=Exception('DB down'))
+@patch('data.blobs.put_text', autospec=True, return_value={})
+@patch('data.db_connect.create_many', autospec=True,
+       side_effect=lambda collection, docs, ordered:
+       SimpleNamespace(inserted_ids=[1] * len(docs)))
+@patch('data.people.read_one', autospec=True, return_value={
+    'email': 'editor@nyu.edu', 'roles': ['ED']})
+def test_import_csv(mock_read_one, mock_create_many, mock_put_text,
+                    mock_record_new):
+    body = ('title,author,author_email,abstract,text\n'
+            'T,A,a@nyu.edu,Abs,Text\n'
+            'T2,,b@nyu.edu,Abs,Text\n')
+    resp = TEST_CLIENT.post(f'{ep.IMPORT_EP}/manuscripts', data=body,
+                            content_type='text/csv',
+                            headers=logged_in('editor@nyu.edu'))
+    assert resp.status_code == CREATED
+    report = resp.get_json()
+    assert report['Inserted'] == 1
+    assert report['Errors'][0]['row'] == 2
+    # the rows are in, so failing to count them doesn't fail the import:
+    mock_record_new.assert_called_once()
+    assert [doc['title'] for doc in mock_record_new.call_args.args[0]] == \
+        ['T']
+
+
+@patch('data.people.read_one', autospec=True, return_value={
+    'email': 'author@nyu.edu', 'roles': ['AU']})
+def test_import_not_editor(mock_read_one):
+    resp = TEST_CLIENT.post(f'{ep.IMPORT_EP}/manuscripts', data='{}',
+                            content_type='application/x-ndjson',
+                            headers=logged_in('author@nyu.edu'))
+    assert resp.status_code == FORBIDDEN
+    assert 'import' in resp.get_json()['message']
+
+
+MANU_ID = '67c7700a985d03e678e4513e'
+MANU_TEXT = b'0123456789' * 10
+MANU_TEXT_REF = {'sha256': 'abc', 'length': len(MANU_TEXT),
+                 'content_type': 'text/plain; charset=utf-8'}
+
+
+@patch('data.blobs.open_blob', autospec=True,
+       side_effect=lambda ref: io.BytesIO(MANU_TEXT))
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value={'_id': MANU_ID, 'text_blob': MANU_TEXT_REF})
+def test_get_manuscript_text(mock_fetch_one, mock_open_blob):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/{MANU_ID}/text')
+    assert resp.status_code == OK
+    assert resp.data == MANU_TEXT
+    assert resp.headers['ETag'] == '"abc"'
+
+
+@patch('data.blobs.open_blob', autospec=True,
+       side_effect=lambda ref: io.BytesIO(MANU_TEXT))
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value={'_id': MANU_ID, 'text_blob': MANU_TEXT_REF})
+def test_get_manuscript_text_range(mock_fetch_one, mock_open_blob):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/{MANU_ID}/text',
+                           headers={'Range': 'bytes=10-19'})
+    assert resp.status_code == PARTIAL_CONTENT
+    assert resp.data == MANU_TEXT[10:20]
+    assert resp.headers['Content-Range'] == 'bytes 10-19/100'
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/{MANU_ID}/text',
+                           headers={'Range': 'bytes=200-'})
+    assert resp.status_code == REQUESTED_RANGE_NOT_SATISFIABLE
+
+
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value={'_id': MANU_ID, 'text': 'Inline text'})
+def test_get_manuscript_text_inline(mock_fetch_one):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/{MANU_ID}/text',
+                           headers={'Range': 'bytes=0-5'})
+    assert resp.status_code == PARTIAL_CONTENT
+    assert resp.data == b'Inline'
+
+
+def test_get_manuscript_text_bad_id():
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/nope/text')
+    assert resp.status_code == BAD_REQUEST
+
+
+REVISING_MANU = {'_id': MANU_ID, 'author_email': 'a@nyu.edu',
+                 'state': manu.AUTHOR_REVISIONS, 'text_revision': 1}
+REVISION = {'number': 2, 'length': len(MANU_TEXT), 'sha256': 'def',
+            'chunks': ['c1', 'c2']}
+
+
+@patch('data.revisions.read', autospec=True, return_value=MANU_TEXT)
+@patch('data.revisions.get', autospec=True, return_value=REVISION)
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value={**REVISING_MANU, 'text_revision': 2})
+def test_get_manuscript_text_revision(mock_fetch_one, mock_get, mock_read):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/{MANU_ID}/text',
+                           headers={'Range': 'bytes=0-9'})
+    assert resp.status_code == PARTIAL_CONTENT
+    assert resp.data == MANU_TEXT[:10]
+    assert resp.headers['ETag'] == '"def"'
+    mock_get.assert_called_once_with(MANU_ID, 2)
+    TEST_CLIENT.get(f'{ep.MANU_EP}/{MANU_ID}/text?number=1')
+    assert mock_get.call_args.args == (MANU_ID, 1)
+
+
+@patch('server.endpoints.find_one_and_update', autospec=True)
+@patch('data.revisions.save', autospec=True, return_value=REVISION)
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value=REVISING_MANU)
+def test_post_revision_text(mock_fetch_one, mock_save, mock_update):
+    resp = TEST_CLIENT.post(
+        f'{ep.MANU_EP}/{MANU_ID}/revisions?user_id=a@nyu.edu',
+        json={'text': 'Revised text'})
+    assert resp.status_code == CREATED
+    assert resp.get_json()['number'] == 2
+    mock_save.assert_called_once_with(MANU_ID, b'Revised text')
+    assert mock_update.call_args.args[2] == {'$max': {'text_revision': 2}}
+
+
+@patch('server.endpoints.find_one_and_update', autospec=True)
+@patch('data.revisions.save', autospec=True, return_value=REVISION)
+@patch('data.blobs.open_blob', autospec=True,
+       side_effect=lambda ref: io.BytesIO(MANU_TEXT))
+@patch('server.endpoints.fetch_one', autospec=True, return_value={
+    **REVISING_MANU, 'text_revision': None, 'text_blob': MANU_TEXT_REF})
+def test_post_first_revision_keeps_original(mock_fetch_one, mock_open_blob,
+                                            mock_save, mock_update):
+    resp = TEST_CLIENT.post(
+        f'{ep.MANU_EP}/{MANU_ID}/revisions?user_id=a@nyu.edu',
+        json={'text': 'Revised text'})
+    assert resp.status_code == CREATED
+    assert [call.args[1] for call in mock_save.call_args_list] == [
+        MANU_TEXT, b'Revised text']
+
+
+@patch('data.revisions.save', autospec=True, return_value=REVISION)
+@patch('server.endpoints.fetch_one', autospec=True, return_value={
+    **REVISING_MANU, 'text_revision': None, 'text': 'Original'})
+def test_post_first_revision_bad_body(mock_fetch_one, mock_save):
+    resp = TEST_CLIENT.post(
+        f'{ep.MANU_EP}/{MANU_ID}/revisions?user_id=a@nyu.edu',
+        json={'chunks': ['c1'], 'data': {'c1': 'not base64!'}})
+    assert resp.status_code == BAD_REQUEST
+    # nothing is saved, so a retry doesn't save the original twice
+    mock_save.assert_not_called()
+
+
+@patch('server.endpoints.find_one_and_update', autospec=True)
+@patch('data.revisions.add', autospec=True,
+       side_effect=LookupError(['c2']))
+@patch('data.revisions.put_chunks', autospec=True, return_value=0)
+@patch('data.revisions.save', autospec=True,
+       return_value={**REVISION, 'number': 1})
+@patch('server.endpoints.fetch_one', autospec=True, return_value={
+    **REVISING_MANU, 'text_revision': None, 'text': 'Original'})
+def test_post_first_revision_marks_original(mock_fetch_one, mock_save,
+                                            mock_put_chunks, mock_add,
+                                            mock_update):
+    resp = TEST_CLIENT.post(
+        f'{ep.MANU_EP}/{MANU_ID}/revisions?user_id=a@nyu.edu',
+        json={'chunks': ['c1', 'c2'], 'data': {'c1': 'AAEC'}})
+    assert resp.status_code == CONFLICT
+    mock_save.assert_called_once_with(MANU_ID, b'Original')
+    # the retry with the missing data will see the original is saved:
+    assert mock_update.call_args.args[2] == {'$max': {'text_revision': 1}}
+
+
+@patch('data.revisions.add', autospec=True,
+       side_effect=LookupError(['c2']))
+@patch('data.revisions.put_chunks', autospec=True, return_value=0)
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value=REVISING_MANU)
+def test_post_revision_missing_chunks(mock_fetch_one, mock_put_chunks,
+                                      mock_add):
+    resp = TEST_CLIENT.post(
+        f'{ep.MANU_EP}/{MANU_ID}/revisions?user_id=a@nyu.edu',
+        json={'chunks': ['c1', 'c2'], 'data': {'c1': 'AAEC'}})
+    assert resp.status_code == CONFLICT
+    assert resp.get_json()['Missing'] == ['c2']
+    mock_put_chunks.assert_called_once_with({'c1': b'\x00\x01\x02'})
+
+
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value=REVISING_MANU)
+def test_post_revision_not_author(mock_fetch_one):
+    resp = TEST_CLIENT.post(
+        f'{ep.MANU_EP}/{MANU_ID}/revisions?user_id=b@nyu.edu',
+        json={'text': 'Revised text'})
+    assert resp.status_code == FORBIDDEN
+
+
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value={**REVISING_MANU, 'state': manu.SUBMITTED})
+def test_post_revision_wrong_state(mock_fetch_one):
+    resp = TEST_CLIENT.post(
+        f'{ep.MANU_EP}/{MANU_ID}/revisions?user_id=a@nyu.edu',
+        json={'text': 'Revised text'})
+    assert resp.status_code == NOT_ACCEPTABLE
+
+
+@patch('data.workload.recommend', autospec=True,
+       return_value=[{'email': 'ref@nyu.edu', 'score': 0.5}])
+@patch('server.endpoints.fetch_one', autospec=True,
+       return_value={'_id': MANU_ID, 'abstract': 'Graphs'})
+def test_recommend_referees(mock_fetch_one, mock_recommend):
+    resp = TEST_CLIENT.get(
+        f'{ep.REFEREES_EP}/recommend?manu_id={MANU_ID}&limit=5')
+    assert resp.status_code == OK
+    assert resp.get_json()[0]['email'] == 'ref@nyu.edu'
+    assert mock_recommend.call_args.args[1] == 5
+
+
+def test_recommend_referees_bad_id():
+    resp = TEST_CLIENT.get(f'{ep.REFEREES_EP}/recommend?manu_id=nope')
+    assert resp.status_code == BAD_REQUEST
+
+
+@patch('data.manuscripts.listing.for_referee', autospec=True,
+       return_value={'Items': [{'title': 'T'}], 'Next': None})
+@patch('data.people.read_one', autospec=True, return_value={
+    'email': 'ref@nyu.edu', 'roles': ['RE']})
+def test_get_assignments(mock_read_one, mock_for_referee):
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/ref@nyu.edu/assignments?limit=5')
+    assert resp.status_code == OK
+    assert resp.get_json()['Items'][0]['title'] == 'T'
+    mock_for_referee.assert_called_once_with('ref@nyu.edu', ['RE'],
+                                             after=None, limit=5)
+
+
+@patch('data.people.read_one', autospec=True, return_value=None)
+def test_get_assignments_no_person(mock_read_one):
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/nobody@nyu.edu/assignments')
+    assert resp.status_code == NOT_FOUND
+
+
+@patch('data.manuscripts.listing.for_author', autospec=True,
+       return_value={'Items': [], 'Next': None, 'Counts': {'SUB': 1},
+                     'Total': 1})
+@patch('data.people.read_one', autospec=True, return_value={
+    'email': 'a@nyu.edu', 'roles': ['AU']})
+def test_get_author_manuscripts(mock_read_one, mock_for_author):
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/a@nyu.edu/manuscripts?after=x')
+    assert resp.status_code == OK
+    assert resp.get_json()['Counts'] == {'SUB': 1}
+    assert mock_for_author.call_args.kwargs['after'] == 'x'
+
+
+@patch('data.manuscripts.listing.for_author', autospec=True,
+       side_effect=ValueError('Bad after: x'))
+@patch('data.people.read_one', autospec=True, return_value={
+    'email': 'a@nyu.edu', 'roles': ['AU']})
+def test_get_author_manuscripts_bad_after(mock_read_one, mock_for_author):
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/a@nyu.edu/manuscripts?after=x')
+    assert resp.status_code == BAD_REQUEST
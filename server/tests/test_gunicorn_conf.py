@@ -0,0 +1,57 @@
+import os
+import runpy
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import data.db_connect as dbc
+
+CONF_PATH = os.path.join(os.path.dirname(__file__), '..', '..',
+                         'gunicorn.conf.py')
+
+
+@pytest.fixture
+def conf():
+    with patch.dict(os.environ, {}, clear=False):
+        os.environ.pop('GUNICORN_WORKER_CLASS', None)
+        yield runpy.run_path(CONF_PATH)
+
+
+def test_defaults(conf):
+    assert conf['worker_class'] == conf['GTHREAD']
+    assert conf['preload_app']
+    assert conf['workers'] == 2 * conf['cpu_count']() + 1
+    assert 0 < conf['max_requests_jitter'] < conf['max_requests']
+    # for the app to share the CPUs between the workers by:
+    assert os.environ['WEB_CONCURRENCY'] == str(conf['workers'])
+
+
+def test_choose_workers(conf):
+    assert conf['choose_workers'](conf['GTHREAD'], 4, env={}) == 9
+    assert conf['choose_workers'](conf['GEVENT'], 4, env={}) == 4
+    assert conf['choose_workers'](conf['GEVENT'], 4,
+                                  env={'WEB_CONCURRENCY': '3'}) == 3
+
+
+def test_choose_bad_worker_class(conf):
+    with pytest.raises(ValueError):
+        conf['choose_worker_class'](env={'GUNICORN_WORKER_CLASS': 'tornado'})
+
+
+def test_post_fork_resets_client(conf):
+    server = SimpleNamespace(cfg=SimpleNamespace(worker_class_str='gthread'),
+                             log=MagicMock())
+    worker = SimpleNamespace(pid=4321, max_requests=2050)
+    with patch.object(dbc, 'client', object()):
+        conf['post_fork'](server, worker)
+        assert dbc.client is None
+
+
+@patch('data.indexes.ensure', autospec=True,
+       side_effect=RuntimeError('no DB'))
+def test_when_ready_survives_no_db(mock_ensure, conf):
+    server = SimpleNamespace(log=MagicMock())
+    conf['when_ready'](server)
+    mock_ensure.assert_called_once()
+    server.log.exception.assert_called_once()
@@ -0,0 +1,87 @@
+import pytest
+
+import server.log_tail as lt
+
+NUM_LINES = 200
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / 'error.log'
+    path.write_text(''.join(f'line {i}\n' for i in range(NUM_LINES)))
+    return str(path)
+
+
+def test_tail(log_file):
+    lines, offset = lt.tail(log_file, 5)
+    assert lines == [f'line {i}' for i in range(NUM_LINES - 5, NUM_LINES)]
+    assert offset == len(open(log_file, 'rb').read())
+
+
+def test_tail_small_blocks(log_file):
+    lines, _ = lt.tail(log_file, 50, block_size=7)
+    assert lines == [f'line {i}' for i in range(NUM_LINES - 50, NUM_LINES)]
+
+
+def test_tail_more_than_file(log_file):
+    lines, _ = lt.tail(log_file, 500)
+    assert len(lines) == NUM_LINES
+    assert lines[0] == 'line 0'
+
+
+def test_tail_capped(log_file):
+    with open(log_file, 'a') as f:
+        f.write(''.join(f'more {i}\n' for i in range(lt.MAX_LINES)))
+    lines, _ = lt.tail(log_file, lt.MAX_LINES + 10)
+    assert len(lines) == lt.MAX_LINES
+
+
+def test_tail_no_trailing_newline(tmp_path):
+    path = tmp_path / 'partial.log'
+    path.write_text('a\nb\nc')
+    assert lt.tail(str(path), 2)[0] == ['b', 'c']
+
+
+def test_tail_empty(tmp_path):
+    path = tmp_path / 'empty.log'
+    path.write_text('')
+    assert lt.tail(str(path), 10) == ([], 0)
+
+
+def test_tail_missing():
+    with pytest.raises(OSError):
+        lt.tail('/no/such/file.log')
+
+
+def test_read_since(log_file):
+    _, offset = lt.tail(log_file, 1)
+    with open(log_file, 'a') as f:
+        f.write('new 1\nnew 2\npartial')
+    lines, new_offset = lt.read_since(log_file, offset)
+    assert lines == ['new 1', 'new 2']
+    with open(log_file, 'a') as f:
+        f.write(' line\n')
+    lines, _ = lt.read_since(log_file, new_offset)
+    assert lines == ['partial line']
+
+
+def test_read_since_nothing_new(log_file):
+    _, offset = lt.tail(log_file, 1)
+    assert lt.read_since(log_file, offset) == ([], offset)
+
+
+def test_read_since_after_rotation(tmp_path):
+    path = tmp_path / 'rotated.log'
+    path.write_text('fresh\n')
+    lines, offset = lt.read_since(str(path), 10_000)
+    assert lines == ['fresh']
+    assert offset == len('fresh\n')
+
+
+def test_follow(log_file):
+    _, offset = lt.tail(log_file, 1)
+    with open(log_file, 'a') as f:
+        f.write('new 1\nnew 2\n')
+    events = list(lt.follow(log_file, offset, poll_secs=0, max_secs=0.05))
+    assert events[0] == f'id: {offset + 6}\ndata: new 1\n\n'
+    assert events[1] == f'id: {offset + 12}\ndata: new 2\n\n'
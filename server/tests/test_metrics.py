@@ -0,0 +1,100 @@
+from http import HTTPStatus
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+import data.db_connect as dbc
+import server.metrics as mtr
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/things/<thing_id>')
+    def thing(thing_id):
+        return {'id': thing_id}
+
+    mtr.init_app(app)
+    yield app.test_client()
+
+
+def test_counter():
+    counter = mtr.Counter('test_total', 'A test counter.', ('kind',))
+    counter.inc('a')
+    counter.inc('a', amount=2)
+    assert counter.get('a') == 3
+    assert 'test_total{kind="a"} 3' in counter.render()
+
+
+def test_gauge():
+    gauge = mtr.Gauge('test_gauge', 'A test gauge.')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.get() == 1
+
+
+def test_histogram():
+    hist = mtr.Histogram('test_secs', 'A test histogram.', ('op',),
+                         buckets=(0.1, 1))
+    hist.observe('read', value=0.05)
+    hist.observe('read', value=0.5)
+    hist.observe('read', value=5)
+    lines = hist.render()
+    assert 'test_secs_bucket{op="read",le="0.1"} 1' in lines
+    assert 'test_secs_bucket{op="read",le="1"} 2' in lines
+    assert 'test_secs_bucket{op="read",le="+Inf"} 3' in lines
+    assert 'test_secs_count{op="read"} 3' in lines
+    assert hist.get_count('read') == 3
+
+
+def test_label_escaping():
+    counter = mtr.Counter('test_esc_total', 'Escaping.', ('path',))
+    counter.inc('a"b')
+    assert 'test_esc_total{path="a\\"b"} 1' in counter.render()
+
+
+def test_request_metrics(client):
+    route = '/things/<thing_id>'
+    before = mtr.REQUEST_SECS.get_count(route, 'GET')
+    assert client.get('/things/1').status_code == HTTPStatus.OK
+    assert client.get('/things/2').status_code == HTTPStatus.OK
+    assert mtr.REQUEST_SECS.get_count(route, 'GET') == before + 2
+    assert mtr.REQUESTS.get(route, 'GET', '200') >= 2
+    assert mtr.IN_FLIGHT.get() == 0
+
+
+def test_unmatched_route(client):
+    client.get('/no/such/route')
+    assert mtr.REQUESTS.get(mtr.UNMATCHED_ROUTE, 'GET', '404') >= 1
+
+
+def test_metrics_endpoint(client):
+    client.get('/things/1')
+    resp = client.get(mtr.METRICS_EP)
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.content_type == mtr.CONTENT_TYPE
+    text = resp.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'route="/things/<thing_id>"' in text
+
+
+def test_db_observer(client):
+    with patch('data.db_connect.client') as mock_client:
+        mock_client.__getitem__.return_value.__getitem__.return_value \
+            .find.return_value = [{'_id': 1, 'name': 'a'},
+                                  {'_id': 2, 'name': 'b'}]
+        before = mtr.DB_DOCS.get('read', 'people')
+        dbc.read('people')
+    assert mtr.DB_DOCS.get('read', 'people') == before + 2
+    assert mtr.DB_SECS.get_count('read', 'people') >= 1
+
+
+def test_worker_started():
+    mtr.worker_started(1234, 'gthread', 2100)
+    assert mtr.WORKER_MAX_REQUESTS.get('1234', 'gthread') == 2100
+    assert mtr.WORKER_START.get('1234', 'gthread') > 0
+    assert 'gunicorn_worker_max_requests{pid="1234",worker_class="gthread"}' \
+        in mtr.render()
@@ -0,0 +1,130 @@
+from http import HTTPStatus
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+import server.rate_limit as rl
+
+TEST_KEY = 'ip:127.0.0.1:list'
+
+
+def test_classify():
+    assert rl.classify('GET', '/people') == rl.LIST
+    assert rl.classify('GET', '/manuscripts/') == rl.LIST
+    assert rl.classify('GET', '/people/roles/AU') == rl.SEARCH
+    assert rl.classify('POST', '/people') == rl.WRITE
+    assert rl.classify('GET', '/people/masthead') == rl.DEFAULT
+    assert rl.classify('GET', '/export/people') == rl.EXPORT
+
+
+def test_client_addr():
+    assert rl.client_addr('1.2.3.4', '10.0.0.1', trusted=0) == '10.0.0.1'
+    assert rl.client_addr(None, '10.0.0.1', trusted=1) == '10.0.0.1'
+    assert rl.client_addr('1.2.3.4', '10.0.0.1', trusted=1) == '1.2.3.4'
+    # only the hops our proxies added count; the client can fake the rest:
+    assert rl.client_addr('6.6.6.6, 1.2.3.4, 10.0.0.2', '10.0.0.1',
+                          trusted=2) == '1.2.3.4'
+    assert rl.client_addr('1.2.3.4', '10.0.0.1', trusted=2) == '10.0.0.1'
+
+
+def test_local_bucket_allows_burst():
+    backend = rl.LocalBackend()
+    for _ in range(3):
+        assert backend.take(TEST_KEY, 1, 3, now=100.0)[0]
+    allowed, retry_after = backend.take(TEST_KEY, 1, 3, now=100.0)
+    assert not allowed
+    assert retry_after == pytest.approx(1.0)
+
+
+def test_local_bucket_refills():
+    backend = rl.LocalBackend()
+    for _ in range(3):
+        backend.take(TEST_KEY, 1, 3, now=100.0)
+    assert not backend.take(TEST_KEY, 1, 3, now=100.5)[0]
+    assert backend.take(TEST_KEY, 1, 3, now=102.0)[0]
+
+
+def test_local_buckets_are_per_key():
+    backend = rl.LocalBackend()
+    assert backend.take('a', 1, 1, now=100.0)[0]
+    assert not backend.take('a', 1, 1, now=100.0)[0]
+    assert backend.take('b', 1, 1, now=100.0)[0]
+
+
+def test_local_backend_evicts_idle():
+    backend = rl.LocalBackend()
+    with patch.object(rl.LocalBackend, 'MAX_KEYS', 2):
+        backend.take('a', 1, 1, now=0.0)
+        backend.take('b', 1, 1, now=0.0)
+        backend.take('c', 1, 1, now=10_000.0)
+    assert set(backend.buckets) == {'c'}
+
+
+@patch('server.rate_limit.dbc', autospec=True)
+def test_mongo_backend(mock_dbc):
+    mock_dbc.find_one_and_update.return_value = {rl.ALLOWED: False,
+                                                 rl.TOKENS: 0.5}
+    allowed, retry_after = rl.MongoBackend().take(TEST_KEY, 1, 3, now=1.0)
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+    filt = mock_dbc.find_one_and_update.call_args.args[1]
+    assert filt == {'_id': TEST_KEY}
+
+
+def test_make_backend():
+    assert isinstance(rl.make_backend('mongo'), rl.MongoBackend)
+    assert isinstance(rl.make_backend('local'), rl.LocalBackend)
+
+
+@pytest.fixture
+def limited_client(request):
+    app = Flask(__name__)
+    app.config.update(getattr(request, 'param', {}))
+
+    @app.route('/people')
+    def people():
+        return {}
+
+    rl.init_app(app)
+    limits = {**rl.LIMITS, rl.LIST: {rl.RATE: 0.001, rl.BURST: 2}}
+    with patch('server.rate_limit.LIMITS', limits), \
+            patch('server.rate_limit.backend', rl.LocalBackend()), \
+            patch('server.rate_limit.ENABLED', True):
+        yield app.test_client()
+
+
+def test_too_many_requests(limited_client):
+    assert limited_client.get('/people').status_code == HTTPStatus.OK
+    assert limited_client.get('/people').status_code == HTTPStatus.OK
+    resp = limited_client.get('/people')
+    assert resp.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(resp.headers['Retry-After']) > 0
+
+
+def test_backend_error_fails_open(limited_client):
+    with patch('server.rate_limit.backend') as mock_backend:
+        mock_backend.take.side_effect = Exception('DB down')
+        for _ in range(5):
+            assert limited_client.get('/people').status_code == HTTPStatus.OK
+
+
+def test_shared_address_shares_bucket(limited_client):
+    for addr in ['1.2.3.4', '5.6.7.8']:
+        limited_client.get('/people', headers={'X-Forwarded-For': addr})
+    resp = limited_client.get('/people',
+                              headers={'X-Forwarded-For': '9.9.9.9'})
+    assert resp.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+
+@pytest.mark.parametrize('limited_client', [{'TRUSTED_PROXIES': 1}],
+                         indirect=True)
+def test_trusted_proxy_bucket_per_client(limited_client):
+    for addr in ['1.2.3.4', '5.6.7.8', '9.9.9.9']:
+        for _ in range(2):
+            resp = limited_client.get('/people',
+                                      headers={'X-Forwarded-For': addr})
+            assert resp.status_code == HTTPStatus.OK
+    resp = limited_client.get('/people',
+                              headers={'X-Forwarded-For': '1.2.3.4'})
+    assert resp.status_code == HTTPStatus.TOO_MANY_REQUESTS